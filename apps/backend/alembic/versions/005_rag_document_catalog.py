@@ -0,0 +1,75 @@
+"""RAG document catalog
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create documents table
+    op.create_table('documents',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('external_id', sa.String(length=255), nullable=True),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('source_type', sa.String(length=50), nullable=False),
+        sa.Column('source_url', sa.String(length=500), nullable=True),
+        sa.Column('extra_data', sa.JSON(), nullable=True),
+        sa.Column('chunk_count', sa.Integer(), nullable=True),
+        sa.Column('token_count', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Create indexes for documents
+    op.create_index('ix_documents_external_id', 'documents', ['external_id'], unique=True)
+    op.create_index('idx_document_user_status', 'documents', ['user_id', 'status'])
+    op.create_index('idx_document_user_created', 'documents', ['user_id', 'created_at'])
+    op.create_index('idx_document_source_type', 'documents', ['source_type'])
+
+    # Create document_chunks table
+    op.create_table('document_chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=True),
+        sa.Column('embedding_id', sa.String(length=255), nullable=True),
+        sa.Column('extra_data', sa.JSON(), nullable=True),
+        sa.Column('token_count', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Create indexes for document_chunks
+    op.create_index('idx_chunk_document', 'document_chunks', ['document_id', 'chunk_index'])
+    op.create_index('idx_chunk_embedding', 'document_chunks', ['embedding_id'])
+
+
+def downgrade():
+    op.drop_index('idx_chunk_embedding', table_name='document_chunks')
+    op.drop_index('idx_chunk_document', table_name='document_chunks')
+    op.drop_table('document_chunks')
+
+    op.drop_index('idx_document_source_type', table_name='documents')
+    op.drop_index('idx_document_user_created', table_name='documents')
+    op.drop_index('idx_document_user_status', table_name='documents')
+    op.drop_index('ix_documents_external_id', table_name='documents')
+    op.drop_table('documents')
@@ -0,0 +1,57 @@
+"""Keyset pagination indexes
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+PUBLISHED = sa.text("status = 'published' AND NOT is_private")
+
+
+def _has_marketplace():
+    # No migration creates the marketplace tables; databases that lack them
+    # get these indexes with the tables, from the models
+    return sa.inspect(op.get_bind()).has_table('marketplace_items')
+
+
+def upgrade():
+    # Execution history, newest first
+    op.create_index('idx_execution_user_created', 'executions', ['user_id', 'created_at', 'id'])
+    op.create_index('idx_execution_flow_user_created', 'executions',
+                    ['flow_id', 'user_id', 'created_at', 'id'])
+
+    # Marketplace search orderings
+    if not _has_marketplace():
+        return
+    op.create_index('idx_marketplace_item_popular', 'marketplace_items',
+                    [sa.text('install_count DESC NULLS LAST'), sa.text('id DESC')],
+                    postgresql_where=PUBLISHED, if_not_exists=True)
+    op.create_index('idx_marketplace_item_newest', 'marketplace_items',
+                    [sa.text('published_at DESC NULLS LAST'), sa.text('id DESC')],
+                    postgresql_where=PUBLISHED, if_not_exists=True)
+    op.create_index('idx_marketplace_item_rating', 'marketplace_items',
+                    [sa.text('rating_average DESC NULLS LAST'),
+                     sa.text('rating_count DESC NULLS LAST'), sa.text('id DESC')],
+                    postgresql_where=PUBLISHED, if_not_exists=True)
+    op.create_index('idx_marketplace_item_price', 'marketplace_items',
+                    [sa.text('price ASC NULLS LAST'), sa.text('id ASC')],
+                    postgresql_where=PUBLISHED, if_not_exists=True)
+
+
+def downgrade():
+    if _has_marketplace():
+        op.drop_index('idx_marketplace_item_price', 'marketplace_items', if_exists=True)
+        op.drop_index('idx_marketplace_item_rating', 'marketplace_items', if_exists=True)
+        op.drop_index('idx_marketplace_item_newest', 'marketplace_items', if_exists=True)
+        op.drop_index('idx_marketplace_item_popular', 'marketplace_items', if_exists=True)
+    op.drop_index('idx_execution_flow_user_created', 'executions')
+    op.drop_index('idx_execution_user_created', 'executions')
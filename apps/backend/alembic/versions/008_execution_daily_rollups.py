@@ -0,0 +1,49 @@
+"""Execution daily rollups
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('execution_daily_rollups',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('flow_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('executions', sa.Integer(), nullable=False),
+        sa.Column('successful', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('tokens_used', sa.BigInteger(), nullable=False),
+        sa.Column('cost_cents', sa.BigInteger(), nullable=False),
+        sa.Column('duration_count', sa.Integer(), nullable=False),
+        sa.Column('duration_ms_sum', sa.BigInteger(), nullable=False),
+        sa.Column('duration_ms_sumsq', sa.Float(), nullable=False),
+        sa.Column('duration_buckets', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['flow_id'], ['agent_flows.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id', 'user_id', 'flow_id', 'day')
+    )
+    op.create_index('idx_execution_rollup_user_day', 'execution_daily_rollups', ['user_id', 'day'])
+    op.create_index('idx_execution_rollup_flow_day', 'execution_daily_rollups', ['flow_id', 'day'])
+
+    # Existing history is loaded with `codexos executions backfill-rollups`
+
+
+def downgrade():
+    op.drop_index('idx_execution_rollup_flow_day', 'execution_daily_rollups')
+    op.drop_index('idx_execution_rollup_user_day', 'execution_daily_rollups')
+    op.drop_table('execution_daily_rollups')
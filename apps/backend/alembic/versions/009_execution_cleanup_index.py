@@ -0,0 +1,23 @@
+"""Execution cleanup index
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Retention cleanup walks executions oldest first
+    op.create_index('idx_execution_created', 'executions', ['created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_execution_created', 'executions')
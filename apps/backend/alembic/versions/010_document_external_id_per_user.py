@@ -0,0 +1,25 @@
+"""Document external IDs unique per user
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # External IDs are chosen by callers, so two users may use the same one
+    op.drop_index('ix_documents_external_id', table_name='documents')
+    op.create_index('idx_document_user_external', 'documents', ['user_id', 'external_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('idx_document_user_external', table_name='documents')
+    op.create_index('ix_documents_external_id', 'documents', ['external_id'], unique=True)
@@ -0,0 +1,28 @@
+"""Retired vector collections
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A user's previous collection is kept until cached assignments expire
+    op.add_column('vector_collection_assignments',
+                  sa.Column('retired_collection', sa.String(length=63), nullable=True))
+    op.add_column('vector_collection_assignments',
+                  sa.Column('retired_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('vector_collection_assignments', 'retired_until')
+    op.drop_column('vector_collection_assignments', 'retired_collection')
@@ -0,0 +1,37 @@
+"""Cost guard JSONB columns
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('actions_taken', 'cost_breakdown')
+
+
+def upgrade():
+    # Match the model: override expiry appends to actions_taken with jsonb ||
+    for column in COLUMNS:
+        op.alter_column('cost_guards', column,
+                        type_=postgresql.JSONB(),
+                        existing_type=sa.JSON(),
+                        existing_nullable=False,
+                        postgresql_using=f'{column}::jsonb')
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.alter_column('cost_guards', column,
+                        type_=sa.JSON(),
+                        existing_type=postgresql.JSONB(),
+                        existing_nullable=False,
+                        postgresql_using=f'{column}::json')
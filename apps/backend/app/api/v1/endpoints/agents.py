@@ -5,12 +5,15 @@
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, Query
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from app.api.v1.endpoints.auth import get_current_user
-from app.db.session import get_db
+from app.core.cache import CacheNamespace, invalidate_cache
+from app.db.pagination import InvalidCursor, Keyset
+from app.db.session import AsyncSessionLocal, get_db
 from app.models.agent import AgentFlow, Execution, ExecutionNode
 from app.models.user import User
 from app.schemas.agent import (
@@ -23,10 +26,29 @@
     ExecutionLogsResponse,
     ExecutionNodeDetail,
 )
+from app.schemas.execution import (
+    AgentPerformanceResponse,
+    ExecutionStatisticsResponse,
+    ExecutionTimelineResponse,
+)
 from app.services.agent_executor import AgentExecutionService
+from app.services.execution_history_service import ExecutionHistoryService
+from app.services.execution_timeline import AsyncExecutionTimelineService
 
 router = APIRouter()
 
+# Newest first; the opaque cursor of the next page is sent in X-Next-Cursor
+EXECUTIONS_KEYSET = Keyset("executions", (Execution.created_at, True), (Execution.id, True))
+
+
+def _paginate_executions(query, cursor: Optional[str], skip: int, limit: int):
+    """Apply keyset pagination, or offset pagination if no cursor is given"""
+    try:
+        query = EXECUTIONS_KEYSET.apply(query, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return query if cursor else query.offset(skip)
+
 
 @router.get("/", response_model=List[AgentFlowSchema])
 async def list_agent_flows(
@@ -46,6 +68,7 @@ async def list_agent_flows(
 
 
 @router.post("/", response_model=AgentFlowSchema)
+@invalidate_cache(CacheNamespace.AGENTS)
 async def create_agent_flow(
     flow_in: AgentFlowCreate,
     db: AsyncSession = Depends(get_db),
@@ -87,6 +110,7 @@ async def get_agent_flow(
 
 
 @router.put("/{flow_id}", response_model=AgentFlowSchema)
+@invalidate_cache(CacheNamespace.AGENTS)
 async def update_agent_flow(
     flow_id: UUID,
     flow_update: AgentFlowUpdate,
@@ -118,6 +142,7 @@ async def update_agent_flow(
 
 
 @router.delete("/{flow_id}")
+@invalidate_cache(CacheNamespace.AGENTS)
 async def delete_agent_flow(
     flow_id: UUID,
     db: AsyncSession = Depends(get_db),
@@ -182,10 +207,12 @@ async def execute_agent_flow(
 @router.get("/{flow_id}/executions", response_model=List[ExecutionResponse])
 async def list_flow_executions(
     flow_id: UUID,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page; replaces skip"),
 ) -> List[Execution]:
     """List executions for a specific flow"""
     # First check if user has access to the flow
@@ -205,27 +232,54 @@ async def list_flow_executions(
     
     # Get executions
     result = await db.execute(
-        select(Execution)
-        .where(
-            Execution.flow_id == flow_id,
-            Execution.user_id == current_user.id,
+        _paginate_executions(
+            select(Execution).where(
+                Execution.flow_id == flow_id,
+                Execution.user_id == current_user.id,
+            ),
+            cursor, skip, limit
         )
-        .order_by(Execution.created_at.desc())
-        .offset(skip)
-        .limit(limit)
     )
     
-    return result.scalars().all()
+    executions, next_cursor = EXECUTIONS_KEYSET.page(result.scalars().all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return executions
+
+
+@router.get("/{flow_id}/metrics", response_model=AgentPerformanceResponse)
+async def get_agent_flow_metrics(
+    flow_id: UUID,
+    days: int = Query(30, ge=1, le=365),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get performance metrics of a flow across all its executions"""
+    result = await db.execute(
+        select(AgentFlow.id).where(
+            AgentFlow.id == flow_id,
+            AgentFlow.owner_id == current_user.id,
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agent flow not found",
+        )
+    
+    return await ExecutionHistoryService(db).get_agent_performance_metrics(flow_id, days)
 
 
 # New endpoints for agent execution history and logs
 @router.get("/history", response_model=List[ExecutionHistoryItem])
 async def get_agent_execution_history(
+    response: Response,
     agent_id: Optional[str] = Query(None, description="Agent ID to filter by"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page; replaces skip"),
 ) -> List[ExecutionHistoryItem]:
     """Get execution history for all agents or a specific agent"""
     
@@ -233,27 +287,28 @@ async def get_agent_execution_history(
     if agent_id:
         # Get executions for a specific agent
         result = await db.execute(
-            select(Execution)
-            .join(AgentFlow, Execution.flow_id == AgentFlow.id)
-            .where(
-                Execution.user_id == current_user.id,
-                AgentFlow.name == agent_id  # Using name as agent_id for now
+            _paginate_executions(
+                select(Execution)
+                .join(AgentFlow, Execution.flow_id == AgentFlow.id)
+                .where(
+                    Execution.user_id == current_user.id,
+                    AgentFlow.name == agent_id  # Using name as agent_id for now
+                ),
+                cursor, skip, limit
             )
-            .order_by(Execution.created_at.desc())
-            .offset(skip)
-            .limit(limit)
         )
     else:
         # Get all executions for the user
         result = await db.execute(
-            select(Execution)
-            .where(Execution.user_id == current_user.id)
-            .order_by(Execution.created_at.desc())
-            .offset(skip)
-            .limit(limit)
+            _paginate_executions(
+                select(Execution).where(Execution.user_id == current_user.id),
+                cursor, skip, limit
+            )
         )
     
-    executions = result.scalars().all()
+    executions, next_cursor = EXECUTIONS_KEYSET.page(result.scalars().all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     # Transform to history items with calculated fields
     history_items = []
@@ -386,4 +441,51 @@ async def get_agent_execution_logs(
         errors=errors,
         final_output=final_output,
         summary=summary,
-    )
\ No newline at end of file
+    )
+
+@router.get("/executions/stats", response_model=ExecutionStatisticsResponse)
+async def get_execution_statistics(
+    days: int = Query(30, ge=1, le=365),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get execution statistics of the current user"""
+    return await ExecutionHistoryService(db).get_execution_statistics(current_user.id, days)
+
+@router.get("/executions/{execution_id}/timeline", response_model=ExecutionTimelineResponse)
+async def get_execution_timeline(
+    execution_id: UUID,
+    include_steps: bool = True,
+    include_payloads: bool = Query(False, description="Include tool parameters/results and retrieved documents"),
+    stream: bool = Query(False, description="Stream the JSON node by node"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get the step-by-step timeline of an execution"""
+    result = await db.execute(
+        select(Execution.id).where(
+            Execution.id == execution_id,
+            Execution.user_id == current_user.id,
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Execution not found",
+        )
+    
+    if stream:
+        # The request's session may be closed before a streamed body is sent
+        async def body():
+            async with AsyncSessionLocal() as session:
+                chunks = await AsyncExecutionTimelineService(session).stream_execution_timeline(
+                    execution_id, include_steps, include_payloads
+                )
+                async for chunk in chunks:
+                    yield chunk
+        
+        return StreamingResponse(body(), media_type="application/json")
+    
+    return await AsyncExecutionTimelineService(db).get_execution_timeline(
+        execution_id, include_steps=include_steps, include_payloads=include_payloads
+    )
@@ -6,9 +6,10 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc
+from sqlalchemy import select, update, and_, or_, func, desc
 from sqlalchemy.orm import selectinload
 
 from app.api.deps import get_current_user, get_db
@@ -19,9 +20,51 @@
 )
 from app.models.agent import AgentFlow
 from app.core.auth import require_permission
+from app.core.cache import CacheLoader, CacheNamespace, invalidate_cache
+from app.db.pagination import InvalidCursor, Keyset
 
 router = APIRouter()
 
+# Cached item cards are dropped with the namespace on purchase (see purchase_item)
+ITEM_CARD_CACHE_TTL = 300
+
+# Search orderings, each ending in the item id so keyset pages are stable
+SEARCH_KEYSETS = {
+    "popular": Keyset("marketplace:popular", (MarketplaceItem.install_count, True), (MarketplaceItem.id, True)),
+    "newest": Keyset("marketplace:newest", (MarketplaceItem.published_at, True), (MarketplaceItem.id, True)),
+    "rating": Keyset(
+        "marketplace:rating",
+        (MarketplaceItem.rating_average, True),
+        (MarketplaceItem.rating_count, True),
+        (MarketplaceItem.id, True)
+    ),
+    "price_low": Keyset("marketplace:price_low", (MarketplaceItem.price, False), (MarketplaceItem.id, False)),
+    "price_high": Keyset("marketplace:price_high", (MarketplaceItem.price, True), (MarketplaceItem.id, True)),
+}
+
+
+def _item_card(item: MarketplaceItem) -> Dict[str, Any]:
+    """Summary of an item as shown in search results"""
+    return {
+        "id": str(item.id),
+        "name": item.name,
+        "slug": item.slug,
+        "short_description": item.short_description,
+        "item_type": item.item_type,
+        "pricing_model": item.pricing_model,
+        "price": float(item.price) if item.price else 0,
+        "rating_average": float(item.rating_average) if item.rating_average else 0,
+        "rating_count": item.rating_count,
+        "install_count": item.install_count,
+        "thumbnail_url": item.thumbnail_url,
+        "seller": {
+            "id": str(item.seller.id),
+            "username": item.seller.username,
+            "avatar_url": item.seller.avatar_url
+        },
+        "categories": [cat.slug for cat in item.categories]
+    }
+
 
 @router.get("/categories")
 async def list_categories(
@@ -53,6 +96,7 @@ async def list_categories(
 
 @router.get("/items")
 async def search_marketplace(
+    response: Response,
     q: Optional[str] = Query(None, description="Search query"),
     category: Optional[str] = Query(None, description="Category slug"),
     item_type: Optional[str] = Query(None, description="Item type"),
@@ -63,10 +107,12 @@ async def search_marketplace(
     sort_by: str = Query("popular", description="Sort by: popular, newest, rating, price_low, price_high"),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page; replaces skip"),
     db: AsyncSession = Depends(get_db)
 ) -> List[Dict[str, Any]]:
     """Search and browse marketplace items"""
-    query = select(MarketplaceItem).where(
+    keyset = SEARCH_KEYSETS.get(sort_by, SEARCH_KEYSETS["popular"])
+    query = select(*(column for column, _ in keyset.columns)).where(
         and_(
             MarketplaceItem.status == MarketplaceItemStatus.PUBLISHED.value,
             MarketplaceItem.is_private == False
@@ -104,54 +150,46 @@ async def search_marketplace(
     if min_rating is not None:
         query = query.where(MarketplaceItem.rating_average >= min_rating)
     
-    # Apply sorting
-    if sort_by == "popular":
-        query = query.order_by(desc(MarketplaceItem.install_count))
-    elif sort_by == "newest":
-        query = query.order_by(desc(MarketplaceItem.published_at))
-    elif sort_by == "rating":
-        query = query.order_by(desc(MarketplaceItem.rating_average), desc(MarketplaceItem.rating_count))
-    elif sort_by == "price_low":
-        query = query.order_by(MarketplaceItem.price)
-    elif sort_by == "price_high":
-        query = query.order_by(desc(MarketplaceItem.price))
+    # Apply sorting and pagination: after the cursor if given, else by offset
+    try:
+        query = keyset.apply(query, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not cursor:
+        query = query.offset(skip)
     
-    # Add eager loading
-    query = query.options(
-        selectinload(MarketplaceItem.seller),
-        selectinload(MarketplaceItem.categories)
-    )
+    result = await db.execute(query)
+    rows, next_cursor = keyset.page(result.all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    item_ids = [row.id for row in rows]
     
-    # Apply pagination
-    query = query.offset(skip).limit(limit)
+    # Item cards come from the cache in one round trip; misses are loaded
+    # together and cached
+    async def load_cards(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        result = await db.execute(
+            select(MarketplaceItem)
+            .where(MarketplaceItem.id.in_([UUID(key) for key in keys]))
+            .options(
+                selectinload(MarketplaceItem.seller),
+                selectinload(MarketplaceItem.categories)
+            )
+        )
+        return {str(item.id): _item_card(item) for item in result.scalars().all()}
     
-    result = await db.execute(query)
-    items = result.scalars().all()
+    loader = CacheLoader(CacheNamespace.MARKETPLACE, load_cards, ttl=ITEM_CARD_CACHE_TTL, key_prefix="item_card:")
+    cards = await loader.load_many([str(item_id) for item_id in item_ids])
     
     # Track views
-    for item in items:
-        item.view_count += 1
-    await db.commit()
+    if item_ids:
+        await db.execute(
+            update(MarketplaceItem)
+            .where(MarketplaceItem.id.in_(item_ids))
+            .values(view_count=MarketplaceItem.view_count + 1)
+        )
+        await db.commit()
     
-    return [{
-        "id": str(item.id),
-        "name": item.name,
-        "slug": item.slug,
-        "short_description": item.short_description,
-        "item_type": item.item_type,
-        "pricing_model": item.pricing_model,
-        "price": float(item.price) if item.price else 0,
-        "rating_average": float(item.rating_average) if item.rating_average else 0,
-        "rating_count": item.rating_count,
-        "install_count": item.install_count,
-        "thumbnail_url": item.thumbnail_url,
-        "seller": {
-            "id": str(item.seller.id),
-            "username": item.seller.username,
-            "avatar_url": item.seller.avatar_url
-        },
-        "categories": [cat.slug for cat in item.categories]
-    } for item in items]
+    return [card for card in cards if card is not None]
 
 
 @router.get("/items/{item_id}")
@@ -236,6 +274,7 @@ async def get_marketplace_item(
 
 
 @router.post("/items/{item_id}/purchase")
+@invalidate_cache(CacheNamespace.MARKETPLACE)
 async def purchase_item(
     item_id: str,
     payment_method_id: Optional[str] = None,
@@ -4,12 +4,14 @@
 """
 
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.api.deps import get_current_user, get_db
+from app.core.config import settings
 from app.models.user import User
+from app.services.document_parsing import PARSED_FILE_TYPES, UploadTooLarge
 # Lazy import to avoid startup issues
 # from app.services.rag_service import RAGService
 from app.schemas.rag import (
@@ -37,6 +39,8 @@ class SearchRequest(BaseModel):
     filter: Optional[Dict[str, Any]] = None
     score_threshold: Optional[float] = None
     hybrid_alpha: Optional[float] = 0.5
+    fusion: Optional[str] = "weighted"  # weighted, rrf
+    rerank: Optional[bool] = True
     
 class SearchResponse(BaseModel):
     results: List[Dict[str, Any]]
@@ -48,6 +52,7 @@ class RAGStats(BaseModel):
     total_documents: int
     total_chunks: int
     total_embeddings: int
+    total_tokens: int = 0
     index_size: int
     last_updated: str
 
@@ -104,15 +109,28 @@ async def ingest_file(
             detail=f"File type .{file_ext} not supported"
         )
     
-    # Save file temporarily
-    file_content = await file.read()
-    result = await get_rag_service().ingest_file(
-        file_content,
-        file.filename,
-        file_ext,
-        metadata,
-        current_user.id
+    max_bytes = (
+        settings.RAG_INGEST_MAX_PARSED_BYTES if file_ext in PARSED_FILE_TYPES
+        else settings.RAG_INGEST_MAX_TEXT_BYTES
     )
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Files of type .{file_ext} are limited to {max_bytes} bytes"
+        )
+    
+    # The service reads the upload block by block and enforces the limit
+    # itself when the size is not known up front
+    try:
+        result = await get_rag_service().ingest_file(
+            file,
+            file.filename,
+            file_ext,
+            metadata,
+            current_user.id
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     return result
 
@@ -128,14 +146,16 @@ async def search_documents(
     # Add user filter
     if request.filter is None:
         request.filter = {}
-    request.filter['user_id'] = current_user.id
+    request.filter['user_id'] = str(current_user.id)
     
     result = await get_rag_service().search(
         request.query,
         request.top_k,
         request.filter,
         request.score_threshold,
-        request.hybrid_alpha
+        request.hybrid_alpha,
+        request.fusion or "weighted",
+        request.rerank is not False
     )
     
     return SearchResponse(**result)
@@ -176,33 +196,39 @@ async def clear_all_documents(
 
 @router.get("/sources")
 async def list_sources(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
-    List all document sources for the current user
+    List document sources for the current user
     """
-    sources = await get_rag_service().list_sources(current_user.id)
-    return {"sources": sources}
+    sources = await get_rag_service().list_sources(current_user.id, skip=skip, limit=limit)
+    return {"sources": sources, "skip": skip, "limit": limit}
 
 @router.post("/reindex")
 async def reindex_documents(
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
-) -> Dict[str, str]:
+) -> Dict[str, Any]:
     """
-    Reindex all documents (regenerate embeddings)
+    Reindex all documents (regenerate embeddings); resumes an unfinished job
     """
-    background_tasks.add_task(
-        get_rag_service().reindex_user_documents,
-        current_user.id
-    )
-    
-    return {
-        "status": "reindexing_started",
-        "message": "Document reindexing started in background"
-    }
+    return await get_rag_service().reindex_user_documents(current_user.id)
+
+@router.get("/reindex/status")
+async def get_reindex_status(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Progress of the current user's latest reindex job
+    """
+    status = await get_rag_service().get_reindex_status(current_user.id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No reindex job found")
+    return status
 
 @router.post("/context-basket", response_model=ContextBasketResponse)
 async def save_context_basket(
@@ -226,23 +252,25 @@ async def save_context_basket(
                 detail="One or more chunks not found"
             )
         
-        # Calculate total tokens
-        total_tokens = sum(len(chunk.content) // 4 for chunk in chunks)
-        
-        # Save context configuration
-        context_id = await get_rag_service().save_context_basket(
+        # Pack within the target model's budget and cache under a context_id
+        basket = await get_rag_service().save_context_basket(
             user_id=current_user.id,
             query=request.query,
             chunks=chunks,
             agent_id=request.agent_id,
-            custom_prompts=request.custom_prompts
+            custom_prompts=request.custom_prompts,
+            model=request.model,
+            max_tokens=request.max_tokens
         )
         
         return ContextBasketResponse(
             success=True,
             message="Context basket saved successfully",
-            context_id=context_id,
-            total_tokens=total_tokens
+            context_id=basket["context_id"],
+            total_tokens=basket["total_tokens"],
+            token_budget=basket["token_budget"],
+            included_chunks=[chunk["id"] for chunk in basket["chunks"]],
+            dropped_chunks=basket["dropped_chunks"]
         )
     except Exception as e:
         return ContextBasketResponse(
@@ -250,6 +278,20 @@ async def save_context_basket(
             message=f"Failed to save context basket: {str(e)}"
         )
 
+@router.get("/context-basket/{context_id}")
+async def get_context_basket(
+    context_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Get a packed context basket
+    """
+    basket = await get_rag_service().get_context_basket(context_id, current_user.id)
+    if basket is None:
+        raise HTTPException(status_code=404, detail="Context basket not found or expired")
+    return basket
+
 @router.get("/templates", response_model=List[RAGTemplate])
 async def list_templates(
     agent_id: Optional[str] = None,
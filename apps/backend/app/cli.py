@@ -22,6 +22,7 @@
 from app.services.rag_service import RAGService
 from app.db.session import get_db
 from app.services.execution_history_service import ExecutionHistoryService
+from app.services import execution_rollups
 
 console = Console()
 
@@ -264,23 +265,45 @@ def executions():
     pass
 
 @executions.command()
-@click.option('--days', default=30, help='Days to keep executions (default: 30)')
+@click.option('--days', default=30, help='Days to keep executions without their own TTL (default: 30)')
 @click.option('--dry-run', is_flag=True, help='Show what would be deleted without actually deleting')
-def cleanup(days: int, dry_run: bool):
+@click.option('--batch-size', type=int, default=None, help='Executions deleted per transaction')
+@click.option('--max-rows-per-second', type=int, default=None, help='Delete throughput budget; 0 = unthrottled')
+@click.option('--max-seconds', type=float, default=None, help='Stop after this long and print a resume cursor')
+@click.option('--resume', 'cursor', default=None, help='Cursor printed by a previous run')
+@click.option('--partitions', is_flag=True, help='Drop fully expired partitions of partitioned tables first')
+def cleanup(days: int, dry_run: bool, batch_size: Optional[int], max_rows_per_second: Optional[int],
+            max_seconds: Optional[float], cursor: Optional[str], partitions: bool):
     """Clean up expired executions"""
     async def run_cleanup():
         async for db in get_db():
             service = ExecutionHistoryService(db)
+            result = await service.cleanup_expired_executions(
+                days,
+                dry_run=dry_run,
+                batch_size=batch_size,
+                max_rows_per_second=max_rows_per_second,
+                max_seconds=max_seconds,
+                cursor=cursor,
+                drop_partitions=partitions
+            )
             
+            counts = (
+                f"{result['executions_deleted']} executions, {result['nodes_deleted']} nodes "
+                f"and {result['steps_deleted']} steps"
+            )
+            partition_names = ", ".join(result.get('partitions_dropped', [])) or "none"
             if dry_run:
-                # Calculate what would be deleted
-                cutoff_date = datetime.utcnow() - timedelta(days=days)
-                console.print(f"[yellow]Would delete executions older than {cutoff_date}[/yellow]")
-                # TODO: Add dry-run logic to service
+                console.print(f"[yellow]Would delete {counts}[/yellow]")
+                if partitions:
+                    console.print(f"[yellow]Would drop partitions: {partition_names}[/yellow]")
             else:
-                result = await service.cleanup_expired_executions(days)
-                console.print(f"[green]Deleted {result['executions_deleted']} executions and {result['nodes_deleted']} nodes[/green]")
-                console.print(f"Cutoff date: {result['cutoff_date']}")
+                console.print(f"[green]Deleted {counts} in {result['batches']} batches[/green]")
+                if partitions:
+                    console.print(f"[green]Dropped partitions: {partition_names}[/green]")
+                if result['resume_cursor']:
+                    console.print(f"[yellow]Time budget reached; continue with --resume {result['resume_cursor']}[/yellow]")
+            console.print(f"Default cutoff date: {result['cutoff_date']}")
             break
     
     asyncio.run(run_cleanup())
@@ -312,6 +335,8 @@ async def run_stats():
             stats_table.add_row("Total Cost", f"${stats['total_cost_dollars']:.2f}")
             if stats['avg_execution_time_formatted']:
                 stats_table.add_row("Average Execution Time", stats['avg_execution_time_formatted'])
+            if stats['execution_time_stddev_seconds'] is not None:
+                stats_table.add_row("Execution Time Std Dev", f"{stats['execution_time_stddev_seconds']:.1f}s")
             
             console.print(stats_table)
             break
@@ -365,6 +390,27 @@ async def run_metrics():
     
     asyncio.run(run_metrics())
 
+@executions.command('backfill-rollups')
+@click.option('--days', default=30, help='Days to rebuild, ending yesterday (default: 30)')
+@click.option('--ttl-days', default=30, help='Days cleanup keeps executions without their own TTL (default: 30)')
+def backfill_rollups(days: int, ttl_days: int):
+    """
+    Rebuild the daily execution rollups from the executions table; days
+    cleanup may already have thinned out are left as they are
+    """
+    async def run_backfill():
+        async for db in get_db():
+            start_day = datetime.utcnow().date() - timedelta(days=days)
+            first_day = await execution_rollups.first_complete_day(db, ttl_days)
+            if first_day is None:
+                console.print("[yellow]No executions to rebuild rollups from[/yellow]")
+                break
+            rows = await execution_rollups.backfill(db, start_day, default_ttl_days=ttl_days)
+            console.print(f"[green]Rebuilt {rows} rollup rows since {max(start_day, first_day)}[/green]")
+            break
+    
+    asyncio.run(run_backfill())
+
 @executions.command()
 @click.option('--days', default=30, help='Days to keep executions (default: 30)')
 def schedule_cleanup(days: int):
@@ -386,5 +432,43 @@ async def run_schedule():
     
     asyncio.run(run_schedule())
 
+# RAG Management Commands
+@cli.group()
+def rag():
+    """Manage the RAG vector store"""
+    pass
+
+@rag.command('migrate-collections')
+@click.option('--legacy/--no-legacy', default=True, help='Move chunks out of the old single shared collection')
+@click.option('--drop-legacy', is_flag=True, help='Delete the old collection after moving its chunks')
+@click.option('--min-chunks', type=int, default=None, help='Give users with at least this many chunks a dedicated collection')
+@click.option('--dry-run', is_flag=True, help='Show which users would be promoted without moving anything')
+def migrate_collections(legacy: bool, drop_legacy: bool, min_chunks: Optional[int], dry_run: bool):
+    """Migrate chunks into per-user sharded collections"""
+    async def run_migration():
+        service = RAGService()
+        
+        if legacy and not dry_run:
+            result = await service.migrate_legacy_collection(drop=drop_legacy)
+            console.print(f"[green]Moved {result['chunks_moved']} legacy chunks for {result['users']} users[/green]")
+        
+        promoted = await service.promote_large_users(min_chunks, dry_run=dry_run)
+        
+        table = Table(title="Would promote" if dry_run else "Promoted users")
+        table.add_column("User ID", style="cyan")
+        table.add_column("Chunks", style="green")
+        table.add_column("Collection", style="yellow")
+        for entry in promoted:
+            table.add_row(entry['user_id'], str(entry['chunks']), entry['target'])
+        console.print(table)
+        
+        if promoted and not dry_run:
+            # Old copies are kept until other workers stop routing users there
+            console.print("Waiting for workers to drop old collection assignments...")
+            purged = await service.collections.purge_retired(wait=True)
+            console.print(f"[green]Cleaned up {purged} old collections[/green]")
+    
+    asyncio.run(run_migration())
+
 if __name__ == '__main__':
     cli()
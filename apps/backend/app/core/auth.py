@@ -17,6 +17,7 @@
 import structlog
 
 from app.core.config import settings
+from app.db.routing import set_read_your_writes_key
 from app.db.session import get_db
 from app.models.user import User, UserStatus
 from app.models.tenant import Tenant, TenantStatus
@@ -123,6 +124,9 @@ async def get_current_user(
             detail="Invalid token payload"
         )
     
+    # Reads in this request stay on the primary if this user wrote recently
+    set_read_your_writes_key(db, user_id)
+    
     # Get user with tenant
     result = await db.execute(
         select(User).where(User.id == user_id)
@@ -3,23 +3,68 @@
 Caching service for CodexOS
 """
 
+import asyncio
+import inspect
 import json
-import pickle
-from typing import Optional, Any, Union, Callable
-from functools import wraps
-import hashlib
+import math
+import random
+import time
+import uuid
+from typing import Optional, Any, Awaitable, Union, Callable, Dict, List, Sequence, Set, Tuple
+from functools import partial, wraps
 import redis.asyncio as redis
 
+from app.core.cache_codecs import CODEC_PICKLE, CODEC_RAW, CacheCodec
+from app.core.cache_keys import key_function
 from app.core.config import settings
+from app.core.local_cache import LocalCache
 from app.core.monitoring import track_cache_hit, track_cache_miss
 
 
+def _parse_l1_namespaces(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse ``namespace:ttl:max_entries,...`` into {namespace: (ttl, max_entries)}"""
+    namespaces = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        namespace, ttl, max_entries = item.split(":")
+        namespaces[namespace] = (int(ttl), int(max_entries))
+    return namespaces
+
+
 class CacheManager:
-    """Redis-based cache manager with monitoring"""
+    """
+    Two-tier cache manager with monitoring.
+    
+    Namespaces listed in ``CACHE_L1_NAMESPACES`` are served from a bounded
+    in-process LRU (L1) before Redis (L2). L1 entries live for a few seconds
+    at most, and every write, delete or clear is published on a Redis pub/sub
+    channel so other workers drop their copy right away.
+    
+    Keys carry their namespace's generation number, so clearing a namespace
+    is a single INCR: entries of older generations are never read again and
+    expire on their own TTL.
+    """
+    
+    INVALIDATION_CHANNEL = "codexos:cache:invalidate"
     
     def __init__(self):
         self.redis_client: Optional[redis.Redis] = None
         self.default_ttl = settings.CACHE_TTL
+        self._l1: Dict[str, LocalCache] = {
+            namespace: LocalCache(max_entries=max_entries, ttl=ttl)
+            for namespace, (ttl, max_entries) in _parse_l1_namespaces(settings.CACHE_L1_NAMESPACES).items()
+        }
+        self._instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._generations: Dict[str, Tuple[float, int]] = {}
+        # Process-local caches of sync functions memoized with ``cached``
+        self._sync_memos: Dict[str, List[LocalCache]] = {}
+        self.codec = CacheCodec(
+            settings.CACHE_CODEC,
+            settings.CACHE_COMPRESSION,
+            settings.CACHE_COMPRESS_MIN_BYTES
+        )
     
     async def connect(self):
         """Connect to Redis"""
@@ -29,15 +74,127 @@ async def connect(self):
                 encoding="utf-8",
                 decode_responses=False  # We'll handle encoding/decoding
             )
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_for_invalidations())
     
     async def disconnect(self):
         """Disconnect from Redis"""
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
         if self.redis_client:
             await self.redis_client.close()
     
-    def _generate_key(self, namespace: str, key: str) -> str:
-        """Generate cache key with namespace"""
-        return f"codexos:{namespace}:{key}"
+    async def _generate_key(self, namespace: str, key: str) -> str:
+        """Generate cache key with namespace and its current generation"""
+        return self._versioned_key(namespace, await self._generation(namespace), key)
+    
+    @staticmethod
+    def _versioned_key(namespace: str, generation: int, key: str) -> str:
+        return f"codexos:{namespace}:g{generation}:{key}"
+    
+    async def _generation(self, namespace: str) -> int:
+        """Current generation of a namespace, cached for CACHE_GENERATION_TTL"""
+        cached = self._generations.get(namespace)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        
+        try:
+            generation = int(await self.redis_client.get(f"codexos:{namespace}:generation") or 0)
+        except Exception as e:
+            print(f"Cache generation error: {e}")
+            return cached[1] if cached is not None else 0
+        self._generations[namespace] = (time.monotonic() + settings.CACHE_GENERATION_TTL, generation)
+        return generation
+    
+    async def _listen_for_invalidations(self):
+        """Drop L1 entries and generations invalidated by other workers"""
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    if event["origin"] == self._instance_id:
+                        continue
+                    if event["keys"] is None:
+                        self._generations.pop(event["namespace"], None)
+                        for memo in self._sync_memos.get(event["namespace"], ()):
+                            memo.clear()
+                    l1 = self._l1.get(event["namespace"])
+                    if l1 is None:
+                        continue
+                    if event["keys"] is None:
+                        l1.clear()
+                    else:
+                        for full_key in event["keys"]:
+                            l1.delete(full_key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache invalidation listener error: {e}")
+            finally:
+                await pubsub.close()
+            
+            # Invalidations may have been missed while disconnected
+            self._generations.clear()
+            for l1 in self._l1.values():
+                l1.clear()
+            for memos in self._sync_memos.values():
+                for memo in memos:
+                    memo.clear()
+            await asyncio.sleep(1)
+    
+    def register_sync_memo(self, namespace: str, memo: LocalCache):
+        """Clear a sync function's local cache whenever its namespace is cleared"""
+        self._sync_memos.setdefault(namespace, []).append(memo)
+    
+    async def publish_clear(self, namespace: str):
+        """
+        Drop a namespace's in-process state (L1, generation, registered
+        memos) here and on other workers, leaving Redis untouched; for
+        callers that keep their own generation counter
+        """
+        if not self.redis_client:
+            await self.connect()
+        await self._invalidate_l1(namespace, None)
+    
+    async def _invalidate_l1(self, namespace: str, full_keys: Optional[List[str]]):
+        """
+        Drop L1 entries here and on other workers; with no keys, drop the
+        whole L1 namespace and the cached generation
+        """
+        l1 = self._l1.get(namespace)
+        if full_keys is None:
+            self._generations.pop(namespace, None)
+            for memo in self._sync_memos.get(namespace, ()):
+                memo.clear()
+            if l1 is not None:
+                l1.clear()
+        elif l1 is not None:
+            for full_key in full_keys:
+                l1.delete(full_key)
+        else:
+            return
+        
+        event = json.dumps({"origin": self._instance_id, "namespace": namespace, "keys": full_keys})
+        try:
+            await self.redis_client.publish(self.INVALIDATION_CHANNEL, event)
+        except Exception as e:
+            print(f"Cache invalidation publish error: {e}")
+    
+    def _deserialize(self, value: bytes, deserializer: str) -> Any:
+        return self.codec.decode(value, legacy=deserializer)
+    
+    def _serialize(self, value: Any, serializer: str) -> bytes:
+        if serializer == "json":
+            return self.codec.encode(value)
+        elif serializer == "pickle":
+            return self.codec.encode(value, codec=CODEC_PICKLE)
+        else:
+            return self.codec.encode(value, codec=CODEC_RAW)
     
     async def get(
         self, 
@@ -49,22 +206,28 @@ async def get(
         if not self.redis_client:
             await self.connect()
         
-        full_key = self._generate_key(namespace, key)
+        full_key = await self._generate_key(namespace, key)
+        l1 = self._l1.get(namespace)
         try:
+            # L1 holds the serialized bytes, so callers never share objects
+            if l1 is not None:
+                value = l1.get(full_key)
+                if value is not None:
+                    track_cache_hit(namespace, tier="l1")
+                    return self._deserialize(value, deserializer)
+                track_cache_miss(namespace, tier="l1")
+                epoch = l1.epoch
+            
             value = await self.redis_client.get(full_key)
             if value is None:
                 track_cache_miss(namespace)
                 return None
             
             track_cache_hit(namespace)
+            if l1 is not None:
+                l1.set(full_key, value, epoch=epoch)
             
-            # Deserialize based on type
-            if deserializer == "json":
-                return json.loads(value)
-            elif deserializer == "pickle":
-                return pickle.loads(value)
-            else:
-                return value.decode("utf-8") if isinstance(value, bytes) else value
+            return self._deserialize(value, deserializer)
                 
         except Exception as e:
             # Log error but don't crash
@@ -84,19 +247,17 @@ async def set(
         if not self.redis_client:
             await self.connect()
         
-        full_key = self._generate_key(namespace, key)
+        full_key = await self._generate_key(namespace, key)
         ttl = ttl or self.default_ttl
         
         try:
-            # Serialize based on type
-            if serializer == "json":
-                serialized = json.dumps(value)
-            elif serializer == "pickle":
-                serialized = pickle.dumps(value)
-            else:
-                serialized = str(value)
-            
+            serialized = self._serialize(value, serializer)
             await self.redis_client.setex(full_key, ttl, serialized)
+            
+            l1 = self._l1.get(namespace)
+            if l1 is not None:
+                await self._invalidate_l1(namespace, [full_key])
+                l1.set(full_key, serialized, ttl)
             return True
             
         except Exception as e:
@@ -109,28 +270,139 @@ async def delete(self, namespace: str, key: str) -> bool:
         if not self.redis_client:
             await self.connect()
         
-        full_key = self._generate_key(namespace, key)
+        full_key = await self._generate_key(namespace, key)
         try:
             result = await self.redis_client.delete(full_key)
+            await self._invalidate_l1(namespace, [full_key])
             return result > 0
         except Exception as e:
             print(f"Cache delete error: {e}")
             return False
     
-    async def clear_namespace(self, namespace: str) -> int:
-        """Clear all keys in a namespace"""
+    async def get_many(
+        self,
+        namespace: str,
+        keys: List[str],
+        deserializer: str = "json"
+    ) -> Dict[str, Any]:
+        """Get several values in one round trip (L1 first, then MGET); misses are left out"""
+        if not self.redis_client:
+            await self.connect()
+        if not keys:
+            return {}
+        
+        generation = await self._generation(namespace)
+        full_keys = {key: self._versioned_key(namespace, generation, key) for key in keys}
+        l1 = self._l1.get(namespace)
+        found: Dict[str, bytes] = {}
+        try:
+            if l1 is not None:
+                for key, full_key in full_keys.items():
+                    value = l1.get(full_key)
+                    if value is not None:
+                        found[key] = value
+                        track_cache_hit(namespace, tier="l1")
+                    else:
+                        track_cache_miss(namespace, tier="l1")
+                epoch = l1.epoch
+            
+            remaining = [key for key in full_keys if key not in found]
+            if remaining:
+                values = await self.redis_client.mget([full_keys[key] for key in remaining])
+                for key, value in zip(remaining, values):
+                    if value is None:
+                        track_cache_miss(namespace)
+                        continue
+                    track_cache_hit(namespace)
+                    found[key] = value
+                    if l1 is not None:
+                        l1.set(full_keys[key], value, epoch=epoch)
+            
+            return {key: self._deserialize(value, deserializer) for key, value in found.items()}
+        
+        except Exception as e:
+            print(f"Cache get_many error: {e}")
+            return {}
+    
+    async def set_many(
+        self,
+        namespace: str,
+        values: Dict[str, Any],
+        ttl: Optional[int] = None,
+        serializer: str = "json"
+    ) -> bool:
+        """Set several values in one pipelined round trip"""
         if not self.redis_client:
             await self.connect()
+        if not values:
+            return True
         
-        pattern = self._generate_key(namespace, "*")
+        generation = await self._generation(namespace)
+        ttl = ttl or self.default_ttl
         try:
-            keys = []
-            async for key in self.redis_client.scan_iter(match=pattern):
-                keys.append(key)
+            serialized = {
+                self._versioned_key(namespace, generation, key): self._serialize(value, serializer)
+                for key, value in values.items()
+            }
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for full_key, value in serialized.items():
+                    pipe.setex(full_key, ttl, value)
+                await pipe.execute()
             
-            if keys:
-                return await self.redis_client.delete(*keys)
+            l1 = self._l1.get(namespace)
+            if l1 is not None:
+                await self._invalidate_l1(namespace, list(serialized))
+                for full_key, value in serialized.items():
+                    l1.set(full_key, value, ttl)
+            return True
+        
+        except Exception as e:
+            print(f"Cache set_many error: {e}")
+            return False
+    
+    async def delete_many(self, namespace: str, keys: List[str]) -> int:
+        """Delete several values in one round trip"""
+        if not self.redis_client:
+            await self.connect()
+        if not keys:
             return 0
+        
+        generation = await self._generation(namespace)
+        full_keys = [self._versioned_key(namespace, generation, key) for key in keys]
+        try:
+            deleted = await self.redis_client.delete(*full_keys)
+            await self._invalidate_l1(namespace, full_keys)
+            return deleted
+        except Exception as e:
+            print(f"Cache delete_many error: {e}")
+            return 0
+    
+    async def incr(self, namespace: str, key: str) -> Optional[int]:
+        """Atomically increment a counter, returning the new value"""
+        if not self.redis_client:
+            await self.connect()
+        
+        full_key = await self._generate_key(namespace, key)
+        try:
+            value = await self.redis_client.incr(full_key)
+            await self._invalidate_l1(namespace, [full_key])
+            return value
+        except Exception as e:
+            print(f"Cache incr error: {e}")
+            return None
+    
+    async def clear_namespace(self, namespace: str) -> int:
+        """
+        Invalidate every key in a namespace in O(1) by bumping its generation;
+        returns the new generation
+        """
+        if not self.redis_client:
+            await self.connect()
+        
+        try:
+            generation = await self.redis_client.incr(f"codexos:{namespace}:generation")
+            await self._invalidate_l1(namespace, None)
+            return generation
             
         except Exception as e:
             print(f"Cache clear error: {e}")
@@ -142,82 +414,368 @@ async def get_or_set(
         key: str,
         factory: Callable,
         ttl: Optional[int] = None,
-        serializer: str = "json"
+        serializer: str = "json",
+        stale_ttl: Optional[int] = None,
+        beta: float = 1.0,
+        negative_ttl: Optional[int] = None
     ) -> Any:
-        """Get from cache or compute and set"""
-        # Try to get from cache first
-        value = await self.get(namespace, key, serializer)
-        if value is not None:
-            return value
+        """
+        Get from cache or compute and set, with stampede protection.
         
-        # Compute value
-        if asyncio.iscoroutinefunction(factory):
-            value = await factory()
-        else:
-            value = factory()
+        The value is stored together with its soft expiry and the time it
+        took to compute, and kept in Redis for ``stale_ttl`` seconds beyond
+        ``ttl``. Reads:
         
-        # Cache the result
-        await self.set(namespace, key, value, ttl, serializer)
+        - refresh early with a probability that rises as the soft expiry
+          nears, weighted by compute time (XFetch, scaled by ``beta``);
+        - serve a stale value while one background task recomputes it;
+        - on a cold miss, let a single task per key compute the value: a
+          local future coalesces callers in this worker and a Redis lock
+          makes other workers wait for the result instead of recomputing.
         
-        return value
+        ``negative_ttl``, if given, is used instead of ``ttl`` when the
+        factory returns ``None`` (``0`` leaves ``None`` uncached).
+        
+        Keys written here hold an envelope and should only be read through
+        ``get_or_set``.
+        """
+        ttl = ttl or self.default_ttl
+        stale_ttl = settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        if serializer not in ("json", "pickle"):
+            serializer = "json"
+        
+        entry = self._envelope(await self.get(namespace, key, serializer))
+        if entry is not None:
+            remaining = entry["fresh_until"] - time.time()
+            if remaining > entry["delta"] * beta * -math.log(1 - random.random()):
+                return entry["value"]
+            
+            # Stale or due for early refresh: serve what we have and refresh once
+            full_key = await self._generate_key(namespace, key)
+            if full_key not in self._inflight:
+                self._spawn(self._compute(namespace, key, factory, ttl, serializer, stale_ttl, negative_ttl))
+            return entry["value"]
+        
+        return await self._compute(
+            namespace, key, factory, ttl, serializer, stale_ttl, negative_ttl, wait=True
+        )
+    
+    @staticmethod
+    def _envelope(entry: Any) -> Optional[Dict[str, Any]]:
+        """
+        A value as written by ``get_or_set``; None for anything else under the
+        key (a plain ``set`` value, an older format), which is then recomputed
+        """
+        if (
+            isinstance(entry, dict)
+            and "value" in entry
+            and isinstance(entry.get("fresh_until"), (int, float))
+            and isinstance(entry.get("delta"), (int, float))
+        ):
+            return entry
+        return None
+    
+    def _spawn(self, coro):
+        """Run a background task, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+    
+    def _background_done(self, task: asyncio.Task):
+        """Forget a finished background task and report how it failed"""
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Cache background refresh error: {task.exception()!r}")
+    
+    async def _compute(
+        self,
+        namespace: str,
+        key: str,
+        factory: Callable,
+        ttl: int,
+        serializer: str,
+        stale_ttl: int,
+        negative_ttl: Optional[int] = None,
+        wait: bool = False
+    ) -> Any:
+        """Compute a value once per key across tasks (and, with ``wait``, across workers)"""
+        full_key = await self._generate_key(namespace, key)
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            lock = await self._acquire_lock(full_key)
+            if lock is None and wait:
+                entry = await self._wait_for_value(namespace, key, serializer)
+                if entry is not None:
+                    future.set_result(entry["value"])
+                    return entry["value"]
+            elif lock is None:
+                # Another worker is already refreshing this key
+                entry = self._envelope(await self.get(namespace, key, serializer))
+                value = entry["value"] if entry is not None else None
+                future.set_result(value)
+                return value
+            
+            try:
+                started = time.time()
+                value = factory()
+                if inspect.isawaitable(value):
+                    value = await value
+                delta = time.time() - started
+                
+                if value is None and negative_ttl is not None:
+                    ttl, stale_ttl = negative_ttl, 0
+                if ttl > 0:
+                    entry = {"value": value, "fresh_until": time.time() + ttl, "delta": delta}
+                    await self.set(namespace, key, entry, ttl + stale_ttl, serializer)
+            finally:
+                if lock is not None:
+                    await self._release_lock(full_key, lock)
+            
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+                # Nobody may be awaiting the future; don't warn about it
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(full_key, None)
+    
+    async def _acquire_lock(self, full_key: str, timeout_ms: Optional[int] = None) -> Optional[str]:
+        """Take the cross-worker compute lock for a key; returns its token"""
+        token = uuid.uuid4().hex
+        try:
+            if await self.redis_client.set(
+                f"{full_key}:lock", token, nx=True, px=timeout_ms or settings.CACHE_LOCK_TIMEOUT_MS
+            ):
+                return token
+            return None
+        except Exception as e:
+            # Without Redis there is nobody to coordinate with
+            print(f"Cache lock error: {e}")
+            return token
+    
+    async def _release_lock(self, full_key: str, token: str):
+        """Release a compute lock if we still hold it"""
+        try:
+            await self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"{full_key}:lock", token)
+        except Exception as e:
+            print(f"Cache unlock error: {e}")
+    
+    async def acquire_lease(self, name: str, ttl_ms: int) -> Optional[str]:
+        """
+        Claim a named job across workers for ``ttl_ms``; returns the lease
+        token, or None while another worker holds it. Long jobs keep the
+        lease with ``renew_lease`` and hand it back with ``release_lease``.
+        """
+        if not self.redis_client:
+            await self.connect()
+        return await self._acquire_lock(f"codexos:lease:{name}", ttl_ms)
+    
+    async def renew_lease(self, name: str, token: str, ttl_ms: int) -> bool:
+        """Extend a lease we still hold; False if it expired and was lost"""
+        try:
+            return bool(await self.redis_client.eval(
+                _RENEW_LOCK_SCRIPT, 1, f"codexos:lease:{name}:lock", token, ttl_ms
+            ))
+        except Exception as e:
+            print(f"Cache lease renew error: {e}")
+            return True
+    
+    async def release_lease(self, name: str, token: str):
+        """Give a lease back if we still hold it"""
+        await self._release_lock(f"codexos:lease:{name}", token)
+    
+    async def _wait_for_value(self, namespace: str, key: str, serializer: str) -> Optional[Any]:
+        """Poll for a value another worker is computing, until its lock would expire"""
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT_MS / 1000
+        delay = 0.01
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            entry = self._envelope(await self.get(namespace, key, serializer))
+            if entry is not None:
+                return entry
+            delay = min(delay * 2, 0.2)
+        return None
+
+
+# Releases a lock only if the caller's token still holds it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Extends a lock only if the caller's token still holds it
+_RENEW_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
 
 
 # Global cache instance
 cache_manager = CacheManager()
 
 
+class CacheLoader:
+    """
+    Request-scoped batching loader (DataLoader-style).
+    
+    ``load`` calls issued in the same event-loop tick are coalesced into one
+    ``get_many``; keys still missing are passed together to ``batch_load``
+    (which returns a {key: value} dict, e.g. from a single ``IN`` query) and
+    written back with one ``set_many``. Results are memoized for the
+    loader's lifetime, so create one per request.
+    """
+    
+    def __init__(
+        self,
+        namespace: str,
+        batch_load: Optional[Callable[[List[str]], Awaitable[Dict[str, Any]]]] = None,
+        ttl: Optional[int] = None,
+        key_prefix: str = "",
+        manager: Optional[CacheManager] = None
+    ):
+        self.namespace = namespace
+        self.batch_load = batch_load
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.manager = manager or cache_manager
+        self._results: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+    
+    def load(self, key: str) -> "asyncio.Future":
+        """Future resolving to the value for ``key`` (None if it cannot be loaded)"""
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._results[key] = future
+            if not self._pending:
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            self._pending.append(key)
+        return future
+    
+    async def load_many(self, keys: List[str]) -> List[Any]:
+        """Values for ``keys``, in order"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+    
+    async def _dispatch(self):
+        keys, self._pending = self._pending, []
+        try:
+            cached = await self.manager.get_many(
+                self.namespace, [self.key_prefix + key for key in keys]
+            )
+            values = {key: cached[self.key_prefix + key] for key in keys if self.key_prefix + key in cached}
+            
+            missing = [key for key in keys if key not in values]
+            if missing and self.batch_load is not None:
+                loaded = await self.batch_load(missing)
+                values.update(loaded)
+                await self.manager.set_many(
+                    self.namespace,
+                    {self.key_prefix + key: value for key, value in loaded.items()},
+                    self.ttl
+                )
+            
+            for key in keys:
+                self._results[key].set_result(values.get(key))
+        except Exception as e:
+            for key in keys:
+                if not self._results[key].done():
+                    self._results[key].set_exception(e)
+
+
 def cached(
     namespace: str,
     ttl: Optional[int] = None,
     key_prefix: str = "",
-    serializer: str = "json"
+    serializer: str = "json",
+    *,
+    key: Optional[Callable[..., Any]] = None,
+    ignore: Sequence[str] = (),
+    version: int = 1,
+    negative_ttl: Optional[int] = None,
+    local_max_entries: int = 1024
 ):
-    """Decorator for caching function results"""
+    """
+    Decorator for caching function results.
+    
+    The key is ``{key_prefix or qualified name}:v{version}:{digest}``, where
+    the digest covers the bound arguments (defaults applied, ``self``/``cls``
+    and names in ``ignore`` left out) or, if given, the result of
+    ``key(*args, **kwargs)``. Arguments without a canonical form raise
+    ``TypeError`` instead of risking collisions; see ``canonical``.
+    Bump ``version`` when the cached value's shape changes.
+    
+    Async functions go through ``get_or_set``. Sync functions are cached in
+    a process-local LRU that is cleared along with ``namespace``; their TTL
+    is capped at ``settings.CACHE_TTL``.
+    
+    ``None`` results are cached for ``negative_ttl`` seconds when it is set
+    (``0`` never caches them), otherwise like any other value.
+    
+    The wrapper exposes ``cache_key(*args, **kwargs)`` and
+    ``invalidate(*args, **kwargs)``.
+    """
     def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # Generate cache key from function name and arguments
-            key_parts = [key_prefix or func.__name__]
-            
-            # Add args to key
-            for arg in args:
-                if hasattr(arg, 'id'):  # For model instances
-                    key_parts.append(str(arg.id))
-                elif isinstance(arg, (str, int, float, bool)):
-                    key_parts.append(str(arg))
-                else:
-                    # Hash complex objects
-                    key_parts.append(hashlib.md5(str(arg).encode()).hexdigest()[:8])
-            
-            # Add kwargs to key
-            for k, v in sorted(kwargs.items()):
-                if isinstance(v, (str, int, float, bool)):
-                    key_parts.append(f"{k}:{v}")
-                else:
-                    key_parts.append(f"{k}:{hashlib.md5(str(v).encode()).hexdigest()[:8]}")
-            
-            cache_key = ":".join(key_parts)
-            
-            # Try to get from cache
-            cached_value = await cache_manager.get(namespace, cache_key, serializer)
-            if cached_value is not None:
-                return cached_value
-            
-            # Call the function
-            result = await func(*args, **kwargs)
+        cache_key = key_function(
+            func, key_prefix or f"{func.__module__}.{func.__qualname__}", key, ignore, version
+        )
+        
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await cache_manager.get_or_set(
+                    namespace,
+                    cache_key(*args, **kwargs),
+                    partial(func, *args, **kwargs),
+                    ttl,
+                    serializer,
+                    negative_ttl=negative_ttl
+                )
             
-            # Cache the result
-            await cache_manager.set(namespace, cache_key, result, ttl, serializer)
+            async def invalidate(*args, **kwargs):
+                await cache_manager.delete(namespace, cache_key(*args, **kwargs))
             
-            return result
+            async_wrapper.cache_key = cache_key
+            async_wrapper.invalidate = invalidate
+            return async_wrapper
+        
+        memo = LocalCache(max_entries=local_max_entries, ttl=ttl or settings.CACHE_TTL)
+        cache_manager.register_sync_memo(namespace, memo)
         
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
-            # For sync functions, we can't use async cache
-            # Just call the function directly
-            return func(*args, **kwargs)
+            full_key = cache_key(*args, **kwargs)
+            # Results are boxed so a cached None is told apart from a miss
+            entry = memo.get(full_key)
+            if entry is not None:
+                track_cache_hit(namespace, "l1")
+                return entry[0]
+            track_cache_miss(namespace, "l1")
+            
+            epoch = memo.epoch
+            value = func(*args, **kwargs)
+            if value is None and negative_ttl is not None:
+                if negative_ttl > 0:
+                    memo.set(full_key, (value,), negative_ttl, epoch)
+            else:
+                memo.set(full_key, (value,), epoch=epoch)
+            return value
         
-        return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
+        sync_wrapper.cache_key = cache_key
+        sync_wrapper.invalidate = lambda *args, **kwargs: memo.delete(cache_key(*args, **kwargs))
+        return sync_wrapper
     
     return decorator
 
@@ -259,6 +817,5 @@ class CacheNamespace:
     VAULT = "vault"
     SESSIONS = "sessions"
     PERMISSIONS = "permissions"
+    RAG_ASSIGNMENTS = "rag_assignments"  # Only cleared, to drop cached vector collection assignments
 
-
-import asyncio
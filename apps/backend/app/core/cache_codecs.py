@@ -0,0 +1,246 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Serialization and compression of cached values.
+
+Every encoded value starts with a small header::
+
+    b"CX" | header version | codec id | compression id | flags
+
+so readers pick the right codec per value, and the default codec or
+compression can change without flushing Redis. Values without the header are
+decoded the legacy way (plain JSON or pickle).
+
+Objects other than JSON types are only encoded if their type is registered
+with ``register_type``; ``datetime``, ``date``, ``UUID`` and ``Decimal`` are
+registered by default, and Pydantic models can be registered by class.
+"""
+
+import json
+import pickle
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b"CX"
+HEADER_VERSION = 1
+HEADER_SIZE = 6
+
+CODEC_RAW, CODEC_JSON, CODEC_ORJSON, CODEC_MSGPACK, CODEC_PICKLE = range(5)
+CODEC_IDS = {"raw": CODEC_RAW, "json": CODEC_JSON, "orjson": CODEC_ORJSON, "msgpack": CODEC_MSGPACK, "pickle": CODEC_PICKLE}
+
+COMPRESSION_NONE, COMPRESSION_ZSTD, COMPRESSION_LZ4, COMPRESSION_ZLIB = range(4)
+COMPRESSION_IDS = {"none": COMPRESSION_NONE, "zstd": COMPRESSION_ZSTD, "lz4": COMPRESSION_LZ4, "zlib": COMPRESSION_ZLIB}
+
+# Set when the payload contains tagged registered types that must be revived
+FLAG_TAGGED = 1
+
+_TAG = "__cx_type__"
+
+
+class CodecError(ValueError):
+    """A cached value cannot be encoded or decoded"""
+
+
+# name -> (type, to_payload, from_payload)
+_registry: Dict[str, Tuple[type, Callable[[Any], Any], Callable[[Any], Any]]] = {}
+_names: Dict[type, str] = {}
+
+
+def _dump_model(obj: Any) -> Any:
+    return obj.model_dump(mode="json")
+
+
+def register_type(
+    cls: Type,
+    name: Optional[str] = None,
+    encode: Optional[Callable[[Any], Any]] = None,
+    decode: Optional[Callable[[Any], Any]] = None
+):
+    """
+    Allow instances of ``cls`` in cached values.
+
+    ``encode`` turns an instance into JSON-compatible data and ``decode``
+    rebuilds it. Pydantic models default to ``model_dump(mode="json")`` and
+    ``model_validate``. ``name`` is stored with the value, so keep it stable.
+    """
+    name = name or f"{cls.__module__}.{cls.__qualname__}"
+    if encode is None and hasattr(cls, "model_dump"):
+        encode = _dump_model
+    if decode is None and hasattr(cls, "model_validate"):
+        decode = cls.model_validate
+    if encode is None or decode is None:
+        raise ValueError(f"register_type needs encode/decode for {cls!r}")
+    _registry[name] = (cls, encode, decode)
+    _names[cls] = name
+
+
+register_type(datetime, "datetime", datetime.isoformat, datetime.fromisoformat)
+register_type(date, "date", date.isoformat, date.fromisoformat)
+register_type(UUID, "uuid", str, UUID)
+register_type(Decimal, "decimal", str, Decimal)
+
+
+class _Tagger:
+    """``default`` hook that tags registered types and remembers it did"""
+
+    def __init__(self):
+        self.tagged = False
+
+    def __call__(self, obj: Any) -> Any:
+        name = _names.get(type(obj))
+        if name is None:
+            for cls, candidate in _names.items():
+                if isinstance(obj, cls):
+                    name = candidate
+                    break
+            else:
+                raise TypeError(f"Type {type(obj).__name__} is not registered for caching")
+        self.tagged = True
+        return {_TAG: name, "v": _registry[name][1](obj)}
+
+
+def _revive(value: Any) -> Any:
+    """Rebuild registered types from their tagged form"""
+    if isinstance(value, dict):
+        name = value.get(_TAG)
+        if name is not None and len(value) == 2:
+            return _registry[name][2](_revive(value["v"]))
+        return {key: _revive(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_revive(item) for item in value]
+    return value
+
+
+def _dumps(value: Any, codec: int, tagger: _Tagger) -> bytes:
+    if codec == CODEC_ORJSON:
+        # Passthrough keeps datetimes tagged; orjson still writes UUIDs as strings
+        return orjson.dumps(
+            value,
+            default=tagger,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        )
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(value, default=tagger, use_bin_type=True, datetime=False)
+    if codec == CODEC_JSON:
+        return json.dumps(value, default=tagger, separators=(",", ":")).encode("utf-8")
+    if codec == CODEC_PICKLE:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+
+def _loads(payload: bytes, codec: int) -> Any:
+    if codec == CODEC_ORJSON:
+        return orjson.loads(payload)
+    if codec == CODEC_MSGPACK:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if codec == CODEC_JSON:
+        return json.loads(payload)
+    if codec == CODEC_PICKLE:
+        return pickle.loads(payload)
+    return payload.decode("utf-8")
+
+
+def _compress(payload: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    if compression == COMPRESSION_LZ4:
+        return lz4.frame.compress(payload)
+    return zlib.compress(payload, 6)
+
+
+def _decompress(payload: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if compression == COMPRESSION_LZ4:
+        return lz4.frame.decompress(payload)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(payload)
+    raise CodecError(f"Unknown compression {compression}")
+
+
+def available_codec(name: str) -> int:
+    """Codec id for a configured name, falling back to stdlib JSON if not installed"""
+    codec = CODEC_IDS.get(name, CODEC_JSON)
+    if (codec == CODEC_ORJSON and orjson is None) or (codec == CODEC_MSGPACK and msgpack is None):
+        return CODEC_JSON
+    return codec
+
+
+def available_compression(name: str) -> int:
+    """Compression id for a configured name, falling back to zlib if not installed"""
+    compression = COMPRESSION_IDS.get(name, COMPRESSION_ZLIB)
+    if (compression == COMPRESSION_ZSTD and zstandard is None) or (compression == COMPRESSION_LZ4 and lz4 is None):
+        return COMPRESSION_ZLIB
+    return compression
+
+
+class CacheCodec:
+    """Encodes values with a codec, compressing payloads above ``compress_min_bytes``"""
+
+    def __init__(self, codec: str = "orjson", compression: str = "zstd", compress_min_bytes: int = 1024):
+        self.codec = available_codec(codec)
+        self.compression = available_compression(compression)
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, value: Any, codec: Optional[int] = None) -> bytes:
+        codec = self.codec if codec is None else codec
+        tagger = _Tagger()
+        try:
+            payload = _dumps(value, codec, tagger)
+        except TypeError as e:
+            raise CodecError(str(e)) from e
+
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(payload) >= self.compress_min_bytes:
+            compressed = _compress(payload, self.compression)
+            if len(compressed) < len(payload):
+                payload, compression = compressed, self.compression
+
+        flags = FLAG_TAGGED if tagger.tagged else 0
+        return MAGIC + bytes((HEADER_VERSION, codec, compression, flags)) + payload
+
+    @staticmethod
+    def decode(data: bytes, legacy: Optional[str] = "json") -> Any:
+        """
+        Decode a value; ``legacy`` says how to read values written without a
+        header (``None`` rejects them)
+        """
+        if not data.startswith(MAGIC):
+            if legacy is None:
+                raise CodecError("Value has no cache header")
+            if legacy == "json":
+                return json.loads(data)
+            if legacy == "pickle":
+                return pickle.loads(data)
+            return data.decode("utf-8") if isinstance(data, bytes) else data
+
+        version, codec, compression, flags = data[2:HEADER_SIZE]
+        if version != HEADER_VERSION:
+            raise CodecError(f"Unsupported cache header version {version}")
+        payload = data[HEADER_SIZE:]
+        if compression != COMPRESSION_NONE:
+            payload = _decompress(payload, compression)
+        value = _loads(payload, codec)
+        return _revive(value) if flags & FLAG_TAGGED else value
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Stable cache keys from function arguments
+"""
+
+import hashlib
+import inspect
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Sequence
+from uuid import UUID
+
+
+def canonical(value: Any) -> Any:
+    """
+    JSON-compatible form of an argument that is equal exactly when the
+    arguments are equal, with types tagged so ``1``, ``"1"`` and ``True``
+    never collide.
+
+    Supported: JSON scalars, bytes, UUID, date/time, Decimal, Enum, lists,
+    tuples, sets, dicts, Pydantic models, SQLAlchemy instances (by class and
+    primary key) and objects defining ``__cache_key__()``. Anything else
+    raises ``TypeError`` rather than being keyed by ``str()``.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return {"b": value}
+    if isinstance(value, int):
+        return {"i": str(value)}
+    if isinstance(value, float):
+        return {"f": repr(value)}
+    if isinstance(value, bytes):
+        return {"x": value.hex()}
+    if isinstance(value, Enum):
+        return {"e": f"{type(value).__qualname__}.{value.name}"}
+    if isinstance(value, (UUID, Decimal)):
+        return {type(value).__name__: str(value)}
+    if isinstance(value, (datetime, date, time)):
+        return {type(value).__name__: value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {"s": sorted((canonical(item) for item in value), key=_sort_key)}
+    if isinstance(value, dict):
+        return {"d": sorted(([canonical(k), canonical(v)] for k, v in value.items()), key=_sort_key)}
+
+    cache_key = getattr(value, "__cache_key__", None)
+    if callable(cache_key):
+        return {"k": canonical(cache_key())}
+    if hasattr(value, "model_dump"):
+        return {type(value).__qualname__: canonical(value.model_dump(mode="json"))}
+
+    identity = _sqlalchemy_identity(value)
+    if identity is not None:
+        return {type(value).__qualname__: canonical(list(identity))}
+
+    raise TypeError(
+        f"Cannot derive a cache key from {type(value).__name__}; "
+        f"pass key= or ignore= to the decorator, or define __cache_key__()"
+    )
+
+
+def _sort_key(item: Any) -> str:
+    return json.dumps(item, sort_keys=True)
+
+
+def _sqlalchemy_identity(value: Any) -> Any:
+    """Primary key of a persistent SQLAlchemy instance, if it is one"""
+    if not hasattr(value, "_sa_instance_state"):
+        return None
+    from sqlalchemy import inspect
+
+    return inspect(value).identity
+
+
+def make_cache_key(
+    name: str,
+    args: Sequence[Any] = (),
+    kwargs: Optional[Dict[str, Any]] = None,
+    version: int = 1
+) -> str:
+    """``name:v{version}:{sha256 of the canonical arguments}``"""
+    payload = json.dumps([canonical(list(args)), canonical(kwargs or {})], sort_keys=True, separators=(",", ":"))
+    return f"{name}:v{version}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def key_function(
+    func: Callable,
+    name: str,
+    key: Optional[Callable[..., Any]] = None,
+    ignore: Sequence[str] = (),
+    version: int = 1
+) -> Callable[..., str]:
+    """
+    Build the cache key function for calls to ``func``.
+
+    Arguments are bound to the signature with defaults applied, so ``f(1)``
+    and ``f(x=1)`` share a key; ``self``, ``cls`` and names in ``ignore``
+    (sessions, clients) are left out. With ``key``, only
+    ``key(*args, **kwargs)`` is keyed.
+    """
+    signature = inspect.signature(func)
+    skipped = set(ignore) | {"self", "cls"}
+
+    def cache_key(*args: Any, **kwargs: Any) -> str:
+        if key is not None:
+            return make_cache_key(name, (key(*args, **kwargs),), version=version)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {param: value for param, value in bound.arguments.items() if param not in skipped}
+        return make_cache_key(name, kwargs=arguments, version=version)
+
+    return cache_key
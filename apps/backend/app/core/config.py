@@ -37,7 +37,32 @@ def assemble_cors_origins(cls, v: Union[str, List[str]]) -> List[str]:
 
     # Database
     DATABASE_URL: str
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    # Comma-separated read replica URLs; reads stay on the primary when empty
+    DATABASE_REPLICA_URLS: str = ""
+    DATABASE_REPLICA_POOL_SIZE: int = 10
+    DATABASE_REPLICA_MAX_OVERFLOW: int = 20
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5.0  # Replicas lagging more are skipped
+    DATABASE_REPLICA_CHECK_INTERVAL: float = 10.0
+    DATABASE_STICKY_SECONDS: float = 5.0  # Reads stay on the primary this long after a user's write
+    EXECUTION_CLEANUP_BATCH_SIZE: int = 500  # Executions deleted per transaction
+    EXECUTION_CLEANUP_MAX_ROWS_PER_SECOND: int = 5000  # Across executions, nodes and steps; 0 = unthrottled
     REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_TTL: int = 3600
+    CACHE_STALE_TTL: int = 300  # How long get_or_set may serve a value past its TTL while refreshing
+    CACHE_LOCK_TIMEOUT_MS: int = 10000
+    CACHE_CODEC: str = "orjson"  # orjson, msgpack or json
+    CACHE_COMPRESSION: str = "zstd"  # zstd, lz4, zlib or none
+    CACHE_COMPRESS_MIN_BYTES: int = 1024
+    CACHE_GENERATION_TTL: int = 5  # Fallback refresh of namespace generations if an invalidation is missed
+    # In-process L1 cache in front of Redis: comma-separated
+    # namespace:ttl_seconds:max_entries; other namespaces go straight to Redis
+    CACHE_L1_NAMESPACES: str = "permissions:30:10000,agents:60:2000,marketplace:60:5000,users:30:5000"
+    # In-memory backend of PerformanceService when Redis is not configured
+    PERF_CACHE_MAX_ENTRIES: int = 10000
+    PERF_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PERF_CACHE_EVICTION: str = "lru"  # lru or lfu
 
     # Security
     SECRET_KEY: str
@@ -56,6 +81,50 @@ def assemble_cors_origins(cls, v: Union[str, List[str]]) -> List[str]:
     CHROMA_HOST: str = "localhost"
     CHROMA_PORT: int = 8000
     CHROMA_COLLECTION: str = "codexos_rag"
+    RAG_COLLECTION_PREFIX: str = "codexos_documents"
+    RAG_COLLECTION_SHARDS: int = 16
+    RAG_MAX_OPEN_COLLECTIONS: int = 256
+    RAG_DEDICATED_COLLECTION_MIN_CHUNKS: int = 50000
+    RAG_VECTOR_BACKEND: str = "chroma"  # chroma, numpy
+    # Use the embedded index when Chroma is unreachable; only for single-host
+    # deployments, since each host would keep its own index
+    RAG_VECTOR_FALLBACK: bool = False
+    RAG_VECTOR_INDEX_DIR: str = "./vector_index"
+    RAG_VECTOR_INDEX_DTYPE: str = "float32"  # float32, float16
+    RAG_VECTOR_INDEX_NLIST: int = 0  # IVF buckets; 0 = exact search only
+
+    # Embeddings
+    RAG_EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    RAG_EMBEDDING_BATCH_SIZE: int = 64
+    RAG_EMBEDDING_CACHE_DIR: str = "./embedding_cache"
+    RAG_EMBEDDING_CACHE_REDIS: bool = False
+    RAG_EMBEDDING_CACHE_TTL: int = 30 * 24 * 3600
+    RAG_KEYWORD_INDEX_DIR: str = "./keyword_index"
+    RAG_KEYWORD_INDEX_MAX_PARTITIONS: int = 256  # Users whose BM25 partition stays loaded per process
+    RAG_SEARCH_CACHE_TTL: int = 300
+    RAG_QUERY_EMBEDDING_TTL: int = 60
+    RAG_INGEST_BATCH_SIZE: int = 256  # chunks written per batch
+    RAG_INGEST_READ_SIZE: int = 1024 * 1024  # bytes read from an upload at a time
+    RAG_INGEST_MAX_TEXT_BYTES: int = 256 * 1024 * 1024  # txt/md uploads, streamed
+    RAG_INGEST_MAX_PARSED_BYTES: int = 32 * 1024 * 1024  # pdf/json uploads, parsed whole in a worker
+    RAG_INGEST_PARSE_WORKERS: int = 2
+    RAG_REINDEX_PAGE_SIZE: int = 100
+    RAG_REINDEX_CHUNKS_PER_SECOND: float = 200.0
+
+    # Context packing
+    RAG_CONTEXT_DEFAULT_MODEL: str = "gpt-4"
+    RAG_CONTEXT_RESERVE_TOKENS: int = 1024  # Left free for the prompt and the completion
+    RAG_CONTEXT_TTL: int = 3600
+
+    # Reranking
+    RAG_RERANK_STAGES: str = "mmr"  # comma-separated, run in order: cross_encoder, mmr
+    RAG_RERANK_CANDIDATE_FACTOR: int = 3
+    RAG_RERANK_DEADLINE_MS: int = 250
+    RAG_MMR_LAMBDA: float = 0.7
+    RAG_MMR_BUDGET_MS: int = 20
+    RAG_CROSS_ENCODER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RAG_CROSS_ENCODER_BATCH_SIZE: int = 32
+    RAG_CROSS_ENCODER_BUDGET_MS: int = 150
 
     # Object Storage
     S3_ENDPOINT_URL: Optional[str] = None
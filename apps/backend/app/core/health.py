@@ -13,7 +13,7 @@
 
 from app.core.config import settings
 from app.core.monitoring import HealthStatus
-from app.db.session import engine
+from app.db.session import engine, replica_set
 
 
 class HealthChecker:
@@ -56,6 +56,10 @@ async def check_database(self) -> Dict[str, Any]:
                 "response_time_seconds": response_time,
                 "pool_size": pool_status.split()[0],
                 "pool_checked_out": pool_status.split()[2],
+                "replicas": [
+                    {"healthy": replica in replica_set.healthy, "lag_seconds": lag}
+                    for replica, lag in zip(replica_set.replicas, replica_set.lag)
+                ],
             }
         except Exception as e:
             return {
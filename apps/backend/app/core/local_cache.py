@@ -0,0 +1,208 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Bounded in-process caches: the L1 tier in front of Redis and the
+in-memory backend used when Redis is not configured
+"""
+
+import heapq
+import itertools
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LocalCache:
+    """
+    LRU cache with a fixed entry cap and per-entry expiry.
+
+    Expired entries are dropped when read or when they reach the LRU end, so
+    the cache never holds more than ``max_entries`` items. ``epoch`` advances
+    on every invalidation; a reader that fetched a value from the next tier
+    passes the epoch it saw to ``set`` so a value invalidated in the meantime
+    is not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.epoch = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, epoch: Optional[int] = None):
+        if epoch is not None and epoch != self.epoch:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self.epoch += 1
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self.epoch += 1
+        self._entries.clear()
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size", "frequency")
+
+    def __init__(self, value: Any, expires_at: Optional[float], size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.frequency = 1
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Approximate memory held by a value, following containers a few levels deep"""
+    size = sys.getsizeof(value)
+    if _depth >= 4:
+        return size
+    if isinstance(value, dict):
+        return size + sum(
+            estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, _depth + 1) for item in value)
+    return size
+
+
+class BoundedCache:
+    """
+    Cache bounded by entry count and approximate size, with optional TTLs.
+
+    Expiry times are kept in a min-heap, so expired entries are removed in
+    O(log n) each as operations run, without scanning or a background task.
+    Heap items left behind by overwrites and deletes are skipped when popped
+    and compacted once they outnumber live entries.
+
+    Entries are kept in frequency buckets, each in LRU order. With the
+    ``"lru"`` policy every entry stays in bucket 1, so eviction takes the
+    least recently used entry; with ``"lfu"`` reads move entries up (to
+    ``MAX_FREQUENCY``) and eviction takes the least recently used entry of
+    the lowest bucket.
+    """
+
+    MAX_FREQUENCY = 32
+
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy {policy!r}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.size = 0
+        self.evictions = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_frequency = 1
+        self._expiry_heap: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._touch(key, entry)
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: Optional[int] = None):
+        self._expire()
+        if key in self._entries:
+            self._remove(key)
+
+        size = estimate_size(value) if size is None else size
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        # Make room first so a new entry is never its own eviction victim
+        while self._entries and (
+            len(self._entries) >= self.max_entries
+            or (self.max_bytes is not None and self.size + size > self.max_bytes)
+        ):
+            self._evict()
+
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = _Entry(value, expires_at, size)
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_frequency = 1
+        self.size += size
+        if expires_at is not None:
+            heapq.heappush(self._expiry_heap, (expires_at, next(self._sequence), key))
+
+    def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+        self._expiry_heap.clear()
+        self._min_frequency = 1
+        self.size = 0
+
+    def _touch(self, key: str, entry: _Entry):
+        bucket = self._buckets[entry.frequency]
+        if self.policy == "lru" or entry.frequency >= self.MAX_FREQUENCY:
+            bucket.move_to_end(key)
+            return
+        del bucket[key]
+        if not bucket:
+            del self._buckets[entry.frequency]
+            if self._min_frequency == entry.frequency:
+                self._min_frequency += 1
+        entry.frequency += 1
+        self._buckets.setdefault(entry.frequency, OrderedDict())[key] = None
+
+    def _remove(self, key: str) -> _Entry:
+        entry = self._entries.pop(key)
+        bucket = self._buckets[entry.frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[entry.frequency]
+        self.size -= entry.size
+        return entry
+
+    def _evict(self):
+        if self._min_frequency not in self._buckets:
+            self._min_frequency = min(self._buckets)
+        key = next(iter(self._buckets[self._min_frequency]))
+        self._remove(key)
+        self.evictions += 1
+
+    def _expire(self):
+        heap = self._expiry_heap
+        now = time.monotonic()
+        while heap and heap[0][0] <= now:
+            expires_at, _, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(key)
+
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [
+                item for item in heap
+                if item[2] in self._entries and self._entries[item[2]].expires_at == item[0]
+            ]
+            heapq.heapify(self._expiry_heap)
@@ -64,13 +64,13 @@
 cache_hits = Counter(
     'cache_hits_total',
     'Total cache hits',
-    ['cache_type']
+    ['cache_type', 'tier']
 )
 
 cache_misses = Counter(
     'cache_misses_total',
     'Total cache misses',
-    ['cache_type']
+    ['cache_type', 'tier']
 )
 
 
@@ -185,14 +185,14 @@ def track_marketplace_transaction(transaction_type: str, status: str):
     marketplace_transactions_total.labels(type=transaction_type, status=status).inc()
 
 
-def track_cache_hit(cache_type: str):
-    """Track cache hit"""
-    cache_hits.labels(cache_type=cache_type).inc()
+def track_cache_hit(cache_type: str, tier: str = "redis"):
+    """Track cache hit (tier is "l1" for in-process hits, "redis" otherwise)"""
+    cache_hits.labels(cache_type=cache_type, tier=tier).inc()
 
 
-def track_cache_miss(cache_type: str):
+def track_cache_miss(cache_type: str, tier: str = "redis"):
     """Track cache miss"""
-    cache_misses.labels(cache_type=cache_type).inc()
+    cache_misses.labels(cache_type=cache_type, tier=tier).inc()
 
 
 def update_active_users(count: int):
@@ -0,0 +1,141 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Keyset (cursor) pagination.
+
+A ``Keyset`` is an ordering over a few columns ending in a unique one, e.g.
+``(created_at DESC, id DESC)``. A page continues strictly after the last row
+of the previous page, so deep pages cost the same as the first one and rows
+inserted meanwhile don't shift later pages. Cursors are opaque strings that
+carry the keyset's name and the last row's values.
+"""
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, false, literal, or_, tuple_
+from sqlalchemy.sql import Select
+
+
+class InvalidCursor(ValueError):
+    """A cursor is malformed or belongs to another ordering"""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, UUID):
+        return {"uuid": str(value)}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "uuid" in value:
+            return UUID(value["uuid"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+class Keyset:
+    """
+    Ordering for keyset pagination: ``columns`` are ``(column, descending)``
+    pairs, the last of which must be unique. Nullable columns sort NULLS LAST.
+    """
+
+    def __init__(self, name: str, *columns: Tuple[Any, bool]):
+        self.name = name
+        self.columns = columns
+
+    @staticmethod
+    def _nullable(column) -> bool:
+        return getattr(column.expression, "nullable", True)
+
+    def order_by(self) -> List[Any]:
+        clauses = []
+        for column, descending in self.columns:
+            clause = column.desc() if descending else column.asc()
+            clauses.append(clause.nulls_last() if self._nullable(column) else clause)
+        return clauses
+
+    def after(self, values: Sequence[Any]):
+        """Condition selecting rows that sort after a row with ``values``"""
+        directions = {descending for _, descending in self.columns}
+        if len(directions) == 1 and not any(self._nullable(column) for column, _ in self.columns):
+            # Row comparison lets the database walk a composite index
+            columns = tuple_(*(column for column, _ in self.columns))
+            bound = tuple_(*(literal(value, column.type) for (column, _), value in zip(self.columns, values)))
+            return columns < bound if directions.pop() else columns > bound
+        return self._after(list(self.columns), list(values))
+
+    def _after(self, columns, values):
+        (column, descending), value = columns[0], values[0]
+        rest = self._after(columns[1:], values[1:]) if len(columns) > 1 else None
+
+        if value is None:
+            # NULLs sort last, so only later keys within the NULL group follow
+            return and_(column.is_(None), rest) if rest is not None else false()
+
+        conditions = [column < value if descending else column > value]
+        if self._nullable(column):
+            conditions.append(column.is_(None))
+        if rest is not None:
+            conditions.append(and_(column == value, rest))
+        return or_(*conditions)
+
+    def apply(self, query: Select, cursor: Optional[str], limit: int) -> Select:
+        """Order ``query``, continue after ``cursor`` and fetch one extra row to detect a next page"""
+        query = query.order_by(*self.order_by())
+        if cursor:
+            query = query.where(self.after(self.decode(cursor)))
+        return query.limit(limit + 1)
+
+    def page(self, rows: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+        """Trim the extra row and return the page with the cursor of the next one"""
+        rows = list(rows)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, self.encode([getattr(rows[-1], column.key) for column, _ in self.columns])
+
+    def encode(self, values: Sequence[Any]) -> str:
+        payload = json.dumps([self.name, [_encode_value(value) for value in values]], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            name, values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            matches = name == self.name and len(values) == len(self.columns)
+            if matches:
+                values = [_decode_value(value) for value in values]
+        except (ValueError, TypeError, KeyError) as e:
+            raise InvalidCursor("Malformed cursor") from e
+        if not matches:
+            raise InvalidCursor("Cursor does not match this listing")
+        for (column, _), value in zip(self.columns, values):
+            if not self._fits(column, value):
+                raise InvalidCursor("Cursor value does not match its column")
+        return values
+
+    def _fits(self, column, value) -> bool:
+        """Whether a decoded cursor value can be compared with ``column``"""
+        if value is None:
+            return self._nullable(column)
+        try:
+            expected = column.type.python_type
+        except NotImplementedError:
+            return True
+        if isinstance(value, bool) and expected is not bool:
+            return False
+        if expected is float:
+            return isinstance(value, (int, float))
+        return isinstance(value, expected)
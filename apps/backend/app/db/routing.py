@@ -0,0 +1,186 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Read-replica routing for database sessions.
+
+Sessions built on ``RoutingSession`` send writes, locking reads and raw SQL
+to the primary and plain SELECTs to a healthy replica, the same one for the
+whole session so its reads never go back in time. Reads go back to the
+primary:
+
+- for the rest of a session once it has written, by a flush or by an
+  INSERT, UPDATE or DELETE statement;
+- for ``sticky_seconds`` after a commit with writes by the same
+  read-your-writes key (usually the user id), so a follow-up request sees
+  its own changes whichever worker serves it. The marker lives in Redis and
+  is looked up once per session;
+- when ``session.info["use_primary"]`` is set.
+
+``ReplicaSet.monitor`` measures replication lag periodically and takes
+replicas that lag too far, or fail to answer, out of rotation.
+"""
+
+import asyncio
+import random
+from typing import Any, List, Optional
+
+from sqlalchemy import Select, event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.core.local_cache import LocalCache
+
+STICKY_KEY = "read_your_writes_key"
+USE_PRIMARY = "use_primary"
+_WROTE = "wrote"
+_STICKY = "sticky"
+_READER = "reader"
+
+# Seconds since the last replayed transaction; 0 when there is nothing to replay
+_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaSet:
+    """Primary engine, replica engines and the replicas currently fit to serve reads"""
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: List[AsyncEngine],
+        max_lag_seconds: float = 5.0,
+        sticky_seconds: float = 5.0,
+        redis_client: Optional[Any] = None
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.healthy: List[AsyncEngine] = list(replicas)
+        self.lag: List[Optional[float]] = [None] * len(replicas)
+        self.max_lag_seconds = max_lag_seconds
+        self.sticky_seconds = sticky_seconds
+        # Read-your-writes markers are shared through Redis; this process's
+        # own writes are also remembered locally in case Redis is unreachable
+        self.redis = redis_client
+        self._recent_writes = LocalCache(max_entries=100000, ttl=sticky_seconds)
+
+    def reader(self) -> AsyncEngine:
+        """Engine for a read: a random healthy replica, or the primary if none"""
+        if not self.healthy:
+            return self.primary
+        return random.choice(self.healthy)
+
+    @staticmethod
+    def _marker(key) -> str:
+        return f"codexos:db:wrote:{key}"
+
+    async def record_write(self, key):
+        """Keep ``key``'s reads on the primary for ``sticky_seconds``, on every worker"""
+        self._recent_writes.set(str(key), True)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._marker(key), 1, px=int(self.sticky_seconds * 1000))
+        except Exception as e:
+            print(f"Read-your-writes marker error: {e}")
+
+    async def wrote_recently(self, key) -> bool:
+        if self._recent_writes.get(str(key)) is not None:
+            return True
+        if self.redis is None:
+            return False
+        try:
+            return bool(await self.redis.exists(self._marker(key)))
+        except Exception as e:
+            print(f"Read-your-writes marker error: {e}")
+            return False
+
+    async def check(self):
+        """Measure each replica's lag and update the healthy set"""
+        healthy = []
+        for index, replica in enumerate(self.replicas):
+            try:
+                async with replica.connect() as conn:
+                    lag = float((await conn.execute(_LAG_QUERY)).scalar() or 0)
+            except Exception as e:
+                print(f"Replica health check error: {e}")
+                lag = None
+            self.lag[index] = lag
+            if lag is not None and lag <= self.max_lag_seconds:
+                healthy.append(replica)
+        self.healthy = healthy
+
+    async def monitor(self, interval: float = 10.0):
+        """Run ``check`` until cancelled"""
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+    def session_class(self) -> type:
+        """``RoutingSession`` subclass bound to this replica set"""
+        return type("RoutingSession", (RoutingSession,), {"replica_set": self})
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+class RoutingSession(Session):
+    """Sync session behind ``AsyncSession`` that routes statements via a ``ReplicaSet``"""
+
+    replica_set: Optional[ReplicaSet] = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica_set = self.replica_set
+        if replica_set is None or not replica_set.replicas:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        if self._uses_primary(clause):
+            return replica_set.primary.sync_engine
+        return self._reader().sync_engine
+
+    def _reader(self) -> AsyncEngine:
+        """The session's replica, picked on its first read and kept while healthy"""
+        reader = self.info.get(_READER)
+        if reader is None or reader not in self.replica_set.healthy:
+            reader = self.info[_READER] = self.replica_set.reader()
+        return reader
+
+    def _uses_primary(self, clause) -> bool:
+        if self._flushing or self.info.get(_WROTE) or self.info.get(USE_PRIMARY):
+            return True
+        # Writes, raw SQL and SELECT ... FOR UPDATE
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return True
+        key = self.info.get(STICKY_KEY)
+        if key is None:
+            return False
+        # Runs inside the AsyncSession's greenlet, so the lookup can be awaited
+        if _STICKY not in self.info:
+            self.info[_STICKY] = await_only(self.replica_set.wrote_recently(key))
+        return self.info[_STICKY]
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written(session, flush_context):
+    session.info[_WROTE] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_dml_written(orm_execute_state):
+    # Core and bulk DML run through session.execute never flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_WROTE] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_write(session):
+    key = session.info.get(STICKY_KEY)
+    if key is not None and session.info.get(_WROTE) and session.replica_set is not None:
+        await_only(session.replica_set.record_write(key))
+
+
+def set_read_your_writes_key(session, key):
+    """Make reads in ``session`` stick to the primary after recent writes by ``key``"""
+    session.info[STICKY_KEY] = str(key)
+    session.info.pop(_STICKY, None)
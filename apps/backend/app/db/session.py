@@ -3,25 +3,49 @@
 Database session management for CodexOS
 """
 
+import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.routing import USE_PRIMARY, ReplicaSet
 
-# Create async engine
+# Create async engines: the primary, plus replicas that serve reads
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
     future=True,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
     pool_pre_ping=True,
 )
 
-# Create async session factory
+replica_engines = [
+    create_async_engine(
+        url.strip(),
+        echo=settings.DEBUG,
+        future=True,
+        pool_size=settings.DATABASE_REPLICA_POOL_SIZE,
+        max_overflow=settings.DATABASE_REPLICA_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
+    for url in settings.DATABASE_REPLICA_URLS.split(",")
+    if url.strip()
+]
+
+replica_set = ReplicaSet(
+    engine,
+    replica_engines,
+    max_lag_seconds=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+    sticky_seconds=settings.DATABASE_STICKY_SECONDS,
+    redis_client=redis.from_url(settings.REDIS_URL) if replica_engines else None,
+)
+
+# Create async session factory; reads are routed to replicas when configured
 AsyncSessionLocal = sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=replica_set.session_class(),
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
@@ -35,3 +59,13 @@ async def get_db() -> AsyncSession:
             yield session
         finally:
             await session.close()
+
+
+async def get_primary_db() -> AsyncSession:
+    """Dependency for a session whose reads always go to the primary"""
+    async with AsyncSessionLocal() as session:
+        session.info[USE_PRIMARY] = True
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -3,6 +3,7 @@
 CodexOS Backend API - Main application entry point
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 
 import sentry_sdk
@@ -17,7 +18,7 @@
 from app.core.config import settings
 from app.core.health import get_health_status
 from app.db.init_db import init_db
-from app.db.session import engine
+from app.db.session import engine, replica_set
 from app.websocket.manager import manager
 from app.services.monitoring_service import monitoring_service
 # from app.services.performance_service import performance_service
@@ -38,6 +39,13 @@ async def lifespan(app: FastAPI):
     monitoring_service.instrument_http_client()
     monitoring_service.instrument_redis()
     
+    # Route reads around lagging replicas
+    replica_monitor = None
+    if replica_set.replicas:
+        replica_monitor = asyncio.create_task(
+            replica_set.monitor(settings.DATABASE_REPLICA_CHECK_INTERVAL)
+        )
+    
     # Set the database engine in the performance service
     # performance_service.set_database_engine(engine)
     
@@ -47,6 +55,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print(f"👋 Shutting down {settings.APP_NAME}")
+    if replica_monitor:
+        replica_monitor.cancel()
+    await replica_set.dispose()
     await engine.dispose()
 
 
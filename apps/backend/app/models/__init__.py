@@ -7,9 +7,9 @@
 from app.models.oauth import TenantOAuthConfig, OAuthUser, IdentityProviderType, AuthEvent, AuthEventType
 from app.models.secure_vault import SecureVault, VaultAccessLog as SecureVaultAccessLog, VaultEncryptionKey, VaultItemType, VaultItemStatus
 from app.models.audit import AuditLog, AuditEventCategory, AuditEventType, ComplianceReport
-from app.models.agent import AgentFlow, Execution, NodeType
+from app.models.agent import AgentFlow, Execution, ExecutionDailyRollup, NodeType
 from app.models.vault import VaultItem, VaultAccessLog as LegacyVaultAccessLog
-from app.models.rag import Document, DocumentChunk, SearchHistory
+from app.models.rag import Document, DocumentChunk, SearchHistory, VectorCollectionAssignment
 from app.models.marketplace import (
     MarketplaceCategory, MarketplaceItem, MarketplacePurchase,
     MarketplaceSubscription, MarketplaceReview, MarketplaceAnalytics,
@@ -57,6 +57,7 @@
     # Agent models
     "AgentFlow",
     "Execution",
+    "ExecutionDailyRollup",
     "NodeType",
     
     # Legacy Vault models
@@ -67,6 +68,7 @@
     "Document",
     "DocumentChunk",
     "SearchHistory",
+    "VectorCollectionAssignment",
     
     # Marketplace models
     "MarketplaceCategory",
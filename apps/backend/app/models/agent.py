@@ -5,8 +5,10 @@
 from uuid import uuid4
 from datetime import datetime
 
-from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, Index
-from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy import (
+    JSON, BigInteger, Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, String, Text, Index, func
+)
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PGUUID
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base, TimestampMixin
@@ -195,6 +197,14 @@ class Execution(Base, TimestampMixin):
     original_execution = relationship("Execution", remote_side=[id])
     replay_executions = relationship("Execution", remote_side=[original_execution_id])
 
+    # Keyset pagination of a user's history, newest first
+    __table_args__ = (
+        Index('idx_execution_user_created', 'user_id', 'created_at', 'id'),
+        Index('idx_execution_flow_user_created', 'flow_id', 'user_id', 'created_at', 'id'),
+        # Retention cleanup, oldest first
+        Index('idx_execution_created', 'created_at', 'id'),
+    )
+
 
 class ExecutionNode(Base, TimestampMixin):
     """Detailed node-level execution tracking"""
@@ -304,3 +314,41 @@ class ExecutionStep(Base, TimestampMixin):
     
     def __repr__(self):
         return f"<ExecutionStep(id={self.id}, step={self.step_number}, type='{self.step_type}', execution={self.execution_id})>"
+
+
+# Upper bounds (ms) of the execution duration histogram; one more bucket holds longer runs
+DURATION_BUCKETS_MS = (1000, 5000, 15000, 60000, 300000, 900000)
+
+
+class ExecutionDailyRollup(Base):
+    """Finished executions per tenant, user, flow and UTC day, for statistics"""
+
+    __tablename__ = "execution_daily_rollups"
+
+    tenant_id = Column(PGUUID(as_uuid=True), ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    flow_id = Column(PGUUID(as_uuid=True), ForeignKey("agent_flows.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC day the executions were created
+    
+    # Counts
+    executions = Column(Integer, nullable=False, default=0)
+    successful = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    
+    # Resource usage
+    tokens_used = Column(BigInteger, nullable=False, default=0)
+    cost_cents = Column(BigInteger, nullable=False, default=0)
+    
+    # Durations of completed executions: count, sum and sum of squares for
+    # mean and variance, and counts per DURATION_BUCKETS_MS bucket
+    duration_count = Column(Integer, nullable=False, default=0)
+    duration_ms_sum = Column(BigInteger, nullable=False, default=0)
+    duration_ms_sumsq = Column(Float, nullable=False, default=0)
+    duration_buckets = Column(ARRAY(Integer), nullable=False)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_execution_rollup_user_day', 'user_id', 'day'),
+        Index('idx_execution_rollup_flow_day', 'flow_id', 'day'),
+    )
@@ -8,7 +8,7 @@
 from datetime import datetime
 from decimal import Decimal
 
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Integer, Numeric, Index, UniqueConstraint, CheckConstraint, Table
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Integer, Numeric, Index, UniqueConstraint, CheckConstraint, Table, text
 from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB, ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -174,6 +174,16 @@ class MarketplaceItem(Base, TimestampMixin):
         Index('idx_marketplace_item_status_type', 'status', 'item_type'),
         Index('idx_marketplace_item_seller', 'seller_id', 'status'),
         Index('idx_marketplace_item_search', 'status', 'is_private', 'name'),
+        # Keyset pagination of published search results
+        Index('idx_marketplace_item_popular', install_count.desc().nulls_last(), id.desc(),
+              postgresql_where=text("status = 'published' AND NOT is_private")),
+        Index('idx_marketplace_item_newest', published_at.desc().nulls_last(), id.desc(),
+              postgresql_where=text("status = 'published' AND NOT is_private")),
+        Index('idx_marketplace_item_rating', rating_average.desc().nulls_last(),
+              rating_count.desc().nulls_last(), id.desc(),
+              postgresql_where=text("status = 'published' AND NOT is_private")),
+        Index('idx_marketplace_item_price', price.asc().nulls_last(), id.asc(),
+              postgresql_where=text("status = 'published' AND NOT is_private")),
     )
     
     @hybrid_property
@@ -18,7 +18,7 @@ class Document(Base, TimestampMixin):
     
     id = Column(PGUUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    external_id = Column(String(255), unique=True, index=True)  # External document ID
+    external_id = Column(String(255))  # External document ID, unique per user
     name = Column(String(255), nullable=False)
     source_type = Column(String(50), nullable=False)  # pdf, github, web, text
     source_url = Column(String(500))
@@ -34,7 +34,9 @@ class Document(Base, TimestampMixin):
     
     # Indexes
     __table_args__ = (
+        Index('idx_document_user_external', 'user_id', 'external_id', unique=True),
         Index('idx_document_user_status', 'user_id', 'status'),
+        Index('idx_document_user_created', 'user_id', 'created_at'),
         Index('idx_document_source_type', 'source_type'),
     )
 
@@ -46,6 +48,7 @@ class DocumentChunk(Base, TimestampMixin):
     document_id = Column(PGUUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
+    content_hash = Column(String(64))  # SHA-256 of content
     embedding_id = Column(String(255))  # ID in vector store
     extra_data = Column(JSON, default={})
     token_count = Column(Integer)
@@ -79,3 +82,14 @@ class SearchHistory(Base, TimestampMixin):
     __table_args__ = (
         Index('idx_search_user_created', 'user_id', 'created_at'),
     )
+
+class VectorCollectionAssignment(Base, TimestampMixin):
+    """Dedicated vector store collection of a user (absent = hash shard)"""
+    __tablename__ = "vector_collection_assignments"
+    
+    user_id = Column(PGUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    collection_name = Column(String(63), nullable=False)
+    # Collection the user moved out of; its chunks are deleted once no worker
+    # can still be routing the user there
+    retired_collection = Column(String(63))
+    retired_until = Column(DateTime(timezone=True))
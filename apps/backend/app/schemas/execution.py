@@ -125,3 +125,39 @@ class ExecutionStepFilter(BaseModel):
     can_replay_from: Optional[bool] = Field(None, description="Filter by replay capability")
     start_date: Optional[datetime] = Field(None, description="Start date filter")
     end_date: Optional[datetime] = Field(None, description="End date filter")
+
+
+class DurationBucket(BaseModel):
+    """Schema for one bucket of the execution duration histogram"""
+    le_ms: Optional[int] = Field(None, description="Upper bound in ms; None for the overflow bucket")
+    count: int
+
+
+class ExecutionStatisticsResponse(BaseModel):
+    """Schema for execution statistics responses"""
+    period_days: int
+    total_executions: int
+    successful_executions: int
+    failed_executions: int
+    success_rate: float
+    total_tokens: int
+    total_cost_cents: int
+    total_cost_dollars: float
+    avg_execution_time_seconds: Optional[float] = None
+    avg_execution_time_formatted: Optional[str] = None
+    execution_time_stddev_seconds: Optional[float] = None
+    duration_histogram: List[DurationBucket]
+
+
+class NodePerformance(BaseModel):
+    """Schema for per node type performance"""
+    node_type: str
+    execution_count: int
+    avg_duration_ms: Optional[float] = None
+    avg_duration_formatted: Optional[str] = None
+
+
+class AgentPerformanceResponse(ExecutionStatisticsResponse):
+    """Schema for agent flow performance responses"""
+    flow_id: UUID
+    node_performance: List[NodePerformance]
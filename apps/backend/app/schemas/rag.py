@@ -68,6 +68,8 @@ class ContextBasketRequest(BaseModel):
     selected_chunks: List[str]  # chunk IDs
     agent_id: Optional[str] = None
     custom_prompts: Optional[Dict[str, str]] = None  # chunk_id -> custom prompt
+    model: Optional[str] = None  # target model, sets the token budget
+    max_tokens: Optional[int] = Field(default=None, ge=1)  # cap below the model's budget
 
 
 class ContextBasketResponse(BaseModel):
@@ -76,6 +78,9 @@ class ContextBasketResponse(BaseModel):
     message: str
     context_id: Optional[str] = None
     total_tokens: Optional[int] = None
+    token_budget: Optional[int] = None
+    included_chunks: Optional[List[str]] = None
+    dropped_chunks: Optional[List[str]] = None
 
 
 class RAGTemplate(BaseModel):
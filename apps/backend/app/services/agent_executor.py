@@ -4,13 +4,14 @@
 import json
 from typing import Any, Dict, Optional
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.models.agent import AgentFlow, Execution, ExecutionNode
 from app.models.user import User
+from app.services.execution_rollups import record_execution
 from app.websocket.manager import manager
 from app.core.config import settings
 
@@ -49,7 +50,7 @@ async def execute_flow(
             status="running",
             input_data=input_data,
             logs=[],
-            started_at=datetime.utcnow(),
+            started_at=datetime.now(timezone.utc),
         )
         self.db.add(execution)
         await self.db.commit()
@@ -73,7 +74,8 @@ async def execute_flow(
             execution.logs = result["logs"]
             execution.tokens_used = result.get("tokens_used", 0)
             execution.cost_cents = result.get("cost_cents", 0)
-            execution.completed_at = datetime.utcnow()
+            execution.completed_at = datetime.now(timezone.utc)
+            await self._record_rollup(execution)
             
             await self.db.commit()
 
@@ -95,7 +97,8 @@ async def execute_flow(
                 "level": "error",
                 "message": f"Execution failed: {str(e)}",
             })
-            execution.completed_at = datetime.utcnow()
+            execution.completed_at = datetime.now(timezone.utc)
+            await self._record_rollup(execution)
             
             await self.db.commit()
 
@@ -208,3 +211,8 @@ async def _send_ws_update(self, execution_id: UUID, data: Dict[str, Any]):
             json.dumps(data),
             str(execution_id)
         )
+
+    async def _record_rollup(self, execution: Execution):
+        """Add the finished execution to the daily rollups, in the same transaction"""
+        if execution.tenant_id is not None:
+            await record_execution(self.db, execution)
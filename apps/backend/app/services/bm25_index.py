@@ -0,0 +1,352 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+BM25 keyword index maintained alongside the vector store
+"""
+
+import fcntl
+import json
+import math
+import os
+import re
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Identifiers such as ``get_user``, ``app.core.cache`` or ``HTTP-404`` are kept
+# whole, and their parts are indexed as well
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+(?:[.:/\-][A-Za-z0-9_]+)*")
+_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, keeping code symbols searchable"""
+    terms = []
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        terms.append(token.lower())
+        parts = [p.lower() for p in _PART_RE.findall(token)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class _Partition:
+    """
+    Inverted index for one user.
+
+    Postings are kept as compact ``array`` pairs (slot numbers, term
+    frequencies). Removing a chunk only tombstones its slot; the postings are
+    rewritten once tombstones make up a quarter of the slots.
+    """
+
+    def __init__(self):
+        self.chunk_ids: List[Optional[str]] = []
+        self.slot_of: Dict[str, int] = {}
+        self.doc_len = array("I")
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_len = 0
+
+        # What has been read from disk: the snapshot's identity and how far
+        # into which delta log. ``pending`` holds local changes not written yet.
+        self.snapshot: Optional[Tuple[int, int, int]] = None
+        self.log_inode: Optional[int] = None
+        self.log_offset = 0
+        self.pending: List[Dict[str, Any]] = []
+
+    @property
+    def live_count(self) -> int:
+        return len(self.slot_of)
+
+    def add(self, chunk_id: str, counts: Dict[str, int]):
+        """Index a chunk given its term frequencies"""
+        if chunk_id in self.slot_of:
+            self.remove(chunk_id)
+
+        length = sum(counts.values())
+        slot = len(self.chunk_ids)
+        self.chunk_ids.append(chunk_id)
+        self.slot_of[chunk_id] = slot
+        self.doc_len.append(length)
+        self.total_len += length
+
+        for term, tf in counts.items():
+            slots, tfs = self.postings.setdefault(term, (array("I"), array("H")))
+            slots.append(slot)
+            tfs.append(min(tf, 0xFFFF))
+
+    def remove(self, chunk_id: str):
+        slot = self.slot_of.pop(chunk_id, None)
+        if slot is None:
+            return
+        self.chunk_ids[slot] = None
+        self.total_len -= self.doc_len[slot]
+        self.doc_len[slot] = 0
+
+        if len(self.chunk_ids) - self.live_count > max(64, len(self.chunk_ids) // 4):
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned slots and renumber the remaining ones"""
+        remap = np.full(len(self.chunk_ids), -1, dtype=np.int64)
+        live = [slot for slot, chunk_id in enumerate(self.chunk_ids) if chunk_id is not None]
+        remap[live] = np.arange(len(live))
+
+        postings = {}
+        for term, (slots, tfs) in self.postings.items():
+            old = np.frombuffer(slots, dtype=np.uint32)
+            new = remap[old]
+            keep = new >= 0
+            if keep.any():
+                postings[term] = (
+                    array("I", new[keep].astype(np.uint32).tobytes()),
+                    array("H", np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes()),
+                )
+
+        self.chunk_ids = [self.chunk_ids[slot] for slot in live]
+        self.slot_of = {chunk_id: slot for slot, chunk_id in enumerate(self.chunk_ids)}
+        self.doc_len = array("I", (self.doc_len[slot] for slot in live))
+        self.postings = postings
+
+    def apply(self, change: Dict[str, Any]):
+        """Replay one delta log entry; entries are idempotent"""
+        for chunk_id, counts in change.get("add", []):
+            self.add(chunk_id, counts)
+        for chunk_id in change.get("remove", []):
+            self.remove(chunk_id)
+
+    def search(self, query: str, top_k: int, k1: float, b: float) -> List[Tuple[str, float]]:
+        if not self.slot_of:
+            return []
+
+        n_docs = self.live_count
+        avg_len = self.total_len / n_docs if n_docs else 0.0
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32).astype(np.float32)
+        alive = doc_len > 0
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            slots = np.frombuffer(posting[0], dtype=np.uint32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            live = alive[slots]
+            df = int(live.sum())
+            if df == 0:
+                continue
+            slots, tfs = slots[live], tfs[live]
+
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * doc_len[slots] / (avg_len or 1.0))
+            scores[slots] += idf * tfs * (k1 + 1) / (tfs + norm)
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.chunk_ids[slot], float(scores[slot])) for slot in hits]
+
+    def save(self, path: str):
+        """Write the partition atomically as a single .npz file"""
+        self.compact()
+        terms = list(self.postings)
+        lengths = np.array([len(self.postings[t][0]) for t in terms], dtype=np.int64)
+        slots = b"".join(self.postings[t][0].tobytes() for t in terms)
+        tfs = b"".join(self.postings[t][1].tobytes() for t in terms)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                chunk_ids=np.array(json.dumps(self.chunk_ids)),
+                terms=np.array(json.dumps(terms)),
+                lengths=lengths,
+                doc_len=np.frombuffer(self.doc_len, dtype=np.uint32),
+                slots=np.frombuffer(slots, dtype=np.uint32),
+                tfs=np.frombuffer(tfs, dtype=np.uint16),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "_Partition":
+        partition = cls()
+        with np.load(path) as data:
+            partition.chunk_ids = json.loads(str(data["chunk_ids"]))
+            terms = json.loads(str(data["terms"]))
+            offsets = np.concatenate([[0], np.cumsum(data["lengths"])])
+            slots, tfs = data["slots"], data["tfs"]
+            partition.doc_len = array("I", data["doc_len"].tobytes())
+            for i, term in enumerate(terms):
+                start, end = offsets[i], offsets[i + 1]
+                partition.postings[term] = (
+                    array("I", slots[start:end].tobytes()),
+                    array("H", tfs[start:end].tobytes()),
+                )
+        partition.slot_of = {chunk_id: slot for slot, chunk_id in enumerate(partition.chunk_ids)}
+        partition.total_len = int(sum(partition.doc_len))
+        return partition
+
+
+def _term_counts(text: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for term in tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def _identity(path: str) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime, size) of a file, None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class BM25Index:
+    """
+    Per-user partitioned BM25 index persisted under ``root``, shared by the
+    worker processes of a host.
+
+    Each partition is a snapshot (``<user>.npz``) plus an append-only delta
+    log (``<user>.log``) of added and removed chunks. Flushing appends a
+    change's entries to the log, so its cost follows the change, not the
+    partition; the snapshot is rewritten only once the log outgrows it.
+    Before every use a partition replays log entries other processes wrote,
+    or reloads if the snapshot was replaced. At most ``max_partitions`` stay
+    loaded, least recently used first out.
+    """
+
+    def __init__(self, root: str, k1: float = 1.2, b: float = 0.75, max_partitions: int = 256,
+                 compact_min_bytes: int = 1024 * 1024):
+        self.root = root
+        self.k1 = k1
+        self.b = b
+        self.max_partitions = max_partitions
+        self.compact_min_bytes = compact_min_bytes
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+
+    def _path(self, user_key: str) -> str:
+        return os.path.join(self.root, f"{user_key}.npz")
+
+    def _log_path(self, user_key: str) -> str:
+        return os.path.join(self.root, f"{user_key}.log")
+
+    @contextmanager
+    def _locked(self, user_key: str, exclusive: bool):
+        """Lock a user's files against the other processes"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, f"{user_key}.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sync(self, user_key: str, partition: _Partition) -> _Partition:
+        """Catch up with the files; call under the user's lock"""
+        snapshot = _identity(self._path(user_key))
+        log = _identity(self._log_path(user_key))
+        log_inode, log_size = (log[0], log[2]) if log else (None, 0)
+
+        if snapshot != partition.snapshot or log_inode != partition.log_inode or log_size < partition.log_offset:
+            # Replaced, compacted or dropped elsewhere: start over from the files
+            pending = partition.pending
+            partition = _Partition.load(self._path(user_key)) if snapshot else _Partition()
+            partition.snapshot, partition.log_inode = snapshot, log_inode
+            partition.pending = pending
+            self._partitions[user_key] = partition
+            replay_pending = True
+        else:
+            replay_pending = False
+
+        if log_size > partition.log_offset:
+            with open(self._log_path(user_key), "rb") as f:
+                f.seek(partition.log_offset)
+                for line in f.read(log_size - partition.log_offset).splitlines():
+                    partition.apply(json.loads(line))
+            partition.log_offset = log_size
+
+        if replay_pending:
+            for change in partition.pending:
+                partition.apply(change)
+        return partition
+
+    def _partition(self, user_key: str) -> _Partition:
+        partition = self._partitions.get(user_key)
+        if partition is None:
+            partition = _Partition()
+            partition.snapshot = partition.log_inode = -1  # Never loaded
+            self._partitions[user_key] = partition
+            self._evict()
+        self._partitions.move_to_end(user_key)
+
+        with self._locked(user_key, exclusive=False):
+            return self._sync(user_key, partition)
+
+    def _evict(self):
+        """Unload the least recently used partitions beyond ``max_partitions``"""
+        while len(self._partitions) > self.max_partitions:
+            user_key = next(iter(self._partitions))
+            self.flush(user_key)
+            self._partitions.pop(user_key, None)
+
+    def add(self, user_key: str, chunks: Iterable[Tuple[str, str]]):
+        """Index (chunk_id, text) pairs for a user"""
+        added = [(chunk_id, _term_counts(text)) for chunk_id, text in chunks]
+        if not added:
+            return
+        partition = self._partition(user_key)
+        change = {"add": added}
+        partition.apply(change)
+        partition.pending.append(change)
+
+    def remove(self, user_key: str, chunk_ids: Iterable[str]):
+        """Remove chunks from a user's partition"""
+        removed = list(chunk_ids)
+        if not removed:
+            return
+        partition = self._partition(user_key)
+        change = {"remove": removed}
+        partition.apply(change)
+        partition.pending.append(change)
+
+    def drop(self, user_key: str):
+        """Delete a user's whole partition"""
+        self._partitions.pop(user_key, None)
+        with self._locked(user_key, exclusive=True):
+            for path in (self._path(user_key), self._log_path(user_key)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def search(self, user_key: str, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Top ``top_k`` (chunk_id, bm25 score) pairs for a query"""
+        return self._partition(user_key).search(query, top_k, self.k1, self.b)
+
+    def flush(self, user_key: str):
+        """Append a user's pending changes to the delta log, compacting it once it outgrows the snapshot"""
+        partition = self._partitions.get(user_key)
+        if partition is None or not partition.pending:
+            return
+
+        with self._locked(user_key, exclusive=True):
+            # Entries written by others go first; ours are applied in memory already
+            partition = self._sync(user_key, partition)
+            pending, partition.pending = partition.pending, []
+
+            log_path = self._log_path(user_key)
+            with open(log_path, "ab") as f:
+                for change in pending:
+                    f.write(json.dumps(change, separators=(",", ":")).encode("utf-8") + b"\n")
+            log = _identity(log_path)
+            partition.log_inode, partition.log_offset = log[0], log[2]
+
+            snapshot_size = partition.snapshot[2] if partition.snapshot else 0
+            if log[2] > max(self.compact_min_bytes, snapshot_size):
+                partition.save(self._path(user_key))
+                os.remove(log_path)
+                partition.snapshot = _identity(self._path(user_key))
+                partition.log_inode, partition.log_offset = None, 0
@@ -0,0 +1,175 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Token counting and context packing for agent LLM calls
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Context windows (in tokens) of the models agents run on; unknown models get
+# DEFAULT_CONTEXT_WINDOW
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-3.5-turbo": 16385,
+    "claude-3-opus": 200000,
+    "claude-3-sonnet": 200000,
+    "claude-3-haiku": 200000,
+    "claude-3-5-sonnet": 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+
+@lru_cache(maxsize=32)
+def _get_encoding(model: str) -> Any:
+    """tiktoken encoding for a model (cl100k_base if unknown), or None if unavailable"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken not installed, estimating token counts")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails when offline
+        logger.warning("Failed to load tiktoken encoding, estimating token counts", model=model, error=str(e))
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Exact token count of ``text`` for ``model`` (``len // 4`` without tiktoken)"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_window(model: str) -> int:
+    """Context window of a model, matched on the longest known name prefix"""
+    matches = [name for name in MODEL_CONTEXT_WINDOWS if model.startswith(name)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def _overlap(head: str, tail: str, min_chars: int) -> int:
+    """Length of the longest suffix of ``head`` that is a prefix of ``tail``"""
+    if len(tail) < min_chars:
+        return 0
+    probe = tail[:min_chars]
+    start = head.find(probe, max(len(head) - len(tail), 0))
+    while start != -1:
+        if tail.startswith(head[start:]):
+            return len(head) - start
+        start = head.find(probe, start + 1)
+    return 0
+
+
+def dedupe_chunks(chunks: List[Dict[str, Any]], min_overlap: int = 32) -> List[Dict[str, Any]]:
+    """
+    Drop duplicate and contained chunks, and trim the text a chunk shares with
+    the preceding chunk of the same document (chunking overlap).
+
+    Chunks are dicts with ``id``, ``content`` and ``metadata`` (``document_id``
+    and ``chunk_index`` are used when present). Returns new dicts in the input
+    order; when two chunks are duplicates the more relevant one is kept.
+    """
+    ranked = sorted(chunks, key=lambda c: -c.get("relevance", 0.0))
+    kept: List[Dict[str, Any]] = []
+    for chunk in ranked:
+        text = chunk["content"].strip()
+        if text and not any(text in other["content"] for other in kept):
+            kept = [other for other in kept if other["content"] not in text]
+            kept.append({**chunk, "content": text})
+
+    position = {chunk["id"]: i for i, chunk in enumerate(chunks)}
+    kept.sort(key=lambda c: position[c["id"]])
+
+    by_document: Dict[Any, List[Dict[str, Any]]] = {}
+    for chunk in kept:
+        document_id = chunk.get("metadata", {}).get("document_id")
+        if document_id is not None:
+            by_document.setdefault(document_id, []).append(chunk)
+
+    for siblings in by_document.values():
+        siblings.sort(key=lambda c: c["metadata"].get("chunk_index", 0))
+        for previous, chunk in zip(siblings, siblings[1:]):
+            if chunk["metadata"].get("chunk_index", 0) != previous["metadata"].get("chunk_index", 0) + 1:
+                continue
+            shared = _overlap(previous["content"], chunk["content"], min_overlap)
+            if shared:
+                chunk["content"] = chunk["content"][shared:].lstrip()
+
+    return kept
+
+
+def pack_context(
+    chunks: List[Dict[str, Any]],
+    budget: int,
+    model: str = "gpt-4",
+    custom_prompts: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Fit as much relevant context as possible into ``budget`` tokens.
+
+    Chunks (with a ``relevance`` score) are deduplicated, then picked greedily
+    by relevance per token; a chunk that does not fit is skipped in favour of
+    smaller ones further down. Selected chunks are joined in relevance order,
+    each preceded by its custom prompt if one is given.
+    """
+    custom_prompts = custom_prompts or {}
+    separator_tokens = count_tokens(CHUNK_SEPARATOR, model)
+
+    candidates = []
+    for chunk in dedupe_chunks(chunks):
+        prompt = custom_prompts.get(chunk["id"])
+        text = f"{prompt}\n\n{chunk['content']}" if prompt else chunk["content"]
+        tokens = count_tokens(text, model)
+        candidates.append((chunk, text, tokens))
+
+    candidates.sort(key=lambda c: -max(c[0].get("relevance", 0.0), 0.0) / max(c[2], 1))
+
+    selected = []
+    used = 0
+    for chunk, text, tokens in candidates:
+        cost = tokens + (separator_tokens if selected else 0)
+        if used + cost <= budget:
+            selected.append((chunk, text, tokens))
+            used += cost
+
+    # Tokens can merge across joins, so confirm the exact total and shed the
+    # least relevant chunk in the rare case the sum was off
+    selected.sort(key=lambda c: -c[0].get("relevance", 0.0))
+    context = CHUNK_SEPARATOR.join(text for _, text, _ in selected)
+    total_tokens = count_tokens(context, model)
+    while selected and total_tokens > budget:
+        selected.pop()
+        context = CHUNK_SEPARATOR.join(text for _, text, _ in selected)
+        total_tokens = count_tokens(context, model)
+
+    selected_ids = {chunk["id"] for chunk, _, _ in selected}
+    return {
+        "context": context,
+        "chunks": [
+            {"id": chunk["id"], "tokens": tokens, "relevance": chunk.get("relevance", 0.0),
+             "metadata": chunk.get("metadata", {})}
+            for chunk, _, tokens in selected
+        ],
+        "dropped_chunks": [chunk["id"] for chunk in chunks if chunk["id"] not in selected_ids],
+        "total_tokens": total_tokens,
+        "token_budget": budget,
+        "model": model
+    }
@@ -0,0 +1,213 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Streaming text extraction and chunking for RAG ingestion
+"""
+
+import asyncio
+import codecs
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+# Formats parsed in a worker process; everything else is streamed as UTF-8 text
+PARSED_FILE_TYPES = {"pdf", "json"}
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+class UploadTooLarge(ValueError):
+    """An upload is over the size limit of its format"""
+
+
+class TextChunker:
+    """
+    Incremental word chunker: text can be fed in arbitrary pieces and the
+    chunks come out exactly as if the whole text had been chunked at once.
+    Only the current chunk and a trailing partial word are held in memory.
+
+    Words longer than ``4 * chunk_size`` (base64 blobs, minified code) are cut
+    into pieces of that length counted from the start of the word, which
+    keeps the partial word bounded without depending on how text is fed.
+    """
+
+    def __init__(self, chunk_size: int = 1000):
+        self.chunk_size = chunk_size
+        self.max_word = chunk_size * 4
+        self._words: List[str] = []
+        self._size = 0
+        self._partial = ""
+
+    def _push(self, word: str) -> Optional[str]:
+        self._words.append(word)
+        self._size += len(word) + 1
+        if self._size >= self.chunk_size:
+            chunk = " ".join(self._words)
+            self._words = []
+            self._size = 0
+            return chunk
+        return None
+
+    def feed(self, text: str) -> Iterator[str]:
+        """Add text and yield every chunk it completes"""
+        text = self._partial + text
+        words = text.split()
+        # A word touching the end of the piece may continue in the next one
+        partial = words.pop() if words and not text[-1].isspace() else ""
+
+        # Pieces of an over-long partial word are final once the rest is longer still
+        cut = 0
+        while len(partial) - cut > self.max_word:
+            cut += self.max_word
+        self._partial = partial[cut:]
+        if cut:
+            words.append(partial[:cut])
+
+        for word in words:
+            for start in range(0, len(word), self.max_word):
+                chunk = self._push(word[start:start + self.max_word])
+                if chunk is not None:
+                    yield chunk
+
+    def finish(self) -> Iterator[str]:
+        """Yield the final, possibly short, chunk"""
+        if self._partial:
+            chunk = self._push(self._partial)
+            self._partial = ""
+            if chunk is not None:
+                yield chunk
+        if self._words:
+            yield " ".join(self._words)
+            self._words = []
+            self._size = 0
+
+
+def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
+    """Chunk a complete string"""
+    chunker = TextChunker(chunk_size)
+    return [*chunker.feed(text), *chunker.finish()]
+
+
+def _flatten_json(value: Any, path: str = "") -> Iterator[str]:
+    """``path: value`` lines for every scalar in a JSON document"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten_json(item, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _flatten_json(item, f"{path}[{i}]")
+    else:
+        yield f"{path}: {value}" if path else str(value)
+
+
+def extract_text(source_path: str, file_type: str, target_path: str) -> int:
+    """
+    Write the plain text of a spooled upload to ``target_path``.
+
+    Runs in a worker process, so CPU-heavy parsing never blocks the event
+    loop. The parsers hold the whole document in that worker (pypdf reads
+    the file into memory, JSON is decoded in one go), so uploads of these
+    formats must be capped well below the worker's memory. Returns the
+    number of characters written.
+    """
+    written = 0
+    with open(target_path, "w", encoding="utf-8") as out:
+        if file_type == "pdf":
+            from pypdf import PdfReader
+
+            for page in PdfReader(source_path).pages:
+                text = (page.extract_text() or "") + "\n\n"
+                written += out.write(text)
+        elif file_type == "json":
+            with open(source_path, "rb") as f:
+                data = json.load(f)
+            for line in _flatten_json(data):
+                written += out.write(line + "\n")
+        else:
+            raise ValueError(f"File type {file_type} is not parsed out of process")
+    return written
+
+
+def _get_parse_pool(workers: int) -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=workers)
+    return _parse_pool
+
+
+async def _read_blocks(upload: Any, block_size: int, max_bytes: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Read an ``UploadFile``-like object (async ``read(size)``) block by block,
+    raising ``UploadTooLarge`` once more than ``max_bytes`` were read
+    """
+    total = 0
+    while True:
+        block = await upload.read(block_size)
+        if not block:
+            return
+        total += len(block)
+        if max_bytes is not None and total > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+        yield block
+
+
+async def stream_upload_chunks(
+    upload: Any,
+    file_type: str,
+    chunk_size: int = 1000,
+    block_size: int = 1024 * 1024,
+    parse_workers: int = 2,
+    max_bytes: Optional[int] = None,
+    max_parsed_bytes: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    Yield text chunks of an upload.
+
+    Text formats go through an incremental UTF-8 decoder straight into the
+    chunker, so memory use does not grow with their size; they are capped
+    at ``max_bytes``. PDF and JSON uploads are first spooled to a temporary
+    file and parsed in a process pool into a second temporary text file,
+    which is then streamed the same way. Their parsers load the whole
+    document in the worker, so they are capped at ``max_parsed_bytes``.
+    Going over a cap raises ``UploadTooLarge``.
+    """
+    chunker = TextChunker(chunk_size)
+
+    if file_type not in PARSED_FILE_TYPES:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for block in _read_blocks(upload, block_size, max_bytes):
+            for chunk in chunker.feed(decoder.decode(block)):
+                yield chunk
+        for chunk in chunker.feed(decoder.decode(b"", final=True)):
+            yield chunk
+        for chunk in chunker.finish():
+            yield chunk
+        return
+
+    workdir = tempfile.mkdtemp(prefix="codexos_ingest_")
+    try:
+        source_path = os.path.join(workdir, f"upload.{file_type}")
+        text_path = os.path.join(workdir, "text.txt")
+
+        with open(source_path, "wb") as f:
+            async for block in _read_blocks(upload, block_size, max_parsed_bytes):
+                f.write(block)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            _get_parse_pool(parse_workers), extract_text, source_path, file_type, text_path
+        )
+
+        with open(text_path, encoding="utf-8") as f:
+            while True:
+                text = f.read(block_size)
+                if not text:
+                    break
+                for chunk in chunker.feed(text):
+                    yield chunk
+        for chunk in chunker.finish():
+            yield chunk
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
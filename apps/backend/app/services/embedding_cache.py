@@ -0,0 +1,311 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Persistent embedding cache keyed by embedding model and chunk content hash
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import redis.asyncio as redis
+import structlog
+
+logger = structlog.get_logger()
+
+# On-disk index record: raw SHA-256 digest + row number in the vector file.
+# The digest is raw void, not "S32", which would drop trailing NUL bytes.
+_INDEX_DTYPE = np.dtype([("digest", "V32"), ("row", "<u4")])
+
+
+def _model_slug(model: str) -> str:
+    """Filesystem/key-safe form of a model name"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+
+
+class DiskEmbeddingStore:
+    """
+    Local embedding store for a single model, shared by every worker process
+    on the host.
+
+    Vectors live in a memory-mapped float32 matrix (``vectors.f32``) that grows
+    by doubling; ``index.bin`` is an append-only log of (digest, row) records.
+    A vector is written and flushed before its index record is appended, so a
+    crash can only lose the most recent entries, never corrupt earlier ones.
+
+    Writers take an exclusive ``flock`` on ``lock`` and first read the records
+    other processes appended, so rows are allocated from the shared log and
+    the vector file only ever grows. Readers pick up new records on a miss.
+    """
+
+    def __init__(self, root: str, model: str, initial_capacity: int = 1024):
+        self.path = os.path.join(root, _model_slug(model))
+        self.initial_capacity = initial_capacity
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._records = 0  # Index records read so far, which is also the next free row
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+        self._refresh()
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "index.bin")
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.path, "lock")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock across the processes sharing the store"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Read the index records appended since the last refresh, by any process"""
+        if self.dim is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+
+        if os.path.exists(self._index_path):
+            # Whole records only; a concurrent append may be half written
+            count = os.path.getsize(self._index_path) // _INDEX_DTYPE.itemsize - self._records
+            if count > 0:
+                records = np.fromfile(
+                    self._index_path,
+                    dtype=_INDEX_DTYPE,
+                    count=count,
+                    offset=self._records * _INDEX_DTYPE.itemsize
+                )
+                self._rows.update((bytes(r["digest"]), int(r["row"])) for r in records)
+                self._records += len(records)
+
+        self._map()
+
+    def _map(self):
+        """Map the vector file again if it grew, possibly in another process"""
+        if not os.path.exists(self._vectors_path):
+            return
+        capacity = os.path.getsize(self._vectors_path) // (4 * self.dim)
+        if capacity <= self._capacity:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        self._capacity = capacity
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        """Create or grow the vector file so that it holds ``needed`` rows; call under the lock"""
+        if self.dim is None:
+            self.dim = dim
+            with open(self._meta_path, "w") as f:
+                json.dump({"dim": dim}, f)
+        elif dim != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {dim}")
+
+        if needed <= self._capacity:
+            return
+
+        capacity = max(self._capacity, self.initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+
+        with open(self._vectors_path, "ab") as f:
+            # Never shrink a file another process has grown further
+            if os.fstat(f.fileno()).st_size < capacity * 4 * self.dim:
+                f.truncate(capacity * 4 * self.dim)
+        self._map()
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors for the given hex content hashes"""
+        digests = {chunk_hash: bytes.fromhex(chunk_hash) for chunk_hash in hashes}
+        if any(digest not in self._rows for digest in digests.values()):
+            self._refresh()
+
+        found = {}
+        if self._vectors is None:
+            return found
+
+        for chunk_hash, digest in digests.items():
+            row = self._rows.get(digest)
+            if row is not None:
+                found[chunk_hash] = np.array(self._vectors[row])
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Store vectors for hashes that are not cached yet"""
+        if not vectors:
+            return
+
+        with self._locked():
+            self._refresh()
+            new = [(bytes.fromhex(h), v) for h, v in vectors.items() if bytes.fromhex(h) not in self._rows]
+            if not new:
+                return
+
+            # Every row has exactly one record, so the log length is the next free row
+            start = self._records
+            self._ensure_capacity(start + len(new), len(new[0][1]))
+
+            records = np.empty(len(new), dtype=_INDEX_DTYPE)
+            for i, (digest, vector) in enumerate(new):
+                self._vectors[start + i] = vector
+                records[i] = (digest, start + i)
+            self._vectors.flush()
+
+            with open(self._index_path, "ab") as f:
+                records.tofile(f)
+
+            for digest, row in zip(records["digest"], records["row"]):
+                self._rows[bytes(digest)] = int(row)
+            self._records += len(records)
+
+
+class RedisEmbeddingTier:
+    """Shared embedding tier in Redis, storing raw float32 bytes per hash"""
+
+    def __init__(self, client: redis.Redis, model: str, ttl: int):
+        self.client = client
+        self.prefix = f"codexos:emb:{_model_slug(model)}:"
+        self.ttl = ttl
+
+    async def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Batch lookup with a single MGET"""
+        if not hashes:
+            return {}
+        try:
+            values = await self.client.mget([self.prefix + h for h in hashes])
+        except Exception as e:
+            logger.error("Embedding cache redis get error", error=str(e))
+            return {}
+        return {
+            h: np.frombuffer(value, dtype=np.float32)
+            for h, value in zip(hashes, values)
+            if value is not None
+        }
+
+    async def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Store vectors in one pipeline round trip"""
+        if not vectors:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for h, vector in vectors.items():
+                    pipe.setex(self.prefix + h, self.ttl, np.asarray(vector, dtype=np.float32).tobytes())
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Embedding cache redis set error", error=str(e))
+
+
+class EmbeddingCache:
+    """Two-tier (local disk, optional Redis) embedding cache for one model"""
+
+    def __init__(
+        self,
+        model: str,
+        disk_root: str,
+        redis_client: Optional[redis.Redis] = None,
+        redis_ttl: int = 30 * 24 * 3600
+    ):
+        self.model = model
+        self.disk = DiskEmbeddingStore(disk_root, model)
+        self.remote = RedisEmbeddingTier(redis_client, model, redis_ttl) if redis_client else None
+        self.hits = 0
+        self.misses = 0
+
+    async def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for whichever hashes are known"""
+        found = self.disk.get_many(hashes)
+
+        if self.remote is not None and len(found) < len(hashes):
+            missing = [h for h in hashes if h not in found]
+            remote = await self.remote.get_many(missing)
+            if remote:
+                # Backfill the local tier so the next lookup stays on this host
+                self.disk.put_many(remote)
+                found.update(remote)
+
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    async def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Write vectors to every tier"""
+        self.disk.put_many(vectors)
+        if self.remote is not None:
+            await self.remote.put_many(vectors)
+
+
+class CachedEmbedder:
+    """
+    Embeds texts through an ``EmbeddingCache``, calling the underlying embedding
+    function only for cache misses and in fixed-size batches.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[List[str]], Sequence[Sequence[float]]],
+        cache: EmbeddingCache,
+        batch_size: int = 64
+    ):
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.batch_size = batch_size
+
+    @property
+    def model(self) -> str:
+        return self.cache.model
+
+    async def embed(self, texts: Sequence[str], hashes: Sequence[str]) -> np.ndarray:
+        """Embed ``texts`` (whose content hashes are ``hashes``) as a float32 matrix"""
+        if not texts:
+            return np.empty((0, self.cache.disk.dim or 0), dtype=np.float32)
+
+        found = await self.cache.get_many(list(dict.fromkeys(hashes)))
+
+        pending: Dict[str, str] = {}
+        for text, chunk_hash in zip(texts, hashes):
+            if chunk_hash not in found:
+                pending.setdefault(chunk_hash, text)
+
+        if pending:
+            computed = await self.embed_uncached(list(pending.values()))
+            fresh = dict(zip(pending.keys(), computed))
+            await self.cache.put_many(fresh)
+            found.update(fresh)
+
+        return np.stack([found[h] for h in hashes]).astype(np.float32, copy=False)
+
+    async def embed_uncached(self, texts: Sequence[str]) -> np.ndarray:
+        """Call the embedding function directly, batching and off the event loop"""
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            batches.append(await asyncio.to_thread(self.embedding_function, batch))
+        return np.asarray([v for batch in batches for v in batch], dtype=np.float32)
@@ -2,16 +2,115 @@
 """Service for managing agent execution history and cleanup"""
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID
 
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func, and_
+from sqlalchemy import DateTime, select, delete, update, func, and_, exists, literal, not_, text
+from sqlalchemy.sql import Select
 
-from app.models.agent import Execution, ExecutionNode
+from app.db.pagination import Keyset
+from app.models.agent import Execution, ExecutionNode, ExecutionStep
+from app.models.secure_vault import VaultAccessLog
+from app.services import execution_rollups
 from app.core.config import settings
 
+executions = Execution.__table__
+nodes = ExecutionNode.__table__
+steps = ExecutionStep.__table__
+vault_access_logs = VaultAccessLog.__table__
+
+# Cleanup walks expired executions oldest first, so a run can stop and resume
+CLEANUP_KEYSET = Keyset("execution_cleanup", (executions.c.created_at, False), (executions.c.id, False))
+
+# Tables that may be RANGE partitioned on created_at, children first
+PARTITIONED_TABLES = ("execution_steps", "execution_nodes", "executions")
+
+_PARTITIONS_QUERY = text("""
+    SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = :table
+""")
+_PARTITION_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def _expired(now: datetime, default_days: int):
+    """Executions past their own ``ttl_days``, or ``default_days`` when it is unset"""
+    ttl_days = func.coalesce(executions.c.ttl_days, default_days)
+    return executions.c.created_at < literal(now, DateTime(timezone=True)) - func.make_interval(0, 0, 0, ttl_days)
+
+
+def _horizon_query(default_days: int) -> Select:
+    """The shortest retention of any execution, bounding the range cleanup scans"""
+    return select(func.min(func.coalesce(executions.c.ttl_days, default_days)))
+
+
+def _expired_batch_query(now: datetime, default_days: int, horizon: datetime,
+                         after: Optional[List[Any]], batch_size: int) -> Select:
+    """Keys of the next ``batch_size`` expired executions after ``after``"""
+    query = select(executions.c.created_at, executions.c.id).where(
+        executions.c.created_at < horizon,
+        _expired(now, default_days)
+    )
+    if after:
+        query = query.where(CLEANUP_KEYSET.after(after))
+    return query.order_by(*CLEANUP_KEYSET.order_by()).limit(batch_size)
+
+
+def _batch_statements(execution_ids: List[UUID]) -> List[Any]:
+    """
+    Deletes of a batch of executions with their steps and nodes, children
+    first. Vault audit entries and replays that outlive them keep their rows
+    but lose the reference.
+    """
+    return [
+        update(vault_access_logs)
+        .where(vault_access_logs.c.execution_id.in_(execution_ids))
+        .values(execution_id=None),
+        update(executions)
+        .where(executions.c.original_execution_id.in_(execution_ids))
+        .values(original_execution_id=None),
+        delete(steps).where(steps.c.execution_id.in_(execution_ids)),
+        delete(nodes).where(nodes.c.execution_id.in_(execution_ids)),
+        delete(executions).where(executions.c.id.in_(execution_ids)),
+    ]
+
+
+def _expired_counts_query(now: datetime, default_days: int) -> Select:
+    """Executions, nodes and steps a cleanup would delete, in one query"""
+    expired_ids = select(executions.c.id).where(_expired(now, default_days))
+    return select(
+        select(func.count()).select_from(executions).where(_expired(now, default_days))
+        .scalar_subquery().label("executions"),
+        select(func.count()).select_from(nodes).where(nodes.c.execution_id.in_(expired_ids))
+        .scalar_subquery().label("nodes"),
+        select(func.count()).select_from(steps).where(steps.c.execution_id.in_(expired_ids))
+        .scalar_subquery().label("steps"),
+    )
+
+
+def _partition_upper_bound(bound: str) -> Optional[datetime]:
+    """Upper bound of a ``FOR VALUES FROM (...) TO (...)`` range partition, None otherwise"""
+    match = _PARTITION_UPPER_BOUND.search(bound or "")
+    if not match:
+        return None
+    upper = datetime.fromisoformat(match.group(1))
+    return upper if upper.tzinfo else upper.replace(tzinfo=timezone.utc)
+
+
+def _partition_droppable_query(now: datetime, default_days: int, upper: datetime) -> Select:
+    """Whether every execution created before ``upper`` has expired"""
+    return select(not_(exists().where(
+        executions.c.created_at < upper,
+        not_(_expired(now, default_days))
+    )))
+
 
 class ExecutionHistoryService:
     """Service for managing execution history and cleanup"""
@@ -19,175 +118,145 @@ class ExecutionHistoryService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def cleanup_expired_executions(self, days: int = 30) -> Dict[str, int]:
-        """Clean up executions older than specified days"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Get count of executions to be deleted
-        result = await self.db.execute(
-            select(func.count(Execution.id))
-            .where(Execution.created_at < cutoff_date)
-        )
-        execution_count = result.scalar()
-        
-        # Get count of execution nodes to be deleted
-        result = await self.db.execute(
-            select(func.count(ExecutionNode.id))
-            .join(Execution, ExecutionNode.execution_id == Execution.id)
-            .where(Execution.created_at < cutoff_date)
-        )
-        node_count = result.scalar()
-        
-        # Delete execution nodes first (due to foreign key constraints)
-        await self.db.execute(
-            delete(ExecutionNode)
-            .where(
-                ExecutionNode.execution_id.in_(
-                    select(Execution.id).where(Execution.created_at < cutoff_date)
-                )
-            )
-        )
-        
-        # Delete executions
-        await self.db.execute(
-            delete(Execution).where(Execution.created_at < cutoff_date)
-        )
-        
-        await self.db.commit()
-        
-        return {
-            "executions_deleted": execution_count,
-            "nodes_deleted": node_count,
-            "cutoff_date": cutoff_date.isoformat()
+    async def cleanup_expired_executions(
+        self,
+        days: int = 30,
+        dry_run: bool = False,
+        batch_size: Optional[int] = None,
+        max_rows_per_second: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        cursor: Optional[str] = None,
+        drop_partitions: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Delete executions past their ``ttl_days`` (``days`` when unset) with
+        their nodes and steps.
+
+        Deletes run in batches of ``batch_size`` executions, one transaction
+        each, paced to ``max_rows_per_second``. A run stopped by
+        ``max_seconds`` returns a ``resume_cursor`` to continue from; an
+        interrupted run keeps the batches it committed. With
+        ``drop_partitions``, range partitions of tables partitioned on
+        ``created_at`` that hold only expired rows are dropped first.
+        """
+        now = datetime.now(timezone.utc)
+        batch_size = batch_size or settings.EXECUTION_CLEANUP_BATCH_SIZE
+        if max_rows_per_second is None:
+            max_rows_per_second = settings.EXECUTION_CLEANUP_MAX_ROWS_PER_SECOND
+        summary: Dict[str, Any] = {
+            "executions_deleted": 0,
+            "nodes_deleted": 0,
+            "steps_deleted": 0,
+            "batches": 0,
+            "cutoff_date": (now - timedelta(days=days)).isoformat(),
+            "resume_cursor": None,
         }
 
+        if dry_run:
+            counts = (await self.db.execute(_expired_counts_query(now, days))).one()
+            summary.update(
+                executions_deleted=counts.executions,
+                nodes_deleted=counts.nodes,
+                steps_deleted=counts.steps
+            )
+            if drop_partitions:
+                summary["partitions_dropped"] = [name for _, name in await self._expired_partitions(now, days)]
+            return summary
+
+        if drop_partitions:
+            summary["partitions_dropped"] = await self._drop_expired_partitions(now, days)
+
+        shortest_ttl = (await self.db.execute(_horizon_query(days))).scalar()
+        if shortest_ttl is None:
+            return summary
+        horizon = now - timedelta(days=shortest_ttl)
+        after = CLEANUP_KEYSET.decode(cursor) if cursor else None
+        started = time.monotonic()
+
+        while True:
+            batch_started = time.monotonic()
+            keys = (await self.db.execute(
+                _expired_batch_query(now, days, horizon, after, batch_size)
+            )).all()
+            if not keys:
+                break
+
+            results = [
+                await self.db.execute(statement)
+                for statement in _batch_statements([key.id for key in keys])
+            ]
+            await self.db.commit()
+
+            steps_deleted, nodes_deleted, executions_deleted = (result.rowcount for result in results[-3:])
+            summary["steps_deleted"] += steps_deleted
+            summary["nodes_deleted"] += nodes_deleted
+            summary["executions_deleted"] += executions_deleted
+            summary["batches"] += 1
+            after = [keys[-1].created_at, keys[-1].id]
+
+            if len(keys) < batch_size:
+                break
+            if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                summary["resume_cursor"] = CLEANUP_KEYSET.encode(after)
+                break
+            if max_rows_per_second:
+                rows = steps_deleted + nodes_deleted + executions_deleted
+                await asyncio.sleep(max(rows / max_rows_per_second - (time.monotonic() - batch_started), 0))
+
+        return summary
+
+    async def _expired_partitions(self, now: datetime, days: int) -> List[Tuple[str, str]]:
+        """``(table, partition)`` pairs, children first and oldest first, whose rows have all expired"""
+        expired = []
+        for table in PARTITIONED_TABLES:
+            partitions = (await self.db.execute(_PARTITIONS_QUERY, {"table": table})).all()
+            bounded = [
+                (upper, partition.name) for partition in partitions
+                if (upper := _partition_upper_bound(partition.bound)) is not None
+            ]
+            for upper, name in sorted(bounded):
+                if not (await self.db.execute(_partition_droppable_query(now, days, upper))).scalar():
+                    break
+                expired.append((table, name))
+        return expired
+
+    async def _drop_expired_partitions(self, now: datetime, days: int) -> List[str]:
+        """
+        Detach and drop expired partitions, one transaction each. A partition
+        still referenced from another table cannot be detached; it and the
+        later partitions of its table are left to the batched deletes.
+        """
+        dropped, blocked = [], set()
+        for table, name in await self._expired_partitions(now, days):
+            if table in blocked:
+                continue
+            try:
+                await self.db.execute(text(f'ALTER TABLE {table} DETACH PARTITION "{name}"'))
+                await self.db.execute(text(f'DROP TABLE "{name}"'))
+                await self.db.commit()
+            except DBAPIError:
+                await self.db.rollback()
+                blocked.add(table)
+                continue
+            dropped.append(name)
+        return dropped
+
     async def get_execution_statistics(self, user_id: UUID, days: int = 30) -> Dict[str, Any]:
         """Get execution statistics for a user"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Total executions
-        result = await self.db.execute(
-            select(func.count(Execution.id))
-            .where(
-                Execution.user_id == user_id,
-                Execution.created_at >= cutoff_date
-            )
-        )
-        total_executions = result.scalar()
-        
-        # Successful executions
-        result = await self.db.execute(
-            select(func.count(Execution.id))
-            .where(
-                Execution.user_id == user_id,
-                Execution.status == "completed",
-                Execution.created_at >= cutoff_date
-            )
-        )
-        successful_executions = result.scalar()
-        
-        # Failed executions
-        result = await self.db.execute(
-            select(func.count(Execution.id))
-            .where(
-                Execution.user_id == user_id,
-                Execution.status == "failed",
-                Execution.created_at >= cutoff_date
-            )
-        )
-        failed_executions = result.scalar()
-        
-        # Total tokens used
-        result = await self.db.execute(
-            select(func.coalesce(func.sum(Execution.tokens_used), 0))
-            .where(
-                Execution.user_id == user_id,
-                Execution.created_at >= cutoff_date
-            )
-        )
-        total_tokens = result.scalar()
-        
-        # Total cost
-        result = await self.db.execute(
-            select(func.coalesce(func.sum(Execution.cost_cents), 0))
-            .where(
-                Execution.user_id == user_id,
-                Execution.created_at >= cutoff_date
-            )
-        )
-        total_cost_cents = result.scalar()
-        
-        # Average execution time
-        result = await self.db.execute(
-            select(
-                func.avg(
-                    func.extract('epoch', Execution.completed_at - Execution.started_at)
-                )
-            )
-            .where(
-                Execution.user_id == user_id,
-                Execution.status == "completed",
-                Execution.started_at.isnot(None),
-                Execution.completed_at.isnot(None),
-                Execution.created_at >= cutoff_date
-            )
-        )
-        avg_execution_time = result.scalar()
-        
+        result = await self.db.execute(execution_rollups.totals_query(days, user_id=user_id))
+
         return {
             "period_days": days,
-            "total_executions": total_executions,
-            "successful_executions": successful_executions,
-            "failed_executions": failed_executions,
-            "success_rate": (successful_executions / total_executions * 100) if total_executions > 0 else 0,
-            "total_tokens": total_tokens,
-            "total_cost_cents": total_cost_cents,
-            "total_cost_dollars": total_cost_cents / 100,
-            "avg_execution_time_seconds": avg_execution_time,
-            "avg_execution_time_formatted": f"{avg_execution_time:.1f}s" if avg_execution_time else None
+            **execution_rollups.summarize(result.one())
         }
 
     async def get_agent_performance_metrics(self, flow_id: UUID, days: int = 30) -> Dict[str, Any]:
         """Get performance metrics for a specific agent flow"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Execution count and success rate
-        result = await self.db.execute(
-            select(
-                func.count(Execution.id).label("total_executions"),
-                func.sum(
-                    func.case(
-                        (Execution.status == "completed", 1),
-                        else_=0
-                    )
-                ).label("successful_executions")
-            )
-            .where(
-                Execution.flow_id == flow_id,
-                Execution.created_at >= cutoff_date
-            )
-        )
-        stats = result.first()
-        
-        total_executions = stats.total_executions or 0
-        successful_executions = stats.successful_executions or 0
-        
-        # Average execution time
-        result = await self.db.execute(
-            select(
-                func.avg(
-                    func.extract('epoch', Execution.completed_at - Execution.started_at)
-                )
-            )
-            .where(
-                Execution.flow_id == flow_id,
-                Execution.status == "completed",
-                Execution.started_at.isnot(None),
-                Execution.completed_at.isnot(None),
-                Execution.created_at >= cutoff_date
-            )
-        )
-        avg_execution_time = result.scalar()
+
+        # Execution totals come from the daily rollups
+        result = await self.db.execute(execution_rollups.totals_query(days, flow_id=flow_id))
+        totals = execution_rollups.summarize(result.one())
         
         # Node-level statistics
         result = await self.db.execute(
@@ -208,12 +277,7 @@ async def get_agent_performance_metrics(self, flow_id: UUID, days: int = 30) ->
         return {
             "flow_id": str(flow_id),
             "period_days": days,
-            "total_executions": total_executions,
-            "successful_executions": successful_executions,
-            "failed_executions": total_executions - successful_executions,
-            "success_rate": (successful_executions / total_executions * 100) if total_executions > 0 else 0,
-            "avg_execution_time_seconds": avg_execution_time,
-            "avg_execution_time_formatted": f"{avg_execution_time:.1f}s" if avg_execution_time else None,
+            **totals,
             "node_performance": [
                 {
                     "node_type": stat.node_type,
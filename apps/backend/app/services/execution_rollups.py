@@ -0,0 +1,261 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Per-day execution rollups.
+
+``ExecutionDailyRollup`` keeps totals of finished executions per tenant,
+user, flow and UTC day of creation. Each finished execution is added once,
+in the transaction that finishes it (``record_execution``). ``backfill``
+recomputes whole days from ``executions`` for repair, limited to days that
+cleanup cannot have reached yet.
+
+Statistics read the rollups for past days plus a live aggregate over
+today's executions in one query (``totals_query``), so their cost depends
+on the number of days rather than the number of executions.
+"""
+
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Date, and_, case, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import array, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Insert, Select
+
+from app.models.agent import DURATION_BUCKETS_MS, Execution, ExecutionDailyRollup
+
+FINISHED_STATUSES = ("completed", "failed")
+
+_KEY = ("tenant_id", "user_id", "flow_id", "day")
+_SUMS = (
+    "executions", "successful", "failed", "tokens_used", "cost_cents",
+    "duration_count", "duration_ms_sum", "duration_ms_sumsq",
+)
+_BUCKETS = [f"bucket_{index}" for index in range(len(DURATION_BUCKETS_MS) + 1)]
+
+# Core tables keep these statements independent of mapper configuration
+executions = Execution.__table__
+rollups = ExecutionDailyRollup.__table__
+
+
+def _utc(value: datetime) -> datetime:
+    """``value`` as an aware UTC time; naive values are taken to be UTC already"""
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _utc_day(value: datetime) -> date:
+    return _utc(value).date()
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _bucket(duration_ms: float) -> int:
+    for index, bound in enumerate(DURATION_BUCKETS_MS):
+        if duration_ms <= bound:
+            return index
+    return len(DURATION_BUCKETS_MS)
+
+
+def rollup_values(execution: Execution) -> Dict[str, Any]:
+    """The contribution of one finished execution to its day's rollup"""
+    values = {
+        "tenant_id": execution.tenant_id,
+        "user_id": execution.user_id,
+        "flow_id": execution.flow_id,
+        "day": _utc_day(execution.created_at),
+        "executions": 1,
+        "successful": int(execution.status == "completed"),
+        "failed": int(execution.status == "failed"),
+        "tokens_used": execution.tokens_used or 0,
+        "cost_cents": execution.cost_cents or 0,
+        "duration_count": 0,
+        "duration_ms_sum": 0,
+        "duration_ms_sumsq": 0.0,
+        "duration_buckets": [0] * len(_BUCKETS),
+    }
+    if execution.status == "completed" and execution.started_at and execution.completed_at:
+        duration = _utc(execution.completed_at) - _utc(execution.started_at)
+        duration_ms = int(duration.total_seconds() * 1000)
+        values.update(duration_count=1, duration_ms_sum=duration_ms, duration_ms_sumsq=float(duration_ms) ** 2)
+        values["duration_buckets"][_bucket(duration_ms)] = 1
+    return values
+
+
+def record_statement(execution: Execution) -> Insert:
+    """Upsert adding ``execution`` to its day's rollup"""
+    statement = insert(rollups).values(**rollup_values(execution))
+    excluded = statement.excluded
+    increments = {name: rollups.c[name] + excluded[name] for name in _SUMS}
+    increments["duration_buckets"] = array([
+        rollups.c.duration_buckets[index] + excluded.duration_buckets[index]
+        for index in range(1, len(_BUCKETS) + 1)
+    ])
+    increments["updated_at"] = func.now()
+    return statement.on_conflict_do_update(index_elements=list(_KEY), set_=increments)
+
+
+async def record_execution(db: AsyncSession, execution: Execution) -> None:
+    """
+    Add a finished execution to the rollups. Call it once per execution, in
+    the transaction that sets its final status, so it is counted exactly
+    once; the caller commits.
+    """
+    await db.execute(record_statement(execution))
+
+
+def _duration_ms():
+    """Duration of a completed execution in ms, NULL otherwise"""
+    return case(
+        (
+            and_(
+                executions.c.status == "completed",
+                executions.c.started_at.isnot(None),
+                executions.c.completed_at.isnot(None)
+            ),
+            func.extract('epoch', executions.c.completed_at - executions.c.started_at) * 1000
+        ),
+        else_=None
+    )
+
+
+def _execution_aggregates() -> List[Any]:
+    """Per-group aggregates over ``executions``, labelled like the rollup columns"""
+    duration = _duration_ms()
+    bounds = (None,) + DURATION_BUCKETS_MS + (None,)
+    buckets = []
+    for index, name in enumerate(_BUCKETS):
+        lower, upper = bounds[index], bounds[index + 1]
+        conditions = [duration.isnot(None)]
+        if lower is not None:
+            conditions.append(duration > lower)
+        if upper is not None:
+            conditions.append(duration <= upper)
+        buckets.append(func.coalesce(func.sum(case((and_(*conditions), 1), else_=0)), 0).label(name))
+    return [
+        func.count().label("executions"),
+        func.coalesce(func.sum(case((executions.c.status == "completed", 1), else_=0)), 0).label("successful"),
+        func.coalesce(func.sum(case((executions.c.status == "failed", 1), else_=0)), 0).label("failed"),
+        func.coalesce(func.sum(executions.c.tokens_used), 0).label("tokens_used"),
+        func.coalesce(func.sum(executions.c.cost_cents), 0).label("cost_cents"),
+        func.count(duration).label("duration_count"),
+        func.coalesce(func.sum(duration), 0).label("duration_ms_sum"),
+        func.coalesce(func.sum(duration * duration), 0).label("duration_ms_sumsq"),
+        *buckets,
+    ]
+
+
+def backfill_statement(day: date) -> Insert:
+    """Recompute every rollup of ``day`` from ``executions``, replacing what is there"""
+    aggregates = {column.name: column for column in _execution_aggregates()}
+    source = select(
+        executions.c.tenant_id,
+        executions.c.user_id,
+        executions.c.flow_id,
+        literal(day, Date),
+        *(aggregates[name] for name in _SUMS),
+        array([aggregates[name] for name in _BUCKETS])
+    ).where(
+        executions.c.created_at >= _day_start(day),
+        executions.c.created_at < _day_start(day + timedelta(days=1)),
+        executions.c.status.in_(FINISHED_STATUSES)
+    ).group_by(executions.c.tenant_id, executions.c.user_id, executions.c.flow_id)
+
+    statement = insert(rollups).from_select(list(_KEY + _SUMS) + ["duration_buckets"], source)
+    replaced = {name: statement.excluded[name] for name in _SUMS + ("duration_buckets",)}
+    replaced["updated_at"] = func.now()
+    return statement.on_conflict_do_update(index_elements=list(_KEY), set_=replaced)
+
+
+async def first_complete_day(db: AsyncSession, default_ttl_days: int) -> Optional[date]:
+    """
+    The first day cleanup cannot have removed executions of, given the
+    shortest retention of any execution (``ttl_days``, ``default_ttl_days``
+    when unset); None when there are no executions to rebuild from.
+    """
+    shortest_ttl = (await db.execute(
+        select(func.min(func.coalesce(executions.c.ttl_days, default_ttl_days)))
+    )).scalar()
+    if shortest_ttl is None:
+        return None
+    return (datetime.now(timezone.utc) - timedelta(days=shortest_ttl)).date() + timedelta(days=1)
+
+
+async def backfill(db: AsyncSession, start_day: date, end_day: Optional[date] = None,
+                   default_ttl_days: int = 30) -> int:
+    """
+    Rebuild the rollups of ``start_day`` up to, not including, ``end_day``
+    (default: today), committing after each day.
+
+    Days before ``first_complete_day`` are skipped: cleanup may have removed
+    some of their executions, and recomputing them would replace the
+    rollups with the smaller count of what is left.
+    """
+    end_day = end_day or datetime.now(timezone.utc).date()
+    first_day = await first_complete_day(db, default_ttl_days)
+    if first_day is None:
+        return 0
+    rows = 0
+    day = max(start_day, first_day)
+    while day < end_day:
+        rows += (await db.execute(backfill_statement(day))).rowcount
+        await db.commit()
+        day += timedelta(days=1)
+    return rows
+
+
+def totals_query(days: int, **filters: Any) -> Select:
+    """
+    Totals over the last ``days`` UTC days for rows matching ``filters``
+    (e.g. ``user_id=...``): rollups before today plus today's executions,
+    which also counts those still running.
+    """
+    today = datetime.now(timezone.utc).date()
+    rolled = select(
+        *(rollups.c[name].label(name) for name in _SUMS),
+        *(rollups.c.duration_buckets[index + 1].label(name) for index, name in enumerate(_BUCKETS))
+    ).where(
+        rollups.c.day >= today - timedelta(days=days),
+        rollups.c.day < today,
+        *(rollups.c[key] == value for key, value in filters.items())
+    )
+    live = select(*_execution_aggregates()).where(
+        executions.c.created_at >= _day_start(today),
+        *(executions.c[key] == value for key, value in filters.items())
+    )
+
+    combined = union_all(rolled, live).subquery()
+    return select(*(func.coalesce(func.sum(column), 0).label(column.name) for column in combined.c))
+
+
+def summarize(totals: Any) -> Dict[str, Any]:
+    """Counts, rates and duration statistics from a ``totals_query`` row"""
+    total_executions = int(totals.executions)
+    successful_executions = int(totals.successful)
+    total_cost_cents = int(totals.cost_cents)
+
+    count = int(totals.duration_count)
+    avg_seconds = stddev_seconds = None
+    if count:
+        mean_ms = float(totals.duration_ms_sum) / count
+        variance = max(float(totals.duration_ms_sumsq) / count - mean_ms ** 2, 0.0)
+        avg_seconds = mean_ms / 1000
+        stddev_seconds = math.sqrt(variance) / 1000
+
+    return {
+        "total_executions": total_executions,
+        "successful_executions": successful_executions,
+        "failed_executions": int(totals.failed),
+        "success_rate": (successful_executions / total_executions * 100) if total_executions > 0 else 0,
+        "total_tokens": int(totals.tokens_used),
+        "total_cost_cents": total_cost_cents,
+        "total_cost_dollars": total_cost_cents / 100,
+        "avg_execution_time_seconds": avg_seconds,
+        "avg_execution_time_formatted": f"{avg_seconds:.1f}s" if avg_seconds else None,
+        "execution_time_stddev_seconds": stddev_seconds,
+        "duration_histogram": [
+            {"le_ms": bound, "count": int(getattr(totals, name))}
+            for bound, name in zip(DURATION_BUCKETS_MS + (None,), _BUCKETS)
+        ],
+    }
@@ -4,20 +4,372 @@
 Provides detailed step-by-step execution tracking and replay capabilities
 """
 
-from typing import List, Dict, Any, Optional, Tuple
-from uuid import UUID
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from uuid import UUID, uuid4
 from datetime import datetime, timedelta
 import json
 import hashlib
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import delete, desc, func, insert, literal, select
+from sqlalchemy.sql import Delete, Select
 
 from app.models.agent import Execution, ExecutionNode, ExecutionStep
 from app.models.user import User
-from app.core.security import get_current_user
 from app.schemas.execution import ExecutionStepCreate, ExecutionStepUpdate
 
+_NODE_COLUMNS = {
+    "node_pk": ExecutionNode.id,
+    "node_id": ExecutionNode.node_id,
+    "node_type": ExecutionNode.node_type,
+    "node_status": ExecutionNode.status,
+    "node_started_at": ExecutionNode.started_at,
+    "node_completed_at": ExecutionNode.completed_at,
+    "node_duration_ms": ExecutionNode.duration_ms,
+    "node_error_message": ExecutionNode.error_message,
+}
+
+_STEP_COLUMNS = {
+    "step_number": ExecutionStep.step_number,
+    "step_type": ExecutionStep.step_type,
+    "step_name": ExecutionStep.step_name,
+    "step_status": ExecutionStep.status,
+    "step_started_at": ExecutionStep.started_at,
+    "step_completed_at": ExecutionStep.completed_at,
+    "step_duration_ms": ExecutionStep.duration_ms,
+    "step_cost_cents": ExecutionStep.cost_cents,
+    "step_can_replay_from": ExecutionStep.can_replay_from,
+    "step_error_message": ExecutionStep.error_message,
+    "tool_name": ExecutionStep.tool_name,
+    "model_name": ExecutionStep.model_name,
+    "prompt_tokens": ExecutionStep.prompt_tokens,
+    "completion_tokens": ExecutionStep.completion_tokens,
+    "temperature": ExecutionStep.temperature,
+    "max_tokens": ExecutionStep.max_tokens,
+    "query": ExecutionStep.query,
+}
+
+# Large JSON columns, only loaded on request
+_PAYLOAD_COLUMNS = {
+    "tool_parameters": ExecutionStep.tool_parameters,
+    "tool_result": ExecutionStep.tool_result,
+    "retrieved_documents": ExecutionStep.retrieved_documents,
+    "relevance_scores": ExecutionStep.relevance_scores,
+}
+
+
+def timeline_query(execution_id: UUID, include_steps: bool = True, include_payloads: bool = False) -> Select:
+    """Nodes of an execution joined to their steps, in timeline order, one row per step"""
+    columns = dict(_NODE_COLUMNS)
+    if include_steps:
+        columns.update(_STEP_COLUMNS)
+        if include_payloads:
+            columns.update(_PAYLOAD_COLUMNS)
+    
+    query = select(*(column.label(label) for label, column in columns.items())).where(
+        ExecutionNode.execution_id == execution_id
+    )
+    order_by = [ExecutionNode.started_at, ExecutionNode.id]
+    if include_steps:
+        query = query.outerjoin(ExecutionStep, ExecutionStep.execution_node_id == ExecutionNode.id)
+        order_by.append(ExecutionStep.step_number)
+    return query.order_by(*order_by)
+
+
+def _execution_summary(execution: Execution) -> Dict[str, Any]:
+    return {
+        "execution_id": str(execution.id),
+        "flow_id": str(execution.flow_id),
+        "status": execution.status,
+        "started_at": execution.started_at,
+        "completed_at": execution.completed_at,
+        "tokens_used": execution.tokens_used,
+        "cost_cents": execution.cost_cents,
+        "can_replay": execution.can_replay,
+        "replay_count": execution.replay_count,
+        "original_execution_id": str(execution.original_execution_id) if execution.original_execution_id else None
+    }
+
+
+class _TimelineAssembler:
+    """Groups consecutive ``timeline_query`` rows into node dicts with their steps"""
+    
+    def __init__(self, include_payloads: bool = False):
+        self.include_payloads = include_payloads
+        self._node: Optional[Dict[str, Any]] = None
+        self._node_pk = None
+    
+    def add(self, row) -> List[Dict[str, Any]]:
+        """Add a row; returns the previous node once a row of the next one arrives"""
+        done = []
+        if self._node is None or row.node_pk != self._node_pk:
+            if self._node is not None:
+                done.append(self._node)
+            self._node_pk = row.node_pk
+            self._node = {
+                "node_id": row.node_id,
+                "node_type": row.node_type,
+                "status": row.node_status,
+                "started_at": row.node_started_at,
+                "completed_at": row.node_completed_at,
+                "duration_ms": row.node_duration_ms,
+                "error_message": row.node_error_message
+            }
+            if "step_number" in row._fields:
+                self._node["steps"] = []
+        
+        if "step_number" in row._fields and row.step_number is not None:
+            self._node["steps"].append(self._step(row))
+        return done
+    
+    def finish(self) -> List[Dict[str, Any]]:
+        node, self._node, self._node_pk = self._node, None, None
+        return [node] if node is not None else []
+    
+    def _step(self, row) -> Dict[str, Any]:
+        step = {
+            "step_number": row.step_number,
+            "step_type": row.step_type,
+            "step_name": row.step_name,
+            "status": row.step_status,
+            "started_at": row.step_started_at,
+            "completed_at": row.step_completed_at,
+            "duration_ms": row.step_duration_ms,
+            "cost_cents": row.step_cost_cents,
+            "can_replay_from": row.step_can_replay_from,
+            "error_message": row.step_error_message
+        }
+        
+        # Add tool-specific data
+        if row.tool_name:
+            step["tool"] = {"name": row.tool_name}
+            if self.include_payloads:
+                step["tool"].update(parameters=row.tool_parameters, result=row.tool_result)
+        
+        # Add LLM-specific data
+        if row.model_name:
+            step["llm"] = {
+                "model": row.model_name,
+                "prompt_tokens": row.prompt_tokens,
+                "completion_tokens": row.completion_tokens,
+                "temperature": row.temperature,
+                "max_tokens": row.max_tokens
+            }
+        
+        # Add RAG-specific data
+        if row.query:
+            step["rag"] = {"query": row.query}
+            if self.include_payloads:
+                step["rag"].update(
+                    retrieved_documents=row.retrieved_documents,
+                    relevance_scores=row.relevance_scores
+                )
+        
+        return step
+
+
+# Columns a replayed step keeps; everything produced by running it starts over
+_REPLAY_COPIED = (
+    "execution_node_id", "step_type", "step_name", "input_data", "intermediate_data",
+    "tool_name", "tool_parameters", "model_name", "temperature", "max_tokens", "query",
+    "can_replay_from", "replay_dependencies", "extra_data", "tags",
+)
+
+
+def replay_steps_statement(execution_id: UUID, new_execution_id: UUID, from_step: int):
+    """
+    ``INSERT ... SELECT`` cloning the steps of an execution from ``from_step``
+    on into a new execution, renumbered from 1 and reset to pending
+    """
+    steps = ExecutionStep.__table__
+    columns = {
+        "id": func.gen_random_uuid(),
+        "execution_id": literal(new_execution_id, steps.c.execution_id.type),
+        "step_number": func.row_number().over(order_by=steps.c.step_number),
+        "prompt_tokens": literal(0),
+        "completion_tokens": literal(0),
+        "cost_cents": literal(0),
+        "retry_count": literal(0),
+        "status": literal("pending"),
+    }
+    columns.update((name, steps.c[name]) for name in _REPLAY_COPIED)
+    
+    source = select(*columns.values()).where(
+        steps.c.execution_id == execution_id,
+        steps.c.step_number >= from_step
+    )
+    return insert(steps).from_select(list(columns), source, include_defaults=False)
+
+
+def _replay_step_query(execution_id: UUID, step_number: int) -> Select:
+    return select(ExecutionStep.id, ExecutionStep.can_replay_from).where(
+        ExecutionStep.execution_id == execution_id,
+        ExecutionStep.step_number == step_number
+    )
+
+
+def _check_replayable(execution: Optional[Execution], step, execution_id: UUID, step_number: int):
+    if not execution:
+        raise ValueError(f"Execution {execution_id} not found")
+    if not execution.can_replay:
+        raise ValueError("This execution cannot be replayed")
+    if not step:
+        raise ValueError(f"Step {step_number} not found in execution {execution_id}")
+    if not step.can_replay_from:
+        raise ValueError(f"Step {step_number} cannot be replayed from")
+
+
+def _replay_execution(original: Execution, user: User, new_input_data: Optional[Dict[str, Any]]) -> Execution:
+    return Execution(
+        id=uuid4(),
+        tenant_id=original.tenant_id,
+        flow_id=original.flow_id,
+        user_id=user.id,
+        status="pending",
+        input_data=new_input_data or original.input_data,
+        can_replay=True,
+        replay_count=original.replay_count + 1,
+        original_execution_id=original.id
+    )
+
+
+def _new_step(execution_id: UUID, execution_node_id: UUID, step_data: ExecutionStepCreate) -> ExecutionStep:
+    return ExecutionStep(
+        execution_id=execution_id,
+        execution_node_id=execution_node_id,
+        step_number=step_data.step_number,
+        step_type=step_data.step_type,
+        step_name=step_data.step_name,
+        input_data=step_data.input_data,
+        output_data=step_data.output_data,
+        intermediate_data=step_data.intermediate_data,
+        tool_name=step_data.tool_name,
+        tool_parameters=step_data.tool_parameters,
+        tool_result=step_data.tool_result,
+        model_name=step_data.model_name,
+        prompt_tokens=step_data.prompt_tokens,
+        completion_tokens=step_data.completion_tokens,
+        temperature=step_data.temperature,
+        max_tokens=step_data.max_tokens,
+        query=step_data.query,
+        retrieved_documents=step_data.retrieved_documents,
+        relevance_scores=step_data.relevance_scores,
+        started_at=step_data.started_at or datetime.utcnow(),
+        completed_at=step_data.completed_at,
+        duration_ms=step_data.duration_ms,
+        latency_ms=step_data.latency_ms,
+        cost_cents=step_data.cost_cents,
+        cost_breakdown=step_data.cost_breakdown,
+        status=step_data.status,
+        error_message=step_data.error_message,
+        retry_count=step_data.retry_count,
+        can_replay_from=step_data.can_replay_from,
+        replay_dependencies=step_data.replay_dependencies,
+        extra_data=step_data.extra_data,
+        tags=step_data.tags
+    )
+
+
+def _replay_candidates_query(execution_id: UUID) -> Select:
+    return select(
+        ExecutionStep.step_number,
+        ExecutionStep.step_name,
+        ExecutionStep.step_type,
+        ExecutionStep.replay_dependencies,
+        ExecutionStep.cost_cents
+    ).where(
+        ExecutionStep.execution_id == execution_id,
+        ExecutionStep.can_replay_from == True
+    ).order_by(ExecutionStep.step_number)
+
+
+def _replay_candidate(step) -> Dict[str, Any]:
+    return {
+        "step_number": step.step_number,
+        "step_name": step.step_name,
+        "step_type": step.step_type,
+        "description": f"Replay from {step.step_name}",
+        "dependencies": step.replay_dependencies or [],
+        "estimated_cost": step.cost_cents or 0
+    }
+
+
+def _apply_step_status(
+    step: ExecutionStep,
+    status: str,
+    output_data: Optional[Dict[str, Any]],
+    error_message: Optional[str],
+    cost_cents: Optional[int]
+) -> None:
+    step.status = status
+    step.completed_at = datetime.utcnow()
+    
+    if output_data is not None:
+        step.output_data = output_data
+    
+    if error_message is not None:
+        step.error_message = error_message
+    
+    if cost_cents is not None:
+        step.cost_cents = cost_cents
+    
+    # Calculate duration if started_at is set
+    if step.started_at and step.completed_at:
+        step.duration_ms = int((step.completed_at - step.started_at).total_seconds() * 1000)
+
+
+def _cost_breakdown_query(execution_id: UUID) -> Select:
+    """Step count and cost per (step type, tool, model), summed in SQL"""
+    return select(
+        ExecutionStep.step_type,
+        ExecutionStep.tool_name,
+        ExecutionStep.model_name,
+        func.count(),
+        func.coalesce(func.sum(ExecutionStep.cost_cents), 0)
+    ).where(
+        ExecutionStep.execution_id == execution_id
+    ).group_by(ExecutionStep.step_type, ExecutionStep.tool_name, ExecutionStep.model_name)
+
+
+def _cost_breakdown(rows) -> Dict[str, Any]:
+    total_cost = 0
+    step_count = 0
+    cost_by_type = {}
+    cost_by_tool = {}
+    cost_by_model = {}
+    
+    for step_type, tool_name, model_name, count, cost in rows:
+        step_count += count
+        total_cost += cost
+        cost_by_type[step_type] = cost_by_type.get(step_type, 0) + cost
+        if tool_name:
+            cost_by_tool[tool_name] = cost_by_tool.get(tool_name, 0) + cost
+        if model_name:
+            cost_by_model[model_name] = cost_by_model.get(model_name, 0) + cost
+    
+    return {
+        "total_cost_cents": total_cost,
+        "cost_by_type": cost_by_type,
+        "cost_by_tool": cost_by_tool,
+        "cost_by_model": cost_by_model,
+        "step_count": step_count
+    }
+
+
+def _cleanup_statements(cutoff_date: datetime) -> List[Delete]:
+    """Bulk deletes of old steps, nodes and executions, children first"""
+    return [
+        delete(model).where(model.created_at < cutoff_date).execution_options(synchronize_session=False)
+        for model in (ExecutionStep, ExecutionNode, Execution)
+    ]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
 
 class ExecutionTimelineService:
     """Service for managing execution timelines and replay capabilities"""
@@ -34,42 +386,7 @@ def create_execution_step(
     ) -> ExecutionStep:
         """Create a new execution step with detailed tracking"""
         
-        # Create the execution step
-        execution_step = ExecutionStep(
-            execution_id=execution_id,
-            execution_node_id=execution_node_id,
-            step_number=step_data.step_number,
-            step_type=step_data.step_type,
-            step_name=step_data.step_name,
-            input_data=step_data.input_data,
-            output_data=step_data.output_data,
-            intermediate_data=step_data.intermediate_data,
-            tool_name=step_data.tool_name,
-            tool_parameters=step_data.tool_parameters,
-            tool_result=step_data.tool_result,
-            model_name=step_data.model_name,
-            prompt_tokens=step_data.prompt_tokens,
-            completion_tokens=step_data.completion_tokens,
-            temperature=step_data.temperature,
-            max_tokens=step_data.max_tokens,
-            query=step_data.query,
-            retrieved_documents=step_data.retrieved_documents,
-            relevance_scores=step_data.relevance_scores,
-            started_at=step_data.started_at or datetime.utcnow(),
-            completed_at=step_data.completed_at,
-            duration_ms=step_data.duration_ms,
-            latency_ms=step_data.latency_ms,
-            cost_cents=step_data.cost_cents,
-            cost_breakdown=step_data.cost_breakdown,
-            status=step_data.status,
-            error_message=step_data.error_message,
-            retry_count=step_data.retry_count,
-            can_replay_from=step_data.can_replay_from,
-            replay_dependencies=step_data.replay_dependencies,
-            extra_data=step_data.extra_data,
-            tags=step_data.tags
-        )
-        
+        execution_step = _new_step(execution_id, execution_node_id, step_data)
         self.db.add(execution_step)
         self.db.commit()
         self.db.refresh(execution_step)
@@ -80,96 +397,26 @@ def get_execution_timeline(
         self,
         execution_id: UUID,
         include_steps: bool = True,
-        include_nodes: bool = True
+        include_nodes: bool = True,
+        include_payloads: bool = False
     ) -> Dict[str, Any]:
-        """Get complete execution timeline with steps and nodes"""
+        """
+        Get complete execution timeline with steps and nodes.
         
-        # Get the execution
+        Nodes and their steps come from one joined query; tool parameters and
+        results and retrieved documents are only loaded with
+        ``include_payloads``.
+        """
         execution = self.db.query(Execution).filter(Execution.id == execution_id).first()
         if not execution:
             raise ValueError(f"Execution {execution_id} not found")
         
-        timeline = {
-            "execution_id": str(execution.id),
-            "flow_id": str(execution.flow_id),
-            "status": execution.status,
-            "started_at": execution.started_at,
-            "completed_at": execution.completed_at,
-            "tokens_used": execution.tokens_used,
-            "cost_cents": execution.cost_cents,
-            "can_replay": execution.can_replay,
-            "replay_count": execution.replay_count,
-            "original_execution_id": str(execution.original_execution_id) if execution.original_execution_id else None
-        }
-        
+        timeline = _execution_summary(execution)
         if include_nodes:
-            # Get execution nodes
-            nodes = self.db.query(ExecutionNode).filter(
-                ExecutionNode.execution_id == execution_id
-            ).order_by(ExecutionNode.started_at).all()
-            
-            timeline["nodes"] = []
-            for node in nodes:
-                node_data = {
-                    "node_id": node.node_id,
-                    "node_type": node.node_type,
-                    "status": node.status,
-                    "started_at": node.started_at,
-                    "completed_at": node.completed_at,
-                    "duration_ms": node.duration_ms,
-                    "error_message": node.error_message
-                }
-                
-                if include_steps:
-                    # Get steps for this node
-                    steps = self.db.query(ExecutionStep).filter(
-                        ExecutionStep.execution_node_id == node.id
-                    ).order_by(ExecutionStep.step_number).all()
-                    
-                    node_data["steps"] = []
-                    for step in steps:
-                        step_data = {
-                            "step_number": step.step_number,
-                            "step_type": step.step_type,
-                            "step_name": step.step_name,
-                            "status": step.status,
-                            "started_at": step.started_at,
-                            "completed_at": step.completed_at,
-                            "duration_ms": step.duration_ms,
-                            "cost_cents": step.cost_cents,
-                            "can_replay_from": step.can_replay_from,
-                            "error_message": step.error_message
-                        }
-                        
-                        # Add tool-specific data
-                        if step.tool_name:
-                            step_data["tool"] = {
-                                "name": step.tool_name,
-                                "parameters": step.tool_parameters,
-                                "result": step.tool_result
-                            }
-                        
-                        # Add LLM-specific data
-                        if step.model_name:
-                            step_data["llm"] = {
-                                "model": step.model_name,
-                                "prompt_tokens": step.prompt_tokens,
-                                "completion_tokens": step.completion_tokens,
-                                "temperature": step.temperature,
-                                "max_tokens": step.max_tokens
-                            }
-                        
-                        # Add RAG-specific data
-                        if step.query:
-                            step_data["rag"] = {
-                                "query": step.query,
-                                "retrieved_documents": step.retrieved_documents,
-                                "relevance_scores": step.relevance_scores
-                            }
-                        
-                        node_data["steps"].append(step_data)
-                
-                timeline["nodes"].append(node_data)
+            assembler = _TimelineAssembler(include_payloads)
+            rows = self.db.execute(timeline_query(execution_id, include_steps, include_payloads))
+            timeline["nodes"] = [node for row in rows for node in assembler.add(row)]
+            timeline["nodes"].extend(assembler.finish())
         
         return timeline
     
@@ -180,94 +427,23 @@ def replay_execution_from_step(
         user: User,
         new_input_data: Optional[Dict[str, Any]] = None
     ) -> Execution:
-        """Replay execution from a specific step with optional new input"""
+        """
+        Replay execution from a specific step with optional new input.
         
-        # Get the original execution
+        The steps from ``step_number`` on are cloned with one
+        ``INSERT ... SELECT`` (see ``replay_steps_statement``).
+        """
         original_execution = self.db.query(Execution).filter(Execution.id == execution_id).first()
-        if not original_execution:
-            raise ValueError(f"Execution {execution_id} not found")
-        
-        if not original_execution.can_replay:
-            raise ValueError("This execution cannot be replayed")
-        
-        # Get the step to replay from
-        step = self.db.query(ExecutionStep).filter(
-            and_(
-                ExecutionStep.execution_id == execution_id,
-                ExecutionStep.step_number == step_number
-            )
-        ).first()
-        
-        if not step:
-            raise ValueError(f"Step {step_number} not found in execution {execution_id}")
-        
-        if not step.can_replay_from:
-            raise ValueError(f"Step {step_number} cannot be replayed from")
-        
-        # Create new execution
-        new_execution = Execution(
-            tenant_id=original_execution.tenant_id,
-            flow_id=original_execution.flow_id,
-            user_id=user.id,
-            status="pending",
-            input_data=new_input_data or original_execution.input_data,
-            can_replay=True,
-            replay_count=original_execution.replay_count + 1,
-            original_execution_id=execution_id
-        )
+        step = self.db.execute(_replay_step_query(execution_id, step_number)).first()
+        _check_replayable(original_execution, step, execution_id, step_number)
         
+        new_execution = _replay_execution(original_execution, user, new_input_data)
         self.db.add(new_execution)
+        self.db.flush()
+        self.db.execute(replay_steps_statement(execution_id, new_execution.id, step_number))
         self.db.commit()
         self.db.refresh(new_execution)
         
-        # Copy execution steps from the replay point
-        steps_to_copy = self.db.query(ExecutionStep).filter(
-            and_(
-                ExecutionStep.execution_id == execution_id,
-                ExecutionStep.step_number >= step_number
-            )
-        ).order_by(ExecutionStep.step_number).all()
-        
-        for i, original_step in enumerate(steps_to_copy):
-            new_step = ExecutionStep(
-                execution_id=new_execution.id,
-                execution_node_id=original_step.execution_node_id,
-                step_number=i + 1,  # Reset step numbering
-                step_type=original_step.step_type,
-                step_name=original_step.step_name,
-                input_data=original_step.input_data,
-                output_data=None,  # Reset output for replay
-                intermediate_data=original_step.intermediate_data,
-                tool_name=original_step.tool_name,
-                tool_parameters=original_step.tool_parameters,
-                tool_result=None,  # Reset result for replay
-                model_name=original_step.model_name,
-                prompt_tokens=0,  # Reset for replay
-                completion_tokens=0,  # Reset for replay
-                temperature=original_step.temperature,
-                max_tokens=original_step.max_tokens,
-                query=original_step.query,
-                retrieved_documents=None,  # Reset for replay
-                relevance_scores=None,  # Reset for replay
-                started_at=None,  # Will be set when step starts
-                completed_at=None,  # Will be set when step completes
-                duration_ms=None,
-                latency_ms=None,
-                cost_cents=0,  # Reset for replay
-                cost_breakdown=None,
-                status="pending",  # Reset status for replay
-                error_message=None,
-                retry_count=0,
-                can_replay_from=original_step.can_replay_from,
-                replay_dependencies=original_step.replay_dependencies,
-                extra_data=original_step.extra_data,
-                tags=original_step.tags
-            )
-            
-            self.db.add(new_step)
-        
-        self.db.commit()
-        
         return new_execution
     
     def get_replay_candidates(
@@ -275,27 +451,7 @@ def get_replay_candidates(
         execution_id: UUID
     ) -> List[Dict[str, Any]]:
         """Get list of steps that can be replayed from"""
-        
-        steps = self.db.query(ExecutionStep).filter(
-            and_(
-                ExecutionStep.execution_id == execution_id,
-                ExecutionStep.can_replay_from == True
-            )
-        ).order_by(ExecutionStep.step_number).all()
-        
-        candidates = []
-        for step in steps:
-            candidate = {
-                "step_number": step.step_number,
-                "step_name": step.step_name,
-                "step_type": step.step_type,
-                "description": f"Replay from {step.step_name}",
-                "dependencies": step.replay_dependencies or [],
-                "estimated_cost": step.cost_cents or 0
-            }
-            candidates.append(candidate)
-        
-        return candidates
+        return [_replay_candidate(step) for step in self.db.execute(_replay_candidates_query(execution_id))]
     
     def update_step_status(
         self,
@@ -307,25 +463,11 @@ def update_step_status(
     ) -> ExecutionStep:
         """Update execution step status and results"""
         
-        step = self.db.query(ExecutionStep).filter(ExecutionStep.id == step_id).first()
+        step = self.db.get(ExecutionStep, step_id)
         if not step:
             raise ValueError(f"Step {step_id} not found")
         
-        step.status = status
-        step.completed_at = datetime.utcnow()
-        
-        if output_data is not None:
-            step.output_data = output_data
-        
-        if error_message is not None:
-            step.error_message = error_message
-        
-        if cost_cents is not None:
-            step.cost_cents = cost_cents
-        
-        # Calculate duration if started_at is set
-        if step.started_at and step.completed_at:
-            step.duration_ms = int((step.completed_at - step.started_at).total_seconds() * 1000)
+        _apply_step_status(step, status, output_data, error_message, cost_cents)
         
         self.db.commit()
         self.db.refresh(step)
@@ -337,44 +479,7 @@ def get_execution_cost_breakdown(
         execution_id: UUID
     ) -> Dict[str, Any]:
         """Get detailed cost breakdown for an execution"""
-        
-        steps = self.db.query(ExecutionStep).filter(
-            ExecutionStep.execution_id == execution_id
-        ).all()
-        
-        total_cost = 0
-        cost_by_type = {}
-        cost_by_tool = {}
-        cost_by_model = {}
-        
-        for step in steps:
-            step_cost = step.cost_cents or 0
-            total_cost += step_cost
-            
-            # Cost by step type
-            if step.step_type not in cost_by_type:
-                cost_by_type[step.step_type] = 0
-            cost_by_type[step.step_type] += step_cost
-            
-            # Cost by tool
-            if step.tool_name:
-                if step.tool_name not in cost_by_tool:
-                    cost_by_tool[step.tool_name] = 0
-                cost_by_tool[step.tool_name] += step_cost
-            
-            # Cost by model
-            if step.model_name:
-                if step.model_name not in cost_by_model:
-                    cost_by_model[step.model_name] = 0
-                cost_by_model[step.model_name] += step_cost
-        
-        return {
-            "total_cost_cents": total_cost,
-            "cost_by_type": cost_by_type,
-            "cost_by_tool": cost_by_tool,
-            "cost_by_model": cost_by_model,
-            "step_count": len(steps)
-        }
+        return _cost_breakdown(self.db.execute(_cost_breakdown_query(execution_id)))
     
     def cleanup_old_executions(
         self,
@@ -384,21 +489,157 @@ def cleanup_old_executions(
         
         cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
         
-        # Delete old execution steps first (due to foreign key constraints)
-        deleted_steps = self.db.query(ExecutionStep).filter(
-            ExecutionStep.created_at < cutoff_date
-        ).delete()
+        # Steps and nodes first (foreign keys), executions last
+        results = [self.db.execute(statement) for statement in _cleanup_statements(cutoff_date)]
+        self.db.commit()
         
-        # Delete old execution nodes
-        deleted_nodes = self.db.query(ExecutionNode).filter(
-            ExecutionNode.created_at < cutoff_date
-        ).delete()
+        return results[-1].rowcount
+
+
+class AsyncExecutionTimelineService:
+    """``ExecutionTimelineService`` on an ``AsyncSession``"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _get_execution(self, execution_id: UUID) -> Execution:
+        execution = (
+            await self.db.execute(select(Execution).where(Execution.id == execution_id))
+        ).scalar_one_or_none()
+        if not execution:
+            raise ValueError(f"Execution {execution_id} not found")
+        return execution
+    
+    async def get_execution_timeline(
+        self,
+        execution_id: UUID,
+        include_steps: bool = True,
+        include_nodes: bool = True,
+        include_payloads: bool = False
+    ) -> Dict[str, Any]:
+        """Get complete execution timeline with steps and nodes (see ``ExecutionTimelineService``)"""
+        timeline = _execution_summary(await self._get_execution(execution_id))
+        if include_nodes:
+            assembler = _TimelineAssembler(include_payloads)
+            rows = await self.db.execute(timeline_query(execution_id, include_steps, include_payloads))
+            timeline["nodes"] = [node for row in rows for node in assembler.add(row)]
+            timeline["nodes"].extend(assembler.finish())
+        return timeline
+    
+    async def stream_execution_timeline(
+        self,
+        execution_id: UUID,
+        include_steps: bool = True,
+        include_payloads: bool = False,
+        batch_size: int = 500
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield the timeline as JSON in chunks, one node at a time, reading rows
+        from a server-side cursor so large executions are never held in
+        memory at once. The execution is looked up before the first chunk.
+        """
+        summary = _execution_summary(await self._get_execution(execution_id))
+        
+        async def chunks() -> AsyncIterator[bytes]:
+            yield json.dumps(summary, default=_json_default)[:-1].encode() + b', "nodes": ['
+            assembler = _TimelineAssembler(include_payloads)
+            result = await self.db.stream(
+                timeline_query(execution_id, include_steps, include_payloads).execution_options(
+                    yield_per=batch_size
+                )
+            )
+            first = True
+            async for row in result:
+                for node in assembler.add(row):
+                    yield (b"" if first else b", ") + json.dumps(node, default=_json_default).encode()
+                    first = False
+            for node in assembler.finish():
+                yield (b"" if first else b", ") + json.dumps(node, default=_json_default).encode()
+            yield b"]}"
+        
+        return chunks()
+    
+    async def replay_execution_from_step(
+        self,
+        execution_id: UUID,
+        step_number: int,
+        user: User,
+        new_input_data: Optional[Dict[str, Any]] = None
+    ) -> Execution:
+        """Replay execution from a specific step; steps are cloned in SQL in one statement"""
+        original_execution = (
+            await self.db.execute(select(Execution).where(Execution.id == execution_id))
+        ).scalar_one_or_none()
+        step = (await self.db.execute(_replay_step_query(execution_id, step_number))).first()
+        _check_replayable(original_execution, step, execution_id, step_number)
+        
+        new_execution = _replay_execution(original_execution, user, new_input_data)
+        self.db.add(new_execution)
+        await self.db.flush()
+        await self.db.execute(replay_steps_statement(execution_id, new_execution.id, step_number))
+        await self.db.commit()
+        await self.db.refresh(new_execution)
         
-        # Delete old executions
-        deleted_executions = self.db.query(Execution).filter(
-            Execution.created_at < cutoff_date
-        ).delete()
+        return new_execution
+    
+    async def create_execution_step(
+        self,
+        execution_id: UUID,
+        execution_node_id: UUID,
+        step_data: ExecutionStepCreate,
+        user: User
+    ) -> ExecutionStep:
+        """Create a new execution step with detailed tracking"""
+        execution_step = _new_step(execution_id, execution_node_id, step_data)
         
-        self.db.commit()
+        self.db.add(execution_step)
+        await self.db.commit()
+        await self.db.refresh(execution_step)
+        
+        return execution_step
+    
+    async def get_replay_candidates(
+        self,
+        execution_id: UUID
+    ) -> List[Dict[str, Any]]:
+        """Get list of steps that can be replayed from"""
+        return [_replay_candidate(step) for step in await self.db.execute(_replay_candidates_query(execution_id))]
+    
+    async def update_step_status(
+        self,
+        step_id: UUID,
+        status: str,
+        output_data: Optional[Dict[str, Any]] = None,
+        error_message: Optional[str] = None,
+        cost_cents: Optional[int] = None
+    ) -> ExecutionStep:
+        """Update execution step status and results"""
+        step = await self.db.get(ExecutionStep, step_id)
+        if not step:
+            raise ValueError(f"Step {step_id} not found")
+        
+        _apply_step_status(step, status, output_data, error_message, cost_cents)
+        
+        await self.db.commit()
+        await self.db.refresh(step)
+        
+        return step
+    
+    async def get_execution_cost_breakdown(
+        self,
+        execution_id: UUID
+    ) -> Dict[str, Any]:
+        """Get detailed cost breakdown for an execution"""
+        return _cost_breakdown(await self.db.execute(_cost_breakdown_query(execution_id)))
+    
+    async def cleanup_old_executions(
+        self,
+        days_to_keep: int = 30
+    ) -> int:
+        """Clean up old execution data based on TTL"""
+        cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
+        
+        results = [await self.db.execute(statement) for statement in _cleanup_statements(cutoff_date)]
+        await self.db.commit()
         
-        return deleted_executions
+        return results[-1].rowcount
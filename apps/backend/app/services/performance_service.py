@@ -6,12 +6,9 @@
 import os
 import time
 import asyncio
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Sequence
 from datetime import datetime, timedelta
 from functools import wraps
-import json
-import pickle
-import hashlib
 from contextlib import asynccontextmanager
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
@@ -22,7 +19,11 @@
 import psutil
 import aiofiles
 
+from app.core.cache import cache_manager
+from app.core.cache_codecs import CacheCodec
+from app.core.cache_keys import key_function, make_cache_key
 from app.core.config import settings
+from app.core.local_cache import BoundedCache, LocalCache
 
 logger = structlog.get_logger()
 
@@ -69,20 +70,48 @@ async def delete(self, key: str):
     
     async def clear(self):
         raise NotImplementedError
+    
+    async def generation(self, prefix: str) -> int:
+        """Current generation of a key prefix"""
+        raise NotImplementedError
+    
+    async def bump_generation(self, prefix: str) -> int:
+        """Invalidate every key under a prefix by advancing its generation"""
+        raise NotImplementedError
 
 
 class RedisCache(CacheBackend):
-    """Redis cache backend"""
+    """
+    Redis cache backend (values go through the shared cache codecs, never pickle).
+    
+    Prefix generations are kept in process for ``CACHE_GENERATION_TTL`` and
+    dropped on every worker when one bumps them, over the cache manager's
+    invalidation channel, so reads cost a single GET.
+    """
     
     def __init__(self, redis_client: redis.Redis):
         self.client = redis_client
+        self.codec = CacheCodec(
+            settings.CACHE_CODEC,
+            settings.CACHE_COMPRESSION,
+            settings.CACHE_COMPRESS_MIN_BYTES
+        )
+        self._generations: Dict[str, LocalCache] = {}
+    
+    def _generation_memo(self, prefix: str) -> LocalCache:
+        memo = self._generations.get(prefix)
+        if memo is None:
+            memo = LocalCache(max_entries=1, ttl=settings.CACHE_GENERATION_TTL)
+            cache_manager.register_sync_memo(f"perf:{prefix}", memo)
+            self._generations[prefix] = memo
+        return memo
     
     async def get(self, key: str) -> Optional[Any]:
         try:
             value = await self.client.get(key)
             if value:
                 cache_hits.inc()
-                return pickle.loads(value)
+                return self.codec.decode(value, legacy=None)
             cache_misses.inc()
             return None
         except Exception as e:
@@ -92,7 +121,7 @@ async def get(self, key: str) -> Optional[Any]:
     
     async def set(self, key: str, value: Any, ttl: Optional[int] = None):
         try:
-            serialized = pickle.dumps(value)
+            serialized = self.codec.encode(value)
             if ttl:
                 await self.client.setex(key, ttl, serialized)
             else:
@@ -111,47 +140,81 @@ async def clear(self):
             await self.client.flushdb()
         except Exception as e:
             logger.error("Redis clear error", error=str(e))
+    
+    async def generation(self, prefix: str) -> int:
+        memo = self._generation_memo(prefix)
+        generation = memo.get(prefix)
+        if generation is not None:
+            return generation
+        
+        if cache_manager.redis_client is None:
+            # Starts the listener that drops generations bumped elsewhere
+            await cache_manager.connect()
+        epoch = memo.epoch
+        try:
+            generation = int(await self.client.get(f"{prefix}:generation") or 0)
+        except Exception as e:
+            logger.error("Redis generation error", prefix=prefix, error=str(e))
+            return 0
+        memo.set(prefix, generation, epoch=epoch)
+        return generation
+    
+    async def bump_generation(self, prefix: str) -> int:
+        try:
+            generation = await self.client.incr(f"{prefix}:generation")
+        except Exception as e:
+            logger.error("Redis generation error", prefix=prefix, error=str(e))
+            return 0
+        self._generation_memo(prefix).clear()
+        await cache_manager.publish_clear(f"perf:{prefix}")
+        return generation
 
 
 class InMemoryCache(CacheBackend):
-    """In-memory cache backend for testing"""
+    """
+    In-memory cache backend, used when Redis is not configured.
     
-    def __init__(self):
-        self.cache: Dict[str, tuple[Any, Optional[float]]] = {}
-        self._cleanup_task = asyncio.create_task(self._cleanup_expired())
+    Bounded by ``PERF_CACHE_MAX_ENTRIES`` and ``PERF_CACHE_MAX_BYTES`` with
+    ``PERF_CACHE_EVICTION`` (lru or lfu); expired entries are dropped as the
+    cache is used, so no background task is needed.
+    """
+    
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        policy: Optional[str] = None
+    ):
+        self.cache = BoundedCache(
+            max_entries=max_entries or settings.PERF_CACHE_MAX_ENTRIES,
+            max_bytes=max_bytes or settings.PERF_CACHE_MAX_BYTES,
+            policy=policy or settings.PERF_CACHE_EVICTION
+        )
+        self.generations: Dict[str, int] = {}
     
     async def get(self, key: str) -> Optional[Any]:
-        if key in self.cache:
-            value, expiry = self.cache[key]
-            if expiry is None or time.time() < expiry:
-                cache_hits.inc()
-                return value
-            else:
-                del self.cache[key]
+        value = self.cache.get(key)
+        if value is not None:
+            cache_hits.inc()
+            return value
         cache_misses.inc()
         return None
     
     async def set(self, key: str, value: Any, ttl: Optional[int] = None):
-        expiry = time.time() + ttl if ttl else None
-        self.cache[key] = (value, expiry)
+        self.cache.set(key, value, ttl)
     
     async def delete(self, key: str):
-        self.cache.pop(key, None)
+        self.cache.delete(key)
     
     async def clear(self):
         self.cache.clear()
     
-    async def _cleanup_expired(self):
-        """Periodically clean up expired entries"""
-        while True:
-            await asyncio.sleep(60)  # Run every minute
-            current_time = time.time()
-            expired_keys = [
-                k for k, (_, expiry) in self.cache.items()
-                if expiry and current_time > expiry
-            ]
-            for key in expired_keys:
-                del self.cache[key]
+    async def generation(self, prefix: str) -> int:
+        return self.generations.get(prefix, 0)
+    
+    async def bump_generation(self, prefix: str) -> int:
+        self.generations[prefix] = self.generations.get(prefix, 0) + 1
+        return self.generations[prefix]
 
 
 class PerformanceService:
@@ -181,8 +244,19 @@ def _initialize(self):
         # Initialize optimized database engine
         self._setup_database_optimization()
         
-        # Start system monitoring
-        asyncio.create_task(self._monitor_system_metrics())
+        # Start system monitoring now if a loop is running, otherwise on first use
+        self._monitor_task: Optional[asyncio.Task] = None
+        self.start_monitoring()
+    
+    def start_monitoring(self):
+        """Start the system metrics task once an event loop is running"""
+        if self._monitor_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._monitor_task = loop.create_task(self._monitor_system_metrics())
     
     def _setup_database_optimization(self):
         """Setup optimized database connection pooling"""
@@ -238,63 +312,67 @@ async def _monitor_system_metrics(self):
     
     def cache_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate cache key"""
-        key_data = {
-            "prefix": prefix,
-            "args": args,
-            "kwargs": kwargs,
-        }
-        key_str = json.dumps(key_data, sort_keys=True)
-        key_hash = hashlib.md5(key_str.encode()).hexdigest()
-        return f"{prefix}:{key_hash}"
+        return make_cache_key(prefix, args, kwargs)
     
-    def cached(self, ttl: int = 300, prefix: Optional[str] = None):
-        """Decorator for caching function results"""
+    def cached(
+        self,
+        ttl: int = 300,
+        prefix: Optional[str] = None,
+        *,
+        key: Optional[Callable[..., Any]] = None,
+        ignore: Sequence[str] = (),
+        version: int = 1,
+        negative_ttl: Optional[int] = None
+    ):
+        """
+        Decorator for caching function results, keyed like
+        ``app.core.cache.cached``. ``None`` results are cached for
+        ``negative_ttl`` seconds if set, otherwise for ``ttl``.
+        """
         def decorator(func: Callable):
+            cache_prefix = prefix or f"{func.__module__}.{func.__qualname__}"
+            cache_key = key_function(func, cache_prefix, key, ignore, version)
+            
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                # Generate cache key
-                cache_prefix = prefix or f"{func.__module__}.{func.__name__}"
-                key = self.cache_key(cache_prefix, *args, **kwargs)
+                self.start_monitoring()
+                generation = await self._cache.generation(cache_prefix)
+                full_key = f"{cache_key(*args, **kwargs)}:g{generation}"
                 
-                # Try to get from cache
-                cached_value = await self._cache.get(key)
+                # Values are boxed so a cached None is told apart from a miss
+                cached_value = await self._cache.get(full_key)
                 if cached_value is not None:
-                    return cached_value
+                    return cached_value[0]
                 
-                # Execute function and cache result
                 result = await func(*args, **kwargs)
-                await self._cache.set(key, result, ttl)
+                entry_ttl = negative_ttl if result is None and negative_ttl is not None else ttl
+                if entry_ttl > 0:
+                    await self._cache.set(full_key, [result], entry_ttl)
                 
                 return result
             
+            wrapper.cache_key = cache_key
             return wrapper
         return decorator
     
-    async def invalidate_cache(self, pattern: str):
-        """Invalidate cache entries matching pattern"""
-        if isinstance(self._cache, RedisCache):
-            # Use Redis SCAN for pattern matching
-            cursor = 0
-            while True:
-                cursor, keys = await self._redis_client.scan(
-                    cursor, match=pattern, count=100
-                )
-                if keys:
-                    await self._redis_client.delete(*keys)
-                if cursor == 0:
-                    break
-        else:
-            # For in-memory cache, iterate through keys
-            keys_to_delete = [
-                k for k in self._cache.cache.keys()
-                if pattern.replace("*", "") in k
-            ]
-            for key in keys_to_delete:
-                await self._cache.delete(key)
+    async def invalidate_cache(self, prefix: str):
+        """
+        Invalidate every entry cached under ``prefix`` (a trailing ``*`` is
+        accepted for compatibility) by bumping the prefix's generation, so no
+        keys have to be scanned; old entries expire on their TTL.
+        
+        Only whole prefixes can be invalidated this way, so any other glob
+        pattern raises ``ValueError``.
+        """
+        namespace = prefix.rstrip("*").rstrip(":")
+        if not namespace or any(char in namespace for char in "*?[]"):
+            raise ValueError(f"Only a cache prefix (optionally ending in '*') can be invalidated, got {prefix!r}")
+        await self._cache.bump_generation(namespace)
     
     @asynccontextmanager
     async def query_performance_tracker(self, query_name: str):
         """Context manager for tracking query performance"""
+        self.start_monitoring()
         start_time = time.time()
         try:
             yield
@@ -408,12 +486,23 @@ def get_performance_stats(self) -> Dict[str, Any]:
                 "hits": cache_hits._value._value if hasattr(cache_hits, '_value') else 0,
                 "misses": cache_misses._value._value if hasattr(cache_misses, '_value') else 0,
                 "hit_rate": self._calculate_cache_hit_rate(),
+                **self._in_memory_cache_stats(),
             },
             "database": {
                 "active_connections": active_connections._value._value if hasattr(active_connections, '_value') else 0,
             },
         }
     
+    def _in_memory_cache_stats(self) -> Dict[str, Any]:
+        """Occupancy of the in-memory backend, if it is in use"""
+        if not isinstance(self._cache, InMemoryCache):
+            return {}
+        return {
+            "entries": len(self._cache.cache),
+            "size_bytes": self._cache.cache.size,
+            "evictions": self._cache.cache.evictions,
+        }
+    
     def _calculate_cache_hit_rate(self) -> float:
         """Calculate cache hit rate"""
         hits = cache_hits._value._value if hasattr(cache_hits, '_value') else 0
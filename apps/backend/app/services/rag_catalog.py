@@ -0,0 +1,362 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Per-user document and chunk catalog for the RAG system
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import AsyncSessionLocal
+from app.models.rag import Document, DocumentChunk, VectorCollectionAssignment
+
+
+def _as_uuid(user_id: Any) -> UUID:
+    return user_id if isinstance(user_id, UUID) else UUID(str(user_id))
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4
+
+
+class RAGCatalog:
+    """
+    SQL mirror of what is stored in the vector store.
+
+    One ``Document`` row per ingested document (keyed by its external ID) and
+    one ``DocumentChunk`` row per chunk (``embedding_id`` is the vector store
+    ID). Statistics and source listings are answered from here with indexed
+    queries instead of pulling every chunk out of the vector store.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def begin_document(
+        self,
+        user_id: Any,
+        external_id: str,
+        metadata: Dict[str, Any]
+    ) -> Tuple[UUID, datetime]:
+        """
+        Create or refresh a document row before its chunks are synced.
+
+        Returns the document's primary key and the database time the sync
+        started; ``finish_document`` drops every chunk row not touched since.
+        """
+        user_uuid = _as_uuid(user_id)
+
+        async with self.session_factory() as db:
+            async with db.begin():
+                document = (await db.execute(
+                    select(Document).where(
+                        Document.user_id == user_uuid,
+                        Document.external_id == external_id
+                    )
+                )).scalar_one_or_none()
+
+                if document is None:
+                    document = Document(user_id=user_uuid, external_id=external_id)
+                    db.add(document)
+
+                document.name = metadata.get("filename") or metadata.get("title") or external_id
+                document.source_type = metadata.get("source_type") or metadata.get("file_type") or "text"
+                document.source_url = metadata.get("source_url")
+                document.extra_data = metadata
+                document.status = "processing"
+                document.error_message = None
+                await db.flush()
+
+                started_at = (await db.execute(select(func.now()))).scalar_one()
+
+        return document.id, started_at
+
+    async def sync_chunk_batch(self, document_id: UUID, chunks: Dict[str, Tuple[int, str, str]]):
+        """
+        Record one batch of a document's chunks in one transaction.
+
+        ``chunks`` maps vector store ID to (chunk_index, text, content_hash).
+        Missing rows are inserted and existing ones re-positioned and touched,
+        so a catalog that fell behind the vector store catches up on the next
+        ingest.
+        """
+        async with self.session_factory() as db:
+            async with db.begin():
+                existing = {
+                    row.embedding_id: row
+                    for row in (await db.execute(
+                        select(DocumentChunk.id, DocumentChunk.embedding_id, DocumentChunk.chunk_index)
+                        .where(
+                            DocumentChunk.document_id == document_id,
+                            DocumentChunk.embedding_id.in_(list(chunks))
+                        )
+                    )).all()
+                }
+
+                added = [
+                    {
+                        "document_id": document_id,
+                        "chunk_index": index,
+                        "content": text,
+                        "content_hash": chunk_hash,
+                        "embedding_id": embedding_id,
+                        "token_count": _estimate_tokens(text)
+                    }
+                    for embedding_id, (index, text, chunk_hash) in chunks.items()
+                    if embedding_id not in existing
+                ]
+                if added:
+                    await db.execute(insert(DocumentChunk), added)
+
+                if existing:
+                    await db.execute(
+                        update(DocumentChunk)
+                        .where(DocumentChunk.id.in_([row.id for row in existing.values()]))
+                        .values(updated_at=func.now())
+                    )
+
+                moved = [
+                    {"id": existing[embedding_id].id, "chunk_index": index}
+                    for embedding_id, (index, _, _) in chunks.items()
+                    if embedding_id in existing and existing[embedding_id].chunk_index != index
+                ]
+                if moved:
+                    await db.execute(update(DocumentChunk), moved)
+
+    async def finish_document(self, document_id: UUID, started_at: datetime):
+        """Drop chunk rows the sync did not touch and refresh the totals"""
+        async with self.session_factory() as db:
+            async with db.begin():
+                await db.execute(
+                    delete(DocumentChunk).where(
+                        DocumentChunk.document_id == document_id,
+                        DocumentChunk.updated_at < started_at
+                    )
+                )
+
+                chunk_count, token_count = (await db.execute(
+                    select(
+                        func.count(DocumentChunk.id),
+                        func.coalesce(func.sum(DocumentChunk.token_count), 0)
+                    ).where(DocumentChunk.document_id == document_id)
+                )).one()
+
+                await db.execute(
+                    update(Document)
+                    .where(Document.id == document_id)
+                    .values(chunk_count=chunk_count, token_count=token_count, status="ready")
+                )
+
+    async def delete_document(self, user_id: Any, external_id: str):
+        """Remove a document (its chunks go with it via ON DELETE CASCADE)"""
+        async with self.session_factory() as db:
+            async with db.begin():
+                await db.execute(
+                    delete(Document).where(
+                        Document.user_id == _as_uuid(user_id),
+                        Document.external_id == external_id
+                    )
+                )
+
+    async def clear_user(self, user_id: Any):
+        """Remove every document of a user"""
+        async with self.session_factory() as db:
+            async with db.begin():
+                await db.execute(delete(Document).where(Document.user_id == _as_uuid(user_id)))
+
+    async def get_stats(self, user_id: Any) -> Dict[str, Any]:
+        """Document, chunk and token totals for a user in a single query"""
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(
+                    func.count(Document.id),
+                    func.coalesce(func.sum(Document.chunk_count), 0),
+                    func.coalesce(func.sum(Document.token_count), 0),
+                    func.max(Document.updated_at)
+                ).where(Document.user_id == _as_uuid(user_id))
+            )).one()
+
+        total_documents, total_chunks, total_tokens, last_updated = row
+        return {
+            "total_documents": total_documents,
+            "total_chunks": int(total_chunks),
+            "total_tokens": int(total_tokens),
+            "last_updated": last_updated
+        }
+
+    async def list_documents(
+        self,
+        user_id: Any,
+        skip: int = 0,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Page of a user's documents, newest first"""
+        async with self.session_factory() as db:
+            documents = (await db.execute(
+                select(Document)
+                .where(Document.user_id == _as_uuid(user_id))
+                .order_by(Document.created_at.desc(), Document.id.desc())
+                .offset(skip)
+                .limit(limit)
+            )).scalars().all()
+
+        return [
+            {
+                "document_id": document.external_id,
+                "filename": document.name,
+                "source_type": document.source_type,
+                "status": document.status,
+                "ingested_at": (document.extra_data or {}).get("ingested_at")
+                    or (document.created_at.isoformat() if document.created_at else None),
+                "chunk_count": document.chunk_count,
+                "token_count": document.token_count
+            }
+            for document in documents
+        ]
+
+    async def get_document(self, user_id: Any, external_id: str) -> Optional[Document]:
+        """Look up a single document by its external ID"""
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(Document).where(
+                    Document.user_id == _as_uuid(user_id),
+                    Document.external_id == external_id
+                )
+            )).scalar_one_or_none()
+
+    async def get_collection_assignment(self, user_id: Any) -> Optional[str]:
+        """Dedicated collection of a user, if one was assigned"""
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(VectorCollectionAssignment.collection_name)
+                .where(VectorCollectionAssignment.user_id == _as_uuid(user_id))
+            )).scalar_one_or_none()
+
+    async def set_collection_assignment(
+        self,
+        user_id: Any,
+        collection_name: str,
+        retired_collection: Optional[str] = None,
+        retired_until: Optional[datetime] = None
+    ):
+        """
+        Record (or move) a user's collection, optionally retiring the one they
+        leave until ``retired_until``
+        """
+        values = {
+            "collection_name": collection_name,
+            "retired_collection": retired_collection,
+            "retired_until": retired_until
+        }
+        statement = pg_insert(VectorCollectionAssignment).values(user_id=_as_uuid(user_id), **values)
+        async with self.session_factory() as db:
+            async with db.begin():
+                await db.execute(statement.on_conflict_do_update(
+                    index_elements=[VectorCollectionAssignment.user_id],
+                    set_={**values, "updated_at": func.now()}
+                ))
+
+    async def get_retired_collections(self, user_id: Any = None) -> List[Tuple[UUID, str, str, datetime]]:
+        """
+        ``(user_id, collection_name, retired_collection, retired_until)`` of
+        users (or the one given) whose previous collection awaits cleanup
+        """
+        query = (
+            select(
+                VectorCollectionAssignment.user_id,
+                VectorCollectionAssignment.collection_name,
+                VectorCollectionAssignment.retired_collection,
+                VectorCollectionAssignment.retired_until
+            )
+            .where(VectorCollectionAssignment.retired_collection.is_not(None))
+            .order_by(VectorCollectionAssignment.retired_until)
+        )
+        if user_id is not None:
+            query = query.where(VectorCollectionAssignment.user_id == _as_uuid(user_id))
+        async with self.session_factory() as db:
+            return [tuple(row) for row in (await db.execute(query)).all()]
+
+    async def clear_retired_collection(self, user_id: Any, retired_collection: str):
+        """Forget a retired collection once its chunks are gone"""
+        async with self.session_factory() as db:
+            async with db.begin():
+                await db.execute(
+                    update(VectorCollectionAssignment)
+                    .where(
+                        VectorCollectionAssignment.user_id == _as_uuid(user_id),
+                        VectorCollectionAssignment.retired_collection == retired_collection
+                    )
+                    .values(retired_collection=None, retired_until=None)
+                )
+
+    async def get_users_over(self, min_chunks: int) -> List[Tuple[UUID, int]]:
+        """Users whose chunk total is at least ``min_chunks``, largest first"""
+        total = func.sum(Document.chunk_count)
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(Document.user_id, total)
+                .group_by(Document.user_id)
+                .having(total >= min_chunks)
+                .order_by(total.desc())
+            )).all()
+        return [(user_id, int(chunks)) for user_id, chunks in rows]
+
+    async def get_user_chunks(
+        self,
+        user_id: Any,
+        after_id: Optional[UUID] = None,
+        limit: int = 100,
+        changed_since: Optional[datetime] = None,
+        with_content: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Page of a user's chunks in primary key order (keyset pagination on
+        ``after_id``), with the metadata the vector store holds for them
+        """
+        columns = [DocumentChunk.id, DocumentChunk.embedding_id]
+        if with_content:
+            columns += [
+                DocumentChunk.content,
+                DocumentChunk.content_hash,
+                DocumentChunk.chunk_index,
+                Document.external_id,
+                Document.extra_data
+            ]
+
+        query = (
+            select(*columns)
+            .join(Document, Document.id == DocumentChunk.document_id)
+            .where(Document.user_id == _as_uuid(user_id))
+            .order_by(DocumentChunk.id)
+            .limit(limit)
+        )
+        if after_id is not None:
+            query = query.where(DocumentChunk.id > after_id)
+        if changed_since is not None:
+            query = query.where(DocumentChunk.updated_at >= changed_since)
+
+        async with self.session_factory() as db:
+            rows = (await db.execute(query)).all()
+
+        if not with_content:
+            return [{"id": row.id, "embedding_id": row.embedding_id} for row in rows]
+        return [
+            {
+                "id": row.id,
+                "embedding_id": row.embedding_id,
+                "content": row.content,
+                "content_hash": row.content_hash,
+                "metadata": {
+                    **(row.extra_data or {}),
+                    "document_id": row.external_id,
+                    "chunk_index": row.chunk_index,
+                    "content_hash": row.content_hash
+                }
+            }
+            for row in rows
+        ]
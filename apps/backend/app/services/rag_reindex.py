@@ -0,0 +1,257 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Background re-embedding of a user's documents into a shadow collection
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from uuid import UUID, uuid4
+
+import structlog
+
+from app.core.cache import CacheNamespace, cache_manager
+from app.services.embedding_cache import CachedEmbedder
+from app.services.rag_catalog import RAGCatalog
+from app.services.vector_collections import CollectionRouter
+
+logger = structlog.get_logger()
+
+# Progress records outlive the job so clients can poll the outcome
+_STATE_TTL = 7 * 24 * 3600
+
+# A job's claim lapses this long after its worker stopped renewing it
+_LEASE_MS = 60000
+
+
+class RAGReindexer:
+    """
+    Rebuilds a user's vectors from the catalog.
+
+    Chunks are streamed from the catalog in pages, embedded through the
+    cached embedder and written to a fresh shadow collection; searches keep
+    using the current collection until the job is done. A user with a
+    dedicated collection is then swapped over to the shadow; a user in a
+    shared shard stays there, and the shadow's chunks replace theirs in the
+    shard. The rate is capped at ``chunks_per_second`` so live search keeps
+    its share of the embedding backend and vector store.
+
+    A job is claimed with a lease in Redis, so only one worker runs a
+    user's job at a time. Progress (including the last catalog chunk
+    written) is saved after every page, so a job whose worker stopped is
+    resumed where it stopped by the next ``start``.
+    """
+
+    def __init__(
+        self,
+        catalog: RAGCatalog,
+        collections: CollectionRouter,
+        embedder: CachedEmbedder,
+        on_swapped: Optional[Callable[[Any], Awaitable[None]]] = None,
+        page_size: int = 100,
+        chunks_per_second: float = 200.0
+    ):
+        self.catalog = catalog
+        self.collections = collections
+        self.embedder = embedder
+        self.on_swapped = on_swapped
+        self.page_size = page_size
+        self.chunks_per_second = chunks_per_second
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _state_key(user_key: str) -> str:
+        return f"reindex:{user_key}"
+
+    @staticmethod
+    def _lease_name(user_key: str) -> str:
+        return f"rag:reindex:{user_key}"
+
+    async def get_status(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        """Latest progress record of a user's reindex job"""
+        return await cache_manager.get(CacheNamespace.RAG, self._state_key(str(user_id)))
+
+    async def _save(self, state: Dict[str, Any]):
+        state["updated_at"] = datetime.utcnow().isoformat()
+        await cache_manager.set(CacheNamespace.RAG, self._state_key(state["user_id"]), state, ttl=_STATE_TTL)
+
+    def is_running(self, user_id: Any) -> bool:
+        """Whether this worker is running the user's job (others may be, see ``start``)"""
+        task = self._tasks.get(str(user_id))
+        return task is not None and not task.done()
+
+    async def start(self, user_id: Any) -> Dict[str, Any]:
+        """
+        Start (or resume) a user's reindex in the background and return its
+        progress record; a job running in any worker is left alone
+        """
+        user_key = str(user_id)
+        if self.is_running(user_id):
+            return await self.get_status(user_id)
+
+        lease = await cache_manager.acquire_lease(self._lease_name(user_key), _LEASE_MS)
+        if lease is None:
+            return await self.get_status(user_id)
+
+        try:
+            state = await self._resumable_state(user_id)
+        except Exception:
+            await cache_manager.release_lease(self._lease_name(user_key), lease)
+            raise
+        self._tasks[user_key] = asyncio.create_task(self.run(user_id, lease))
+        return state
+
+    async def _resumable_state(self, user_id: Any) -> Dict[str, Any]:
+        """Progress record of an unfinished job, or a fresh one"""
+        state = await self.get_status(user_id)
+        if state is not None and state["status"] not in ("completed", "cancelled"):
+            return state
+
+        user_key = str(user_id)
+        job_id = uuid4().hex
+        state = {
+            "job_id": job_id,
+            "user_id": user_key,
+            "status": "pending",
+            "shadow_collection": self.collections.shadow_name(user_key, job_id),
+            "last_chunk_id": None,
+            "processed": 0,
+            "total": (await self.catalog.get_stats(user_id))["total_chunks"],
+            "started_at": datetime.utcnow().isoformat(),
+            "completed_at": None,
+            "error": None
+        }
+        await self._save(state)
+        return state
+
+    async def run(self, user_id: Any, lease: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run (or resume) a user's reindex job to completion, under ``lease`` if
+        the caller claimed the job already
+        """
+        user_key = str(user_id)
+        lease_name = self._lease_name(user_key)
+        if lease is None:
+            lease = await cache_manager.acquire_lease(lease_name, _LEASE_MS)
+            if lease is None:
+                return await self.get_status(user_id)
+
+        try:
+            return await self._run(user_id, lease)
+        finally:
+            await cache_manager.release_lease(lease_name, lease)
+
+    async def _run(self, user_id: Any, lease: str) -> Dict[str, Any]:
+        user_key = str(user_id)
+        state = await self._resumable_state(user_id)
+        state.update(status="running", error=None)
+        await self._save(state)
+
+        try:
+            shadow = self.collections.open(state["shadow_collection"])
+            last_id = UUID(state["last_chunk_id"]) if state["last_chunk_id"] else None
+            window_start = time.monotonic()
+            window_count = 0
+
+            while True:
+                page = await self.catalog.get_user_chunks(user_id, after_id=last_id, limit=self.page_size)
+                if not page:
+                    break
+
+                await self._write(shadow, page)
+                last_id = page[-1]["id"]
+                state["last_chunk_id"] = str(last_id)
+                state["processed"] += len(page)
+                await self._save(state)
+                if not await cache_manager.renew_lease(self._lease_name(user_key), lease, _LEASE_MS):
+                    raise RuntimeError("Reindex lease lost to another worker")
+
+                # Throttle: never run ahead of chunks_per_second
+                window_count += len(page)
+                ahead = window_count / self.chunks_per_second - (time.monotonic() - window_start)
+                await asyncio.sleep(max(ahead, 0))
+
+            await self._reconcile(user_id, shadow, datetime.fromisoformat(state["started_at"]))
+
+            current = await self.collections.resolve(user_id)
+            if self.collections.is_dedicated(user_key, current):
+                await self.collections.swap(user_id, state["shadow_collection"])
+            else:
+                await self._replace_in_shard(user_id, shadow, current)
+                self.collections.drop(state["shadow_collection"])
+            if self.on_swapped is not None:
+                await self.on_swapped(user_id)
+
+            state.update(status="completed", completed_at=datetime.utcnow().isoformat())
+            await self._save(state)
+            logger.info("Reindex completed", user_id=user_key, job_id=state["job_id"],
+                        chunks=state["processed"])
+        except Exception as e:
+            state.update(status="failed", error=str(e))
+            await self._save(state)
+            logger.error("Reindex failed", user_id=user_key, job_id=state["job_id"], error=str(e))
+
+        return state
+
+    async def _write(self, shadow: Any, chunks):
+        """Embed (through the cache) and upsert a page of catalog chunks"""
+        embeddings = await self.embedder.embed(
+            [chunk["content"] for chunk in chunks],
+            [chunk["content_hash"] for chunk in chunks]
+        )
+        shadow.upsert(
+            ids=[chunk["embedding_id"] for chunk in chunks],
+            documents=[chunk["content"] for chunk in chunks],
+            metadatas=[chunk["metadata"] for chunk in chunks],
+            embeddings=embeddings.tolist()
+        )
+
+    async def _live_ids(self, user_id: Any) -> Set[str]:
+        """Vector store IDs of every chunk the catalog holds for a user"""
+        last_id = None
+        live_ids = set()
+        while True:
+            page = await self.catalog.get_user_chunks(
+                user_id, after_id=last_id, limit=self.page_size * 10, with_content=False
+            )
+            if not page:
+                return live_ids
+            live_ids.update(chunk["embedding_id"] for chunk in page)
+            last_id = page[-1]["id"]
+
+    async def _replace_in_shard(self, user_id: Any, shadow: Any, shard_name: str):
+        """
+        Overwrite a shard user's chunks with their re-embedded copies (chunk
+        IDs are stable, so this is an upsert), then drop any that were
+        deleted from the catalog while copying
+        """
+        shard = self.collections.open(shard_name)
+        self.collections.copy_chunks(shadow, shard, batch_size=self.page_size)
+
+        live_ids = await self._live_ids(user_id)
+        stale = [chunk_id for chunk_id in shadow.get(include=[])["ids"] if chunk_id not in live_ids]
+        if stale:
+            shard.delete(ids=stale)
+
+    async def _reconcile(self, user_id: Any, shadow: Any, started_at: datetime):
+        """
+        Apply ingests and deletes that happened while the job ran: chunks
+        written since it started are (re)copied, and chunks no longer in the
+        catalog are dropped from the shadow collection
+        """
+        live_ids = await self._live_ids(user_id)
+
+        last_id = None
+        while True:
+            page = await self.catalog.get_user_chunks(
+                user_id, after_id=last_id, limit=self.page_size, changed_since=started_at
+            )
+            if not page:
+                break
+            await self._write(shadow, page)
+            last_id = page[-1]["id"]
+
+        stale = [chunk_id for chunk_id in shadow.get(include=[])["ids"] if chunk_id not in live_ids]
+        if stale:
+            shadow.delete(ids=stale)
@@ -0,0 +1,203 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Rerank stages applied to RAG search candidates
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+
+def maximal_marginal_relevance(
+    query_embedding: np.ndarray,
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    top_k: int,
+    lambda_mult: float = 0.7
+) -> List[int]:
+    """
+    Greedy MMR selection.
+
+    Each step picks the candidate maximising
+    ``lambda * relevance - (1 - lambda) * max_similarity_to_selected``; the
+    running maximum similarity is updated with one matrix-vector product per
+    step.
+    """
+    n = len(embeddings)
+    if n == 0:
+        return []
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = embeddings / norms
+
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(top_k, n)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, unit @ unit[best])
+    return selected
+
+
+class RerankStage:
+    """
+    Base class for a rerank stage.
+
+    Stages keep a moving average of their cost per candidate and are skipped
+    when the expected cost exceeds their own budget or the time left before
+    the search deadline.
+    """
+
+    name = "stage"
+
+    def __init__(self, budget_ms: int):
+        self.budget_ms = budget_ms
+        self._ms_per_candidate: Optional[float] = None
+
+    def ready(self) -> bool:
+        return True
+
+    def expected_ms(self, n_candidates: int) -> float:
+        return (self._ms_per_candidate or 0.0) * n_candidates
+
+    def record(self, elapsed_ms: float, n_candidates: int):
+        observed = elapsed_ms / max(n_candidates, 1)
+        if self._ms_per_candidate is None:
+            self._ms_per_candidate = observed
+        else:
+            self._ms_per_candidate = 0.8 * self._ms_per_candidate + 0.2 * observed
+
+    def skipped(self):
+        """Decay the cost estimate so a skipped stage is eventually retried"""
+        if self._ms_per_candidate is not None:
+            self._ms_per_candidate *= 0.95
+
+    async def apply(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        candidates: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        relevance: np.ndarray,
+        top_k: int
+    ) -> List[int]:
+        """Return candidate positions in their new order"""
+        raise NotImplementedError
+
+
+class MMRStage(RerankStage):
+    """Diversify candidates with maximal marginal relevance"""
+
+    name = "mmr"
+
+    def __init__(self, budget_ms: int, lambda_mult: float = 0.7):
+        super().__init__(budget_ms)
+        self.lambda_mult = lambda_mult
+
+    async def apply(self, query, query_embedding, candidates, embeddings, relevance, top_k):
+        return maximal_marginal_relevance(
+            query_embedding, embeddings, relevance, top_k, self.lambda_mult
+        )
+
+
+class CrossEncoderStage(RerankStage):
+    """
+    Score (query, chunk) pairs with a local cross-encoder, in batches off the
+    event loop. The model loads in the background on first use and the stage
+    is skipped until it is ready; without sentence-transformers installed it
+    stays disabled.
+    """
+
+    name = "cross_encoder"
+
+    def __init__(self, budget_ms: int, model_name: str, batch_size: int = 32):
+        super().__init__(budget_ms)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._loading: Optional[asyncio.Task] = None
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            logger.warning("sentence-transformers not installed, cross-encoder rerank disabled")
+            return
+        self._model = CrossEncoder(self.model_name)
+
+    def ready(self) -> bool:
+        if self._model is None and self._loading is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(self._load))
+        return self._model is not None
+
+    async def apply(self, query, query_embedding, candidates, embeddings, relevance, top_k):
+        model = self._model
+        pairs = [(query, candidate["content"]) for candidate in candidates]
+        scores = []
+        for start in range(0, len(pairs), self.batch_size):
+            batch = pairs[start:start + self.batch_size]
+            scores.extend(await asyncio.to_thread(model.predict, batch))
+
+        for candidate, score in zip(candidates, scores):
+            candidate["rerank_score"] = float(score)
+        return [int(i) for i in np.argsort(-np.asarray(scores, dtype=np.float32))]
+
+
+class Reranker:
+    """Run rerank stages in order within a shared deadline"""
+
+    def __init__(self, stages: Sequence[RerankStage]):
+        self.stages = list(stages)
+
+    async def rerank(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        candidates: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        top_k: int,
+        deadline: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Reorder ``candidates`` (best first, with a fused ``score``) and cut to
+        ``top_k``. ``embeddings`` are the candidates' vectors, row-aligned, and
+        ``deadline`` is a ``time.monotonic()`` timestamp.
+        """
+        order = list(range(len(candidates)))
+        for stage in self.stages:
+            if len(order) <= 1:
+                break
+            if not stage.ready():
+                continue
+
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            expected_ms = stage.expected_ms(len(order))
+            if expected_ms > min(stage.budget_ms, remaining_ms):
+                logger.debug("Skipping rerank stage", stage=stage.name,
+                             expected_ms=round(expected_ms, 1), remaining_ms=round(remaining_ms, 1))
+                stage.skipped()
+                continue
+
+            current = [candidates[i] for i in order]
+            relevance = np.array([c.get("rerank_score", c["score"]) for c in current], dtype=np.float32)
+            spread = relevance.max() - relevance.min()
+            relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+
+            started = time.monotonic()
+            positions = await stage.apply(
+                query, query_embedding, current, embeddings[order], relevance, top_k
+            )
+            stage.record((time.monotonic() - started) * 1000, len(order))
+            order = [order[p] for p in positions]
+
+        return [candidates[i] for i in order[:top_k]]
@@ -5,35 +5,193 @@
 
 import os
 import json
+import time
+import hashlib
 import tempfile
-from typing import List, Dict, Any, Optional
+import uuid
+from collections import OrderedDict
+from functools import partial
+from typing import List, Dict, Any, AsyncIterable, Iterable, Optional, Set, Tuple, Union
 from datetime import datetime
-import chromadb
+import numpy as np
+import redis.asyncio as redis
+import structlog
+
+from app.core.cache import CacheNamespace, cache_manager
+from app.core.config import settings
+from app.services.bm25_index import BM25Index
+from app.services.context_packing import context_window, pack_context
+from app.services.document_parsing import PARSED_FILE_TYPES, chunk_text, stream_upload_chunks
+from app.services.embedding_cache import CachedEmbedder, EmbeddingCache
+from app.services.rag_catalog import RAGCatalog
+from app.services.rag_reindex import RAGReindexer
+from app.services.rag_rerank import CrossEncoderStage, MMRStage, Reranker
+from app.services.vector_collections import CollectionRouter
+from app.services.vector_index import HashingEmbeddingFunction, VectorIndexClient
+
+logger = structlog.get_logger()
+
+
+def content_hash(text: str) -> str:
+    """Stable SHA-256 hex digest of a chunk's text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cosine_similarity(a: Any, b: Any) -> float:
+    """Cosine similarity of two vectors"""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denominator if denominator else 0.0
+
+
+class _QueryEmbeddingCache:
+    """Small in-process LRU of recent query embeddings with a short TTL"""
+    
+    def __init__(self, ttl: int, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+    
+    def get(self, query: str) -> Optional[np.ndarray]:
+        entry = self._entries.get(query)
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if expires_at < time.monotonic():
+            del self._entries[query]
+            return None
+        self._entries.move_to_end(query)
+        return vector
+    
+    def set(self, query: str, vector: np.ndarray):
+        self._entries[query] = (time.monotonic() + self.ttl, vector)
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+async def _iterate(items: Union[Iterable[Any], AsyncIterable[Any]]):
+    """Iterate a sync or async iterable asynchronously"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _build_embedding_function(model: str):
+    """
+    Embedding function for the configured model (Chroma's default otherwise)
+    """
+    if model == "hashing":
+        return HashingEmbeddingFunction()
+    
+    from chromadb.utils import embedding_functions
+    
+    if model.startswith("text-embedding"):
+        return embedding_functions.OpenAIEmbeddingFunction(
+            api_key=settings.OPENAI_API_KEY,
+            model_name=model
+        )
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+def _build_reranker(stage_names: str) -> Reranker:
+    """
+    Rerank pipeline from a comma-separated list of stage names
+    """
+    stages = []
+    for name in filter(None, (n.strip() for n in stage_names.split(","))):
+        if name == "cross_encoder":
+            stages.append(CrossEncoderStage(
+                settings.RAG_CROSS_ENCODER_BUDGET_MS,
+                settings.RAG_CROSS_ENCODER_MODEL,
+                batch_size=settings.RAG_CROSS_ENCODER_BATCH_SIZE
+            ))
+        elif name == "mmr":
+            stages.append(MMRStage(settings.RAG_MMR_BUDGET_MS, lambda_mult=settings.RAG_MMR_LAMBDA))
+        else:
+            raise ValueError(f"Unknown rerank stage: {name}")
+    return Reranker(stages)
+
 
 class RAGService:
     def __init__(self):
-        # Initialize ChromaDB client with external container
-        chroma_host = os.getenv("CHROMA_HOST", "localhost")
-        chroma_port = os.getenv("CHROMA_PORT", "8000")
+        self.client = self._connect_vector_store()
+        
+        # Each user's chunks live in a hash-sharded or dedicated collection, so
+        # searches and deletes only touch that user's slice of the vectors
+        self.catalog = RAGCatalog()
+        self.collections = CollectionRouter(
+            self.client,
+            self.catalog,
+            prefix=settings.RAG_COLLECTION_PREFIX,
+            shard_count=settings.RAG_COLLECTION_SHARDS,
+            max_open=settings.RAG_MAX_OPEN_COLLECTIONS
+        )
+        
+        # Embeddings are computed here rather than inside Chroma so that
+        # unchanged chunk text is never embedded twice
+        cache = EmbeddingCache(
+            settings.RAG_EMBEDDING_MODEL,
+            disk_root=settings.RAG_EMBEDDING_CACHE_DIR,
+            redis_client=redis.from_url(settings.REDIS_URL) if settings.RAG_EMBEDDING_CACHE_REDIS else None,
+            redis_ttl=settings.RAG_EMBEDDING_CACHE_TTL
+        )
+        self.embedder = CachedEmbedder(
+            _build_embedding_function(settings.RAG_EMBEDDING_MODEL),
+            cache,
+            batch_size=settings.RAG_EMBEDDING_BATCH_SIZE
+        )
+        
+        self.keyword_index = BM25Index(
+            settings.RAG_KEYWORD_INDEX_DIR,
+            max_partitions=settings.RAG_KEYWORD_INDEX_MAX_PARTITIONS
+        )
+        self.query_embeddings = _QueryEmbeddingCache(settings.RAG_QUERY_EMBEDDING_TTL)
+        self.reranker = _build_reranker(settings.RAG_RERANK_STAGES)
+        self.reindexer = RAGReindexer(
+            self.catalog,
+            self.collections,
+            self.embedder,
+            on_swapped=self._bump_corpus_version,
+            page_size=settings.RAG_REINDEX_PAGE_SIZE,
+            chunks_per_second=settings.RAG_REINDEX_CHUNKS_PER_SECOND
+        )
+    
+    @staticmethod
+    def _connect_vector_store() -> Any:
+        """
+        ChromaDB client for the external container, or the embedded NumPy index
+        when configured (or, with ``RAG_VECTOR_FALLBACK``, when the container
+        is unreachable)
+        """
+        embedded = partial(
+            VectorIndexClient,
+            settings.RAG_VECTOR_INDEX_DIR,
+            dtype=settings.RAG_VECTOR_INDEX_DTYPE,
+            nlist=settings.RAG_VECTOR_INDEX_NLIST
+        )
+        if settings.RAG_VECTOR_BACKEND == "numpy":
+            return embedded()
         
         try:
-            self.client = chromadb.HttpClient(
-                host=chroma_host,
-                port=chroma_port
-            )
+            import chromadb
             
-            # Create or get collection
-            self.collection = self.client.get_or_create_collection(
-                name="codexos_documents",
-                metadata={"hnsw:space": "cosine"}
+            client = chromadb.HttpClient(
+                host=os.getenv("CHROMA_HOST", "localhost"),
+                port=os.getenv("CHROMA_PORT", "8000")
             )
+            client.heartbeat()
+            return client
         except Exception as e:
-            # Fallback to local client if external connection fails
-            self.client = chromadb.PersistentClient(path="./chroma_db")
-            self.collection = self.client.get_or_create_collection(
-                name="codexos_documents",
-                metadata={"hnsw:space": "cosine"}
-            )
+            if not settings.RAG_VECTOR_FALLBACK:
+                logger.error("ChromaDB unavailable", error=str(e))
+                raise
+            logger.warning("ChromaDB unavailable, using embedded vector index", error=str(e))
+            return embedded()
     
     async def ingest_documents(
         self, 
@@ -71,27 +229,26 @@ async def _ingest_single_source(
         metadata = source.get("metadata", {})
         
         # Add user_id to metadata
-        metadata["user_id"] = user_id
+        metadata["user_id"] = str(user_id)
         metadata["source_type"] = source_type
         metadata["ingested_at"] = datetime.utcnow().isoformat()
         
         if source_type == "text":
             content = source.get("content", "")
-            doc_id = f"text_{user_id}_{hash(content)}"
+            
+            # Documents are identified by caller-supplied ID or path so that
+            # re-ingesting an edited source updates it in place; anonymous
+            # text falls back to its own content hash.
+            doc_id = source.get("document_id") or f"text_{user_id}_{content_hash(path or content)[:16]}"
             
             # Simple chunking for demo
             chunks = self._chunk_text(content)
             
-            # Add to ChromaDB
-            self.collection.add(
-                documents=chunks,
-                metadatas=[{**metadata, "chunk_index": i} for i in range(len(chunks))],
-                ids=[f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
-            )
+            sync = await self._sync_document_chunks(doc_id, chunks, metadata, user_id)
             
             return {
                 "document_id": doc_id,
-                "chunks_created": len(chunks),
+                **sync,
                 "status": "success"
             }
         
@@ -100,14 +257,20 @@ async def _ingest_single_source(
     
     async def ingest_file(
         self,
-        file_content: bytes,
+        file: Any,
         filename: str,
         file_type: str,
         metadata: Optional[str],
         user_id: int
     ) -> Dict[str, Any]:
         """
-        Ingest a file
+        Ingest a file.
+        
+        ``file`` is read incrementally through its async ``read(size)`` (e.g.
+        FastAPI's ``UploadFile``). Text files are streamed, so memory use does
+        not grow with their size; PDF and JSON files are parsed whole in a
+        worker process. Uploads over ``RAG_INGEST_MAX_TEXT_BYTES`` or
+        ``RAG_INGEST_MAX_PARSED_BYTES`` raise ``UploadTooLarge``.
         """
         # Parse metadata if provided
         file_metadata = {}
@@ -120,31 +283,34 @@ async def ingest_file(
         file_metadata.update({
             "filename": filename,
             "file_type": file_type,
-            "user_id": user_id,
+            "user_id": str(user_id),
             "ingested_at": datetime.utcnow().isoformat()
         })
         
         # Process based on file type
-        if file_type in ["txt", "md"]:
-            content = file_content.decode('utf-8')
-            doc_id = f"file_{user_id}_{filename}"
+        if file_type in ["txt", "md"] or file_type in PARSED_FILE_TYPES:
+            # The filename identifies the document; chunk IDs come from content,
+            # so uploading a new revision only touches the chunks that changed.
+            doc_id = f"file_{user_id}_{content_hash(filename)[:16]}"
             
-            chunks = self._chunk_text(content)
-            
-            self.collection.add(
-                documents=chunks,
-                metadatas=[{**file_metadata, "chunk_index": i} for i in range(len(chunks))],
-                ids=[f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
+            chunks = stream_upload_chunks(
+                file,
+                file_type,
+                block_size=settings.RAG_INGEST_READ_SIZE,
+                parse_workers=settings.RAG_INGEST_PARSE_WORKERS,
+                max_bytes=settings.RAG_INGEST_MAX_TEXT_BYTES,
+                max_parsed_bytes=settings.RAG_INGEST_MAX_PARSED_BYTES
             )
             
+            sync = await self._sync_document_chunks(doc_id, chunks, file_metadata, user_id)
+            
             return {
                 "document_id": doc_id,
                 "filename": filename,
-                "chunks_created": len(chunks),
+                **sync,
                 "status": "success"
             }
         
-        # Add PDF processing, etc.
         raise ValueError(f"File type {file_type} processing not implemented")
     
     async def search(
@@ -153,136 +319,594 @@ async def search(
         top_k: int = 10,
         filter: Optional[Dict[str, Any]] = None,
         score_threshold: Optional[float] = None,
-        hybrid_alpha: Optional[float] = 0.5
+        hybrid_alpha: Optional[float] = 0.5,
+        fusion: str = "weighted",
+        rerank: bool = True
     ) -> Dict[str, Any]:
         """
-        Search documents
+        Search documents.
+        
+        ``hybrid_alpha`` weights the vector side (1.0 = pure vector, 0.0 = pure
+        BM25). ``fusion`` is either "weighted" (alpha-blended similarity and
+        max-normalised BM25 score) or "rrf" (alpha-weighted reciprocal rank
+        fusion). The ``user_id`` filter is required: it selects the user's
+        vector collection and keyword index partition.
+        
+        With ``rerank`` the vector and keyword sides each fetch a larger
+        candidate pool which the configured rerank stages (cross-encoder, MMR)
+        cut down to ``top_k`` within ``RAG_RERANK_DEADLINE_MS``.
+        
+        Results are cached per user, keyed by every search parameter plus the
+        user's corpus version, which is bumped whenever their documents change.
         """
-        import time
         start_time = time.time()
         
-        # Query ChromaDB
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k,
-            where=filter
+        user_key = (filter or {}).get("user_id")
+        if user_key is None:
+            raise ValueError("Search requires a user_id filter")
+        
+        where = self._where(**filter)
+        alpha = 1.0 if hybrid_alpha is None else min(max(hybrid_alpha, 0.0), 1.0)
+        
+        version = await cache_manager.get(CacheNamespace.RAG, f"version:{user_key}") or 0
+        params = json.dumps(
+            [query, filter, top_k, score_threshold, alpha, fusion, rerank],
+            sort_keys=True,
+            default=str
         )
+        cache_key = f"search:{user_key}:{version}:{content_hash(params)}"
+        cached = await cache_manager.get(CacheNamespace.RAG, cache_key)
+        if cached is not None:
+            return {**cached, "processing_time": int((time.time() - start_time) * 1000)}
+        
+        deadline = time.monotonic() + settings.RAG_RERANK_DEADLINE_MS / 1000
+        rerank = rerank and bool(self.reranker.stages)
+        fetch_k = top_k * settings.RAG_RERANK_CANDIDATE_FACTOR if rerank else top_k
+        
+        collection = await self.collections.collection_for(user_key)
+        query_embedding = await self._embed_query(query)
+        
+        candidates: Dict[str, Dict[str, Any]] = {}
+        embeddings: Dict[str, Any] = {}
+        vector_ranked: List[str] = []
+        keyword_scores: Dict[str, float] = {}
+        
+        if alpha > 0:
+            # Query ChromaDB
+            results = collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=fetch_k,
+                where=where,
+                include=["documents", "metadatas", "distances"] + (["embeddings"] if rerank else [])
+            )
+            for i, chunk_id in enumerate(results['ids'][0]):
+                candidates[chunk_id] = {
+                    "chunk_id": chunk_id,
+                    "content": results['documents'][0][i],
+                    "metadata": results['metadatas'][0][i],
+                    "vector_score": 1 - results['distances'][0][i]  # Convert distance to similarity
+                }
+                if rerank:
+                    embeddings[chunk_id] = results['embeddings'][0][i]
+                vector_ranked.append(chunk_id)
+        
+        if alpha < 1:
+            keyword_scores = dict(self.keyword_index.search(str(user_key), query, fetch_k))
+            
+            # Keyword-only hits still need their text, metadata and a vector
+            # score; fetching them through the filter also enforces it
+            missing = [chunk_id for chunk_id in keyword_scores if chunk_id not in candidates]
+            if missing:
+                extra = collection.get(
+                    ids=missing,
+                    where=where,
+                    include=["documents", "metadatas", "embeddings"]
+                )
+                for chunk_id, document, metadata, embedding in zip(
+                    extra['ids'], extra['documents'], extra['metadatas'], extra['embeddings']
+                ):
+                    candidates[chunk_id] = {
+                        "chunk_id": chunk_id,
+                        "content": document,
+                        "metadata": metadata,
+                        "vector_score": _cosine_similarity(query_embedding, embedding)
+                    }
+                    embeddings[chunk_id] = embedding
+            keyword_scores = {c: s for c, s in keyword_scores.items() if c in candidates}
+        
+        scores = self._fuse_scores(candidates, vector_ranked, keyword_scores, alpha, fusion)
         
         # Format results
         search_results = []
-        for i in range(len(results['ids'][0])):
-            score = 1 - results['distances'][0][i]  # Convert distance to similarity
-            
+        for chunk_id in sorted(scores, key=scores.get, reverse=True):
+            score = scores[chunk_id]
             if score_threshold and score < score_threshold:
                 continue
             
             search_results.append({
-                "chunk_id": results['ids'][0][i],
-                "content": results['documents'][0][i],
-                "metadata": results['metadatas'][0][i],
+                **candidates[chunk_id],
+                "keyword_score": keyword_scores.get(chunk_id, 0.0),
                 "score": score
             })
+            if len(search_results) == fetch_k:
+                break
+        
+        if rerank and len(search_results) > 1:
+            search_results = await self.reranker.rerank(
+                query,
+                query_embedding,
+                search_results,
+                np.asarray([embeddings[r["chunk_id"]] for r in search_results], dtype=np.float32),
+                top_k,
+                deadline
+            )
+        search_results = search_results[:top_k]
         
         processing_time = int((time.time() - start_time) * 1000)
         
-        return {
+        response = {
             "results": search_results,
             "total_results": len(search_results),
             "query": query,
             "processing_time": processing_time
         }
+        
+        await cache_manager.set(
+            CacheNamespace.RAG, cache_key, response, ttl=settings.RAG_SEARCH_CACHE_TTL
+        )
+        
+        return response
+    
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a search query, reusing recent embeddings of the same text
+        """
+        vector = self.query_embeddings.get(query)
+        if vector is None:
+            vector = (await self.embedder.embed_uncached([query]))[0]
+            self.query_embeddings.set(query, vector)
+        return vector
+    
+    async def _bump_corpus_version(self, user_id: Any):
+        """
+        Invalidate a user's cached search results
+        """
+        await cache_manager.incr(CacheNamespace.RAG, f"version:{user_id}")
+    
+    @staticmethod
+    def _fuse_scores(
+        candidates: Dict[str, Dict[str, Any]],
+        vector_ranked: List[str],
+        keyword_scores: Dict[str, float],
+        alpha: float,
+        fusion: str,
+        rrf_k: int = 60
+    ) -> Dict[str, float]:
+        """
+        Combine vector and keyword evidence into one score per candidate
+        """
+        if fusion == "rrf":
+            vector_rank = {chunk_id: rank for rank, chunk_id in enumerate(vector_ranked, 1)}
+            keyword_ranked = sorted(keyword_scores, key=keyword_scores.get, reverse=True)
+            keyword_rank = {chunk_id: rank for rank, chunk_id in enumerate(keyword_ranked, 1)}
+            return {
+                chunk_id: (
+                    (alpha / (rrf_k + vector_rank[chunk_id]) if chunk_id in vector_rank else 0.0)
+                    + ((1 - alpha) / (rrf_k + keyword_rank[chunk_id]) if chunk_id in keyword_rank else 0.0)
+                )
+                for chunk_id in candidates
+            }
+        
+        if fusion != "weighted":
+            raise ValueError(f"Unsupported fusion method: {fusion}")
+        
+        max_keyword = max(keyword_scores.values(), default=0.0) or 1.0
+        return {
+            chunk_id: (
+                alpha * candidate["vector_score"]
+                + (1 - alpha) * keyword_scores.get(chunk_id, 0.0) / max_keyword
+            )
+            for chunk_id, candidate in candidates.items()
+        }
     
     async def get_stats(self, user_id: int) -> Dict[str, Any]:
         """
         Get RAG statistics for a user
         """
-        # Get user documents count
-        user_docs = self.collection.get(
-            where={"user_id": user_id}
-        )
+        stats = await self.catalog.get_stats(user_id)
         
         return {
-            "total_documents": len(set(doc['metadatas'][0].get('document_id', '') 
-                                     for doc in user_docs if doc)),
-            "total_chunks": len(user_docs['ids']),
-            "total_embeddings": len(user_docs['ids']),
+            "total_documents": stats["total_documents"],
+            "total_chunks": stats["total_chunks"],
+            "total_embeddings": stats["total_chunks"],
+            "total_tokens": stats["total_tokens"],
             "index_size": 0,  # ChromaDB doesn't expose this
-            "last_updated": datetime.utcnow().isoformat()
+            "last_updated": stats["last_updated"].isoformat() if stats["last_updated"] else ""
         }
     
     async def delete_document(self, document_id: str, user_id: int):
         """
         Delete a document
         """
+        collection = await self.collections.collection_for(user_id)
+        where = self._where(document_id=document_id, user_id=str(user_id))
+        chunk_ids = collection.get(where=where, include=[])['ids']
+        
         # Delete all chunks for this document
-        self.collection.delete(
-            where={
-                "document_id": document_id,
-                "user_id": user_id
-            }
-        )
+        collection.delete(where=where)
+        
+        self.keyword_index.remove(str(user_id), chunk_ids)
+        self.keyword_index.flush(str(user_id))
+        await self.catalog.delete_document(user_id, document_id)
+        await self._bump_corpus_version(user_id)
     
     async def clear_user_documents(self, user_id: int):
         """
         Clear all documents for a user
         """
-        self.collection.delete(
-            where={"user_id": user_id}
+        collection = await self.collections.collection_for(user_id)
+        collection.delete(
+            where={"user_id": str(user_id)}
+        )
+        self.keyword_index.drop(str(user_id))
+        await self.catalog.clear_user(user_id)
+        await self._bump_corpus_version(user_id)
+    
+    async def list_sources(
+        self,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        List document sources for a user, newest first
+        """
+        return await self.catalog.list_documents(user_id, skip=skip, limit=limit)
+    
+    async def reindex_user_documents(self, user_id: int) -> Dict[str, Any]:
+        """
+        Start (or resume) re-embedding all documents for a user into a shadow
+        collection; returns the job's progress record
+        """
+        return await self.reindexer.start(user_id)
+    
+    async def get_reindex_status(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Progress of a user's latest reindex job
+        """
+        return await self.reindexer.get_status(user_id)
+    
+    async def get_chunks_by_ids(self, chunk_ids: List[str], user_id: int) -> List[Dict[str, Any]]:
+        """
+        Fetch a user's chunks by ID, in the requested order; IDs that are not
+        the user's are left out
+        """
+        user_key = str(user_id)
+        collection = await self.collections.collection_for(user_key)
+        found = collection.get(
+            ids=list(chunk_ids),
+            where={"user_id": user_key},
+            include=["documents", "metadatas", "embeddings"]
         )
+        chunks = {
+            chunk_id: {"id": chunk_id, "content": document, "metadata": metadata, "embedding": embedding}
+            for chunk_id, document, metadata, embedding in zip(
+                found['ids'], found['documents'], found['metadatas'], found['embeddings']
+            )
+        }
+        return [chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in chunks]
     
-    async def list_sources(self, user_id: int) -> List[Dict[str, Any]]:
+    async def save_context_basket(
+        self,
+        user_id: int,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        agent_id: Optional[str] = None,
+        custom_prompts: Optional[Dict[str, str]] = None,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
-        List all document sources for a user
+        Pack selected chunks into a context for ``model`` and cache it under a
+        new ``context_id``.
+        
+        The budget is the model's context window less
+        ``RAG_CONTEXT_RESERVE_TOKENS`` (or ``max_tokens`` if smaller). Chunks
+        are ranked by similarity to ``query`` and packed by
+        ``context_packing.pack_context``.
         """
-        results = self.collection.get(
-            where={"user_id": user_id}
+        model = model or settings.RAG_CONTEXT_DEFAULT_MODEL
+        budget = max(context_window(model) - settings.RAG_CONTEXT_RESERVE_TOKENS, 0)
+        if max_tokens is not None:
+            budget = min(budget, max_tokens)
+        
+        query_embedding = await self._embed_query(query)
+        ranked = [
+            {**chunk, "relevance": _cosine_similarity(query_embedding, chunk["embedding"])}
+            for chunk in chunks
+        ]
+        
+        packed = pack_context(ranked, budget, model=model, custom_prompts=custom_prompts)
+        context_id = uuid.uuid4().hex
+        basket = {
+            **packed,
+            "context_id": context_id,
+            "user_id": str(user_id),
+            "agent_id": agent_id,
+            "query": query,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        await cache_manager.set(
+            CacheNamespace.RAG, f"context:{context_id}", basket, ttl=settings.RAG_CONTEXT_TTL
         )
+        return basket
+    
+    async def get_context_basket(self, context_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Packed context saved by ``save_context_basket``, if it is the user's
+        and has not expired
+        """
+        basket = await cache_manager.get(CacheNamespace.RAG, f"context:{context_id}")
+        if basket is None or basket["user_id"] != str(user_id):
+            return None
+        return basket
+    
+    async def migrate_legacy_collection(
+        self,
+        name: str = "codexos_documents",
+        batch_size: int = 500,
+        drop: bool = False
+    ) -> Dict[str, int]:
+        """
+        Move chunks from the old single shared collection into the routed
+        per-user collections.
         
-        # Extract unique sources
-        sources = {}
-        for i, metadata in enumerate(results['metadatas']):
-            doc_id = metadata.get('document_id', f"unknown_{i}")
-            if doc_id not in sources:
-                sources[doc_id] = {
-                    "document_id": doc_id,
-                    "filename": metadata.get('filename'),
-                    "source_type": metadata.get('source_type'),
-                    "ingested_at": metadata.get('ingested_at'),
-                    "chunk_count": 0
-                }
-            sources[doc_id]['chunk_count'] += 1
+        Stored embeddings are copied as-is, so this assumes the legacy
+        collection was embedded with ``RAG_EMBEDDING_MODEL``.
+        """
+        try:
+            legacy = self.client.get_collection(name)
+        except Exception:
+            return {"chunks_moved": 0, "users": 0}
+        
+        moved = 0
+        users = set()
+        offset = 0
+        while True:
+            page = legacy.get(
+                limit=batch_size,
+                offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            
+            by_user: Dict[str, Dict[str, list]] = {}
+            for chunk_id, document, metadata, embedding in zip(
+                page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+            ):
+                user_key = (metadata or {}).get("user_id")
+                if user_key is None:
+                    continue
+                batch = by_user.setdefault(
+                    user_key, {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+                )
+                batch["ids"].append(chunk_id)
+                batch["documents"].append(document)
+                batch["metadatas"].append(metadata)
+                batch["embeddings"].append(embedding)
+            
+            for user_key, batch in by_user.items():
+                collection = await self.collections.collection_for(user_key)
+                collection.upsert(**batch)
+                moved += len(batch["ids"])
+                users.add(user_key)
+        
+        for user_key in users:
+            await self._bump_corpus_version(user_key)
+        
+        if drop:
+            self.client.delete_collection(name)
         
-        return list(sources.values())
+        logger.info("Migrated legacy collection", collection=name, chunks_moved=moved, users=len(users))
+        return {"chunks_moved": moved, "users": len(users)}
     
-    async def reindex_user_documents(self, user_id: int):
+    async def promote_large_users(
+        self,
+        min_chunks: Optional[int] = None,
+        dry_run: bool = False
+    ) -> List[Dict[str, Any]]:
         """
-        Reindex all documents for a user
+        Give every user with at least ``min_chunks`` chunks a dedicated
+        collection, moving their chunks out of the shared shard.
+        
+        Run during low write traffic: chunks ingested into the old collection
+        while a user is being moved are only restored by re-ingesting.
         """
-        # In a real implementation, this would:
-        # 1. Get all documents
-        # 2. Regenerate embeddings
-        # 3. Update in vector store
-        pass
+        min_chunks = min_chunks or settings.RAG_DEDICATED_COLLECTION_MIN_CHUNKS
+        if not dry_run:
+            await self.collections.purge_retired()
+        
+        results = []
+        for user_id, chunk_count in await self.catalog.get_users_over(min_chunks):
+            target = self.collections.dedicated_name(str(user_id))
+            if await self.collections.resolve(user_id) == target:
+                continue
+            
+            if dry_run:
+                results.append({"user_id": str(user_id), "chunks": chunk_count, "target": target})
+                continue
+            
+            result = await self.collections.migrate_user(user_id, target)
+            await self._bump_corpus_version(user_id)
+            results.append({**result, "chunks": chunk_count})
+        
+        return results
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
+    async def _sync_document_chunks(
+        self,
+        doc_id: str,
+        chunks: Union[Iterable[str], AsyncIterable[str]],
+        metadata: Dict[str, Any],
+        user_id: int
+    ) -> Dict[str, int]:
         """
-        Simple text chunking
+        Bring a document's stored chunks in line with a freshly chunked version.
+        
+        Chunk IDs are derived from the user, the document ID and the SHA-256 of
+        the chunk text, so unchanged chunks keep their IDs (and embeddings)
+        across re-ingestion while users sharing a collection never collide.
+        Only new chunks are upserted, and their embeddings come from the
+        embedding cache when the same text was seen before; chunks that merely
+        moved get their position updated and chunks that disappeared are
+        deleted.
+        
+        ``chunks`` may be a lazy (async) iterable; it is consumed in batches of
+        ``RAG_INGEST_BATCH_SIZE`` so only chunk IDs, never the text, are held
+        for the whole document.
         """
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
+        collection = await self.collections.collection_for(user_id)
+        manifest = self._get_document_manifest(collection, doc_id, user_id)
+        catalog_id, sync_started = await self.catalog.begin_document(user_id, doc_id, metadata)
         
-        for word in words:
-            current_chunk.append(word)
-            current_size += len(word) + 1
+        # Metadata keeps the caller's ID; every lookup also filters on user_id
+        base_metadata = {**metadata, "document_id": doc_id}
+        stored_id = self._stored_document_id(user_id, doc_id)
+        seen: Set[str] = set()
+        created = moved = 0
+        
+        # Ordered, de-duplicated view of the new revision, one batch at a time
+        batch: Dict[str, Tuple[int, str, str]] = {}
+        async for text in _iterate(chunks):
+            chunk_hash = content_hash(text)
+            chunk_id = f"{stored_id}_{chunk_hash[:32]}"
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            batch[chunk_id] = (len(seen) - 1, text, chunk_hash)
             
-            if current_size >= chunk_size:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-                current_size = 0
+            if len(batch) >= settings.RAG_INGEST_BATCH_SIZE:
+                batch_created, batch_moved = await self._write_chunk_batch(
+                    collection, catalog_id, batch, manifest, base_metadata, user_id
+                )
+                created += batch_created
+                moved += batch_moved
+                batch = {}
         
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+        if batch:
+            batch_created, batch_moved = await self._write_chunk_batch(
+                collection, catalog_id, batch, manifest, base_metadata, user_id
+            )
+            created += batch_created
+            moved += batch_moved
+        
+        stale_ids = [chunk_id for chunk_id in manifest if chunk_id not in seen]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        
+        user_key = str(user_id)
+        self.keyword_index.remove(user_key, stale_ids)
+        self.keyword_index.flush(user_key)
         
-        return chunks
+        # Stats and listings are served from the SQL catalog
+        await self.catalog.finish_document(catalog_id, sync_started)
+        
+        if created or moved or stale_ids:
+            await self._bump_corpus_version(user_id)
+        
+        return {
+            "chunks_created": created,
+            "chunks_unchanged": len(seen) - created,
+            "chunks_deleted": len(stale_ids),
+            "total_chunks": len(seen)
+        }
+    
+    async def _write_chunk_batch(
+        self,
+        collection: Any,
+        catalog_id: Any,
+        batch: Dict[str, Tuple[int, str, str]],
+        manifest: Dict[str, int],
+        base_metadata: Dict[str, Any],
+        user_id: int
+    ) -> Tuple[int, int]:
+        """
+        Store one batch of chunks in the vector store, keyword index and
+        catalog; returns the number of created and moved chunks
+        """
+        added_ids, added_docs, added_metas = [], [], []
+        moved_ids, moved_metas = [], []
+        for chunk_id, (index, text, chunk_hash) in batch.items():
+            chunk_metadata = {**base_metadata, "chunk_index": index, "content_hash": chunk_hash}
+            if chunk_id not in manifest:
+                added_ids.append(chunk_id)
+                added_docs.append(text)
+                added_metas.append(chunk_metadata)
+            elif manifest[chunk_id] != index:
+                moved_ids.append(chunk_id)
+                moved_metas.append(chunk_metadata)
+        
+        if added_ids:
+            embeddings = await self.embedder.embed(
+                added_docs,
+                [m["content_hash"] for m in added_metas]
+            )
+            collection.upsert(
+                ids=added_ids,
+                documents=added_docs,
+                metadatas=added_metas,
+                embeddings=embeddings.tolist()
+            )
+        if moved_ids:
+            collection.update(ids=moved_ids, metadatas=moved_metas)
+        
+        # Keep the BM25 partition in step with the vector store
+        self.keyword_index.add(str(user_id), zip(added_ids, added_docs))
+        await self.catalog.sync_chunk_batch(catalog_id, batch)
+        
+        return len(added_ids), len(moved_ids)
+    
+    def _get_document_manifest(
+        self,
+        collection: Any,
+        doc_id: str,
+        user_id: int,
+        page_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Current chunk ID -> chunk index map for a stored document
+        """
+        where = self._where(document_id=doc_id, user_id=str(user_id))
+        manifest = {}
+        offset = 0
+        while True:
+            page = collection.get(where=where, include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return manifest
+            for chunk_id, chunk_metadata in zip(page["ids"], page["metadatas"]):
+                manifest[chunk_id] = (chunk_metadata or {}).get("chunk_index")
+            offset += len(page["ids"])
+    
+    @staticmethod
+    def _stored_document_id(user_id: int, doc_id: str) -> str:
+        """
+        Vector store ID prefix of a document. Document IDs are chosen by the
+        caller and only unique per user, while collections may be shared.
+        """
+        return f"doc_{user_id}_{doc_id}"
+    
+    @staticmethod
+    def _where(**conditions: Any) -> Dict[str, Any]:
+        """
+        Build a Chroma metadata filter (multiple keys must be wrapped in $and)
+        """
+        if len(conditions) == 1:
+            return dict(conditions)
+        return {"$and": [{key: value} for key, value in conditions.items()]}
+    
+    def _chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
+        """
+        Simple text chunking
+        """
+        return chunk_text(text, chunk_size)
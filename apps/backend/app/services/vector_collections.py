@@ -0,0 +1,248 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Routing of users to sharded vector store collections
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+import structlog
+
+from app.core.cache import CacheNamespace, cache_manager
+from app.core.local_cache import LocalCache
+from app.services.rag_catalog import RAGCatalog
+
+logger = structlog.get_logger()
+
+# Extra time a retired collection is kept past ``assignment_ttl``, covering
+# lookups that were in flight during the switch and clock skew between hosts
+_RETIRE_MARGIN_SECONDS = 30
+
+
+class CollectionRouter:
+    """
+    Maps each user to the vector store collection holding their chunks.
+
+    Small users share one of ``shard_count`` collections picked by a hash of
+    the user ID; users promoted by ``migrate_user`` get a dedicated collection,
+    recorded in the catalog. Collection handles are opened lazily and kept in
+    an LRU of at most ``max_open`` entries, and resolved assignments are cached
+    for ``assignment_ttl`` seconds so searches skip the catalog lookup.
+
+    Moving a user publishes an invalidation so other workers drop their cached
+    assignment right away; the collection they left is only retired, and its
+    chunks are deleted once the cached assignments have expired everywhere.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        catalog: RAGCatalog,
+        prefix: str = "codexos_documents",
+        shard_count: int = 16,
+        max_open: int = 256,
+        assignment_ttl: int = 60,
+        max_assignments: int = 100000
+    ):
+        self.client = client
+        self.catalog = catalog
+        self.prefix = prefix
+        self.shard_count = shard_count
+        self.max_open = max_open
+        self.assignment_ttl = assignment_ttl
+        self._open: "OrderedDict[str, Any]" = OrderedDict()
+        self._assignments = LocalCache(max_entries=max_assignments, ttl=assignment_ttl)
+        cache_manager.register_sync_memo(CacheNamespace.RAG_ASSIGNMENTS, self._assignments)
+        self._purges: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _digest(user_key: str) -> str:
+        return hashlib.sha256(user_key.encode("utf-8")).hexdigest()
+
+    def shard_name(self, user_key: str) -> str:
+        """Shared collection for a user without a dedicated one"""
+        return f"{self.prefix}_shard_{int(self._digest(user_key)[:8], 16) % self.shard_count:03d}"
+
+    def dedicated_name(self, user_key: str) -> str:
+        """Name of a user's dedicated collection"""
+        return f"{self.prefix}_user_{self._digest(user_key)[:24]}"
+
+    def shadow_name(self, user_key: str, job_id: str) -> str:
+        """Name of a dedicated collection being built by a reindex job"""
+        return f"{self.dedicated_name(user_key)}_r{job_id[:8]}"
+
+    def open(self, name: str) -> Any:
+        """Collection handle by name, opened on first use"""
+        collection = self._open.get(name)
+        if collection is None:
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"}
+            )
+            self._open[name] = collection
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        else:
+            self._open.move_to_end(name)
+        return collection
+
+    def drop(self, name: str):
+        """Delete a whole collection"""
+        self._open.pop(name, None)
+        try:
+            self.client.delete_collection(name)
+        except ValueError:
+            pass  # Already dropped
+
+    def is_dedicated(self, user_key: str, name: str) -> bool:
+        """Whether ``name`` is one of the user's own collections rather than a shard"""
+        return name.startswith(self.dedicated_name(user_key))
+
+    async def resolve(self, user_id: Any) -> str:
+        """Collection name currently assigned to a user"""
+        user_key = str(user_id)
+        cached = self._assignments.get(user_key)
+        if cached is not None:
+            return cached
+
+        epoch = self._assignments.epoch
+        name = await self.catalog.get_collection_assignment(user_id) or self.shard_name(user_key)
+        self._assignments.set(user_key, name, epoch=epoch)
+        return name
+
+    async def collection_for(self, user_id: Any) -> Any:
+        """Collection handle holding a user's chunks"""
+        return self.open(await self.resolve(user_id))
+
+    async def migrate_user(
+        self,
+        user_id: Any,
+        target: Optional[str] = None,
+        batch_size: int = 500
+    ) -> Dict[str, Any]:
+        """
+        Move a user's chunks into another collection (their dedicated one by
+        default).
+
+        Chunks are copied with their embeddings before the assignment is
+        switched, and the originals are deleted only after every worker has
+        dropped the old assignment (see ``swap``), so searches keep finding
+        the data throughout. Chunks a worker still routed to the old collection
+        ingests during the switch are not copied; re-ingest to restore them.
+        """
+        user_key = str(user_id)
+        source_name = await self.resolve(user_id)
+        target_name = target or self.dedicated_name(user_key)
+        if source_name == target_name:
+            return {"user_id": user_key, "source": source_name, "target": target_name, "chunks_moved": 0}
+
+        moved = self.copy_chunks(
+            self.open(source_name),
+            self.open(target_name),
+            where={"user_id": user_key},
+            batch_size=batch_size
+        )
+
+        await self.swap(user_id, target_name)
+
+        logger.info("Migrated user collection", user_id=user_key, source=source_name,
+                    target=target_name, chunks_moved=moved)
+        return {"user_id": user_key, "source": source_name, "target": target_name, "chunks_moved": moved}
+
+    async def swap(self, user_id: Any, target_name: str):
+        """
+        Point a user at ``target_name`` and retire the collection they used
+        before.
+
+        The switch is published to the other workers, and the user's chunks
+        in the retired collection (the whole collection if it was theirs
+        alone) are deleted ``assignment_ttl`` plus a margin later, when no
+        worker can still be routing the user there. A pending retirement of
+        an earlier move is completed first.
+        """
+        user_key = str(user_id)
+        await self.purge_retired(user_id, wait=True)
+        source_name = await self.resolve(user_id)
+        if source_name == target_name:
+            return
+
+        retired_until = datetime.now(timezone.utc) + timedelta(
+            seconds=self.assignment_ttl + _RETIRE_MARGIN_SECONDS
+        )
+        await self.catalog.set_collection_assignment(
+            user_id, target_name, retired_collection=source_name, retired_until=retired_until
+        )
+        await cache_manager.clear_namespace(CacheNamespace.RAG_ASSIGNMENTS)
+        self._assignments.set(user_key, target_name)
+
+        task = asyncio.create_task(self._purge_later(user_id, retired_until))
+        self._purges.add(task)
+        task.add_done_callback(self._purges.discard)
+
+    async def _purge_later(self, user_id: Any, due: datetime):
+        await asyncio.sleep(max((due - datetime.now(timezone.utc)).total_seconds(), 0))
+        try:
+            await self.purge_retired(user_id)
+        except Exception as e:
+            # The retirement stays in the catalog for the next purge
+            logger.error("Retired collection purge failed", user_id=str(user_id), error=str(e))
+
+    async def purge_retired(self, user_id: Any = None, wait: bool = False) -> int:
+        """
+        Delete chunks left in retired collections whose grace period is over
+        (of one user, or everyone); with ``wait``, retirements still in their
+        grace period are waited out instead of skipped. Returns the number of
+        collections cleaned up.
+        """
+        purged = 0
+        for owner, current, retired, retired_until in await self.catalog.get_retired_collections(user_id):
+            remaining = (retired_until - datetime.now(timezone.utc)).total_seconds()
+            if remaining > 0:
+                if not wait:
+                    continue
+                await asyncio.sleep(remaining)
+
+            # A user who moved back into their old collection keeps it
+            if retired != current:
+                owner_key = str(owner)
+                if self.is_dedicated(owner_key, retired):
+                    self.drop(retired)
+                else:
+                    self.open(retired).delete(where={"user_id": owner_key})
+
+            await self.catalog.clear_retired_collection(owner, retired)
+            purged += 1
+            logger.info("Purged retired collection", user_id=str(owner), collection=retired)
+        return purged
+
+    @staticmethod
+    def copy_chunks(
+        source: Any,
+        target: Any,
+        where: Optional[Dict[str, Any]] = None,
+        batch_size: int = 500
+    ) -> int:
+        """Copy chunks (with embeddings) between collections in pages"""
+        copied = 0
+        offset = 0
+        while True:
+            page = source.get(
+                where=where,
+                limit=batch_size,
+                offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            if not page["ids"]:
+                return copied
+
+            target.upsert(
+                ids=page["ids"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+                embeddings=page["embeddings"]
+            )
+            copied += len(page["ids"])
+            offset += len(page["ids"])
@@ -0,0 +1,658 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Embedded NumPy vector index with a Chroma-compatible client interface
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.bm25_index import tokenize
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,62}$")
+
+# Rows scored per matrix product, bounding the float32 working set
+_BLOCK_ROWS = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HashingEmbeddingFunction:
+    """
+    Dependency-free embedding function that feature-hashes tokens into a fixed
+    number of signed buckets. Meant for offline, CI and benchmark deployments
+    where downloading an embedding model is not an option.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        vectors = np.zeros((len(input), self.dim), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in tokenize(text):
+                h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, h % self.dim] += 1.0 if h >> 63 else -1.0
+        return _normalize(vectors).tolist()
+
+
+@contextmanager
+def _locked(path: str, exclusive: bool):
+    """Lock a collection directory against the other processes"""
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class VectorIndexCollection:
+    """
+    One collection of the embedded index, shared by the worker processes of a
+    host.
+
+    Vectors are stored L2-normalised (float32 or float16) so cosine top-k is a
+    blocked matrix product followed by ``argpartition``. With ``nlist`` set,
+    rows are additionally bucketed by a spherical k-means (IVF) once the
+    collection is large enough, and queries only score the ``nprobe`` closest
+    buckets.
+
+    State is persisted as immutable snapshot directories plus an append-only
+    change log in the current one. A write appends one record, so its cost
+    follows the change, not the collection; a new snapshot is written only
+    once the log outgrows the snapshot. ``CURRENT`` names the live snapshot
+    and is swapped with ``os.replace``, so a crash mid-write leaves the
+    previous one intact. Writes hold an exclusive ``flock``, reads a shared
+    one, and both first replay records other processes appended, or reload
+    if the snapshot was replaced. Snapshot vectors are opened memory-mapped
+    (copy-on-write).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        dtype: str = "float32",
+        nlist: int = 0,
+        nprobe: int = 8,
+        compact_min_bytes: int = 4 * 1024 * 1024
+    ):
+        self.path = path
+        self.name = name
+        self.metadata = metadata or {}
+        self.dtype = np.dtype(dtype)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.compact_min_bytes = compact_min_bytes
+
+        # What has been read from disk: the snapshot (name and inode), its
+        # size and how far into its change log
+        self._snapshot: Optional[Tuple[str, int]] = None
+        self._snapshot_bytes = 0
+        self._log_offset = 0
+        self._generation = 0
+        self._reset()
+        with _locked(self.path, exclusive=False):
+            self._sync()
+
+    def _reset(self):
+        self._ids: List[Optional[str]] = []
+        self._row: Dict[str, int] = {}
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._lists: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        self._live: Optional[np.ndarray] = None
+
+    # Persistence
+
+    @property
+    def _current_path(self) -> str:
+        return os.path.join(self.path, "CURRENT")
+
+    def _log_path(self) -> str:
+        return os.path.join(self.path, self._snapshot[0], "changes.log")
+
+    def _current_snapshot(self) -> Optional[Tuple[str, int]]:
+        """Name and inode of the live snapshot, None if there is none"""
+        try:
+            with open(self._current_path) as f:
+                snapshot = f.read().strip()
+            return snapshot, os.stat(os.path.join(self.path, snapshot)).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _sync(self):
+        """Catch up with the files; call under the collection lock"""
+        snapshot = self._current_snapshot()
+        if snapshot != self._snapshot:
+            # Replaced, compacted or dropped elsewhere: start over from the files
+            self._reset()
+            self._snapshot, self._log_offset = snapshot, 0
+            if snapshot is not None:
+                self._load(snapshot[0])
+
+        if snapshot is None:
+            return
+        try:
+            with open(self._log_path(), "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        position = 0
+        while True:
+            # Each record is a JSON header line followed by its raw vectors
+            newline = data.find(b"\n", position)
+            if newline < 0:
+                break
+            change = json.loads(data[position:newline])
+            end = newline + 1 + change.get("vector_bytes", 0)
+            if end > len(data):
+                break  # Torn by a crashed writer; the next write truncates it
+            vectors = None
+            if "dim" in change:
+                vectors = np.frombuffer(
+                    data[newline + 1:end], dtype=change["dtype"]
+                ).reshape(-1, change["dim"]).astype(np.float32)
+            self._apply(change, vectors)
+            position = end
+        self._log_offset += position
+
+    def _load(self, snapshot: str):
+        snapshot_path = os.path.join(self.path, snapshot)
+        self._generation = int(snapshot.split("-")[1])
+        self._snapshot_bytes = sum(entry.stat().st_size for entry in os.scandir(snapshot_path))
+
+        with open(os.path.join(snapshot_path, "meta.json")) as f:
+            meta = json.load(f)
+        self.metadata = meta["metadata"]
+        self.dtype = np.dtype(meta["dtype"])
+
+        with open(os.path.join(snapshot_path, "records.json")) as f:
+            records = json.load(f)
+        self._ids = records["ids"]
+        self._documents = records["documents"]
+        self._metadatas = records["metadatas"]
+        self._row = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+
+        if self._ids:
+            self._vectors = np.load(os.path.join(snapshot_path, "vectors.npy"), mmap_mode="c")
+
+        ivf_path = os.path.join(snapshot_path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                self._centroids = ivf["centroids"]
+                self._lists = ivf["lists"]
+                self._trained_size = int(ivf["trained_size"])
+
+    def flush(self):
+        """Fold the change log into a new snapshot"""
+        with _locked(self.path, exclusive=True):
+            self._sync()
+            self._save()
+
+    def _save(self):
+        """Write a new snapshot and make it current; call under the exclusive lock"""
+        self._compact()
+        self._generation += 1
+        snapshot = f"snap-{self._generation:08d}"
+        tmp_path = os.path.join(self.path, f"{snapshot}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({"name": self.name, "metadata": self.metadata, "dtype": self.dtype.name}, f)
+        with open(os.path.join(tmp_path, "records.json"), "w") as f:
+            json.dump({"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}, f)
+        if self._vectors is not None:
+            np.save(os.path.join(tmp_path, "vectors.npy"), self._vectors[:len(self._ids)])
+        if self._centroids is not None:
+            np.savez(
+                os.path.join(tmp_path, "ivf.npz"),
+                centroids=self._centroids,
+                lists=self._lists[:len(self._ids)],
+                trained_size=self._trained_size
+            )
+
+        os.replace(tmp_path, os.path.join(self.path, snapshot))
+        with open(f"{self._current_path}.tmp", "w") as f:
+            f.write(snapshot)
+        os.replace(f"{self._current_path}.tmp", self._current_path)
+
+        for entry in os.listdir(self.path):
+            if entry.startswith("snap-") and entry != snapshot:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+        self._snapshot = self._current_snapshot()
+        self._snapshot_bytes = sum(entry.stat().st_size for entry in os.scandir(os.path.join(self.path, snapshot)))
+        self._log_offset = 0
+
+    def _commit(self, change: Dict[str, Any], vectors: Optional[np.ndarray] = None):
+        """Apply a change on top of everyone else's"""
+        with _locked(self.path, exclusive=True):
+            self._sync()
+            self._log(change, vectors)
+
+    def _log(self, change: Dict[str, Any], vectors: Optional[np.ndarray] = None):
+        """Apply a change and append it to the log; call under the exclusive lock after ``_sync``"""
+        self._apply(change, vectors)
+        if self._snapshot is None:
+            self._save()
+            return
+
+        payload = b""
+        if vectors is not None:
+            payload = np.ascontiguousarray(vectors, dtype=self.dtype).tobytes()
+            change = {**change, "dim": vectors.shape[1], "dtype": self.dtype.name, "vector_bytes": len(payload)}
+        with open(self._log_path(), "ab") as f:
+            f.truncate(self._log_offset)  # Drop a record torn by a crashed writer
+            f.write(json.dumps(change, separators=(",", ":")).encode("utf-8") + b"\n" + payload)
+            self._log_offset = f.tell()
+
+        if self._log_offset > max(self.compact_min_bytes, self._snapshot_bytes):
+            self._save()
+
+    def _apply(self, change: Dict[str, Any], vectors: Optional[np.ndarray]):
+        if change["op"] == "upsert":
+            self._apply_upsert(change["ids"], vectors, change.get("documents"), change.get("metadatas"))
+        elif change["op"] == "update":
+            self._apply_update(change["ids"], vectors, change.get("documents"), change.get("metadatas"))
+        else:
+            self._apply_delete(change["ids"])
+        self._columns.clear()
+        self._live = None
+
+    def _compact(self):
+        """Drop deleted rows"""
+        live = [row for row, chunk_id in enumerate(self._ids) if chunk_id is not None]
+        if len(live) == len(self._ids):
+            return
+
+        self._ids = [self._ids[row] for row in live]
+        self._documents = [self._documents[row] for row in live]
+        self._metadatas = [self._metadatas[row] for row in live]
+        self._row = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        if self._vectors is not None:
+            self._vectors = np.ascontiguousarray(self._vectors[live])
+        if self._lists is not None:
+            self._lists = self._lists[live]
+        self._columns.clear()
+        self._live = None
+
+    # Writes
+
+    def _append_rows(self, vectors: np.ndarray):
+        """Grow the vector matrix (by doubling) to fit new rows"""
+        start = len(self._ids) - len(vectors)
+        needed = len(self._ids)
+        if self._vectors is None:
+            self._vectors = np.zeros((max(needed, 1024), vectors.shape[1]), dtype=self.dtype)
+        elif needed > len(self._vectors):
+            capacity = max(len(self._vectors), 1024)
+            while capacity < needed:
+                capacity *= 2
+            grown = np.zeros((capacity, self._vectors.shape[1]), dtype=self.dtype)
+            grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:needed] = vectors
+
+        if self._centroids is not None:
+            lists = np.full(len(self._vectors), -1, dtype=np.int32)
+            lists[:start] = self._lists[:start]
+            lists[start:needed] = self._assign(vectors)
+            self._lists = lists
+
+    def _check_dimension(self, vectors: np.ndarray):
+        if self._vectors is not None and vectors.shape[1] != self._vectors.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self._vectors.shape[1]}"
+            )
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Any = None,
+        documents: Optional[Sequence[Optional[str]]] = None,
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None
+    ):
+        """Insert or replace rows; embeddings must be supplied"""
+        if embeddings is None:
+            raise ValueError("VectorIndexCollection requires precomputed embeddings")
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        self._commit({
+            "op": "upsert",
+            "ids": list(ids),
+            "documents": list(documents) if documents is not None else None,
+            "metadatas": list(metadatas) if metadatas is not None else None
+        }, vectors)
+
+    add = upsert
+
+    def _apply_upsert(self, ids, vectors, documents, metadatas):
+        self._check_dimension(vectors)
+        new_vectors = []
+        for i, chunk_id in enumerate(ids):
+            document = documents[i] if documents is not None else None
+            metadata = (metadatas[i] if metadatas is not None else None) or {}
+            row = self._row.get(chunk_id)
+            if row is None:
+                self._row[chunk_id] = len(self._ids)
+                self._ids.append(chunk_id)
+                self._documents.append(document)
+                self._metadatas.append(metadata)
+                new_vectors.append(vectors[i])
+            else:
+                self._documents[row] = document
+                self._metadatas[row] = metadata
+                self._vectors[row] = vectors[i]
+                if self._centroids is not None:
+                    self._lists[row] = self._assign(vectors[i:i + 1])[0]
+
+        if new_vectors:
+            self._append_rows(np.stack(new_vectors))
+        self._maybe_train()
+
+    def update(
+        self,
+        ids: Sequence[str],
+        embeddings: Any = None,
+        documents: Optional[Sequence[Optional[str]]] = None,
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None
+    ):
+        """Change fields of existing rows (unknown IDs are ignored)"""
+        vectors = None
+        if embeddings is not None:
+            vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        self._commit({
+            "op": "update",
+            "ids": list(ids),
+            "documents": list(documents) if documents is not None else None,
+            "metadatas": list(metadatas) if metadatas is not None else None
+        }, vectors)
+
+    def _apply_update(self, ids, vectors, documents, metadatas):
+        if vectors is not None:
+            self._check_dimension(vectors)
+        for i, chunk_id in enumerate(ids):
+            row = self._row.get(chunk_id)
+            if row is None:
+                continue
+            if documents is not None:
+                self._documents[row] = documents[i]
+            if metadatas is not None:
+                self._metadatas[row] = metadatas[i] or {}
+            if vectors is not None:
+                self._vectors[row] = vectors[i]
+                if self._centroids is not None:
+                    self._lists[row] = self._assign(vectors[i:i + 1])[0]
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Delete rows by ID and/or metadata filter"""
+        with _locked(self.path, exclusive=True):
+            self._sync()
+            # Logged by ID, so replaying never re-evaluates the filter
+            chunk_ids = [self._ids[row] for row in self._select(ids, where)]
+            if chunk_ids:
+                self._log({"op": "delete", "ids": chunk_ids})
+
+    def _apply_delete(self, ids):
+        for chunk_id in ids:
+            row = self._row.pop(chunk_id, None)
+            if row is None:
+                continue
+            self._ids[row] = None
+            self._documents[row] = None
+            self._metadatas[row] = {}
+
+    # Reads
+
+    def count(self) -> int:
+        with _locked(self.path, exclusive=False):
+            self._sync()
+            return len(self._row)
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            column = np.empty(len(self._ids), dtype=object)
+            column[:] = [metadata.get(key) for metadata in self._metadatas]
+            self._columns[key] = column
+        return column
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Evaluate a Chroma-style metadata filter over all rows"""
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+            else:
+                operator, value = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+                column = self._column(key)
+                if operator == "$eq":
+                    mask &= column == value
+                elif operator == "$ne":
+                    mask &= column != value
+                elif operator in ("$in", "$nin"):
+                    values = set(value)
+                    hits = np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+                    mask &= hits if operator == "$in" else ~hits
+                else:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+        return mask
+
+    def _select(self, ids: Optional[Sequence[str]], where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Live row numbers matching the given IDs and filter, in row order"""
+        if ids is not None:
+            rows = np.array(sorted({self._row[i] for i in ids if i in self._row}), dtype=np.int64)
+        else:
+            if self._live is None:
+                self._live = np.array(
+                    [row for row, chunk_id in enumerate(self._ids) if chunk_id is not None], dtype=np.int64
+                )
+            rows = self._live
+        if where and len(rows):
+            rows = rows[self._where_mask(where)[rows]]
+        return rows
+
+    def _result(self, rows: Sequence[int], include: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "ids": [self._ids[row] for row in rows],
+            "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+            "embeddings": (
+                self._vectors[np.asarray(rows, dtype=np.int64)].astype(np.float32).tolist()
+                if "embeddings" in include and self._vectors is not None else
+                ([] if "embeddings" in include else None)
+            )
+        }
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = ("metadatas", "documents")
+    ) -> Dict[str, Any]:
+        """Fetch rows by ID and/or filter, in insertion order"""
+        with _locked(self.path, exclusive=False):
+            self._sync()
+            rows = self._select(ids, where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._result(rows, include)
+
+    def query(
+        self,
+        query_embeddings: Any,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("metadatas", "documents", "distances")
+    ) -> Dict[str, Any]:
+        """Exact (or IVF-probed) cosine top-k for each query vector"""
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        with _locked(self.path, exclusive=False):
+            self._sync()
+            return self._query(queries, n_results, where, include)
+
+    def _query(
+        self,
+        queries: np.ndarray,
+        n_results: int,
+        where: Optional[Dict[str, Any]],
+        include: Sequence[str]
+    ) -> Dict[str, Any]:
+        candidates = self._select(None, where)
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for query in queries:
+            rows = candidates
+            if self._centroids is not None and len(rows):
+                probe = np.argsort(self._centroids @ query)[-self.nprobe:]
+                rows = rows[np.isin(self._lists[rows], probe)]
+
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                block = rows[start:start + _BLOCK_ROWS]
+                scores[start:start + len(block)] = self._vectors[block].astype(np.float32, copy=False) @ query
+
+            k = min(n_results, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k] if 0 < k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+
+            found = self._result(rows[top], include)
+            for key in ("ids", "documents", "metadatas", "embeddings"):
+                result[key].append(found[key])
+            result["distances"].append((1.0 - scores[top]).tolist())
+
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    # IVF
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors.astype(np.float32, copy=False) @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _maybe_train(self):
+        """(Re)train IVF buckets when first large enough and after doubling"""
+        live = len(self._row)
+        if not self.nlist or live < self.nlist * 39:
+            return
+        if self._centroids is not None and live < 2 * self._trained_size:
+            return
+
+        self._compact()
+        n = len(self._ids)
+        vectors = self._vectors[:n]
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(n, size=min(n, self.nlist * 256), replace=False)].astype(np.float32)
+
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)]
+        for _ in range(10):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~np.bincount(labels, minlength=self.nlist).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        self._centroids = centroids
+        self._trained_size = live
+        lists = np.full(len(self._vectors), -1, dtype=np.int32)
+        for start in range(0, n, _BLOCK_ROWS):
+            lists[start:min(start + _BLOCK_ROWS, n)] = self._assign(vectors[start:start + _BLOCK_ROWS])
+        self._lists = lists
+
+
+class VectorIndexClient:
+    """Chroma-compatible client over ``VectorIndexCollection`` directories"""
+
+    def __init__(self, path: str, dtype: str = "float32", nlist: int = 0, nprobe: int = 8):
+        self.path = path
+        self.dtype = dtype
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._collections: Dict[str, VectorIndexCollection] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def heartbeat(self) -> int:
+        return time.time_ns()
+
+    def _collection_path(self, name: str) -> str:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return os.path.join(self.path, name)
+
+    def _open(self, name: str, metadata: Optional[Dict[str, Any]]) -> VectorIndexCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            path = self._collection_path(name)
+            os.makedirs(path, exist_ok=True)
+            collection = VectorIndexCollection(
+                path, name, metadata, dtype=self.dtype, nlist=self.nlist, nprobe=self.nprobe
+            )
+            self._collections[name] = collection
+        return collection
+
+    def get_or_create_collection(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> VectorIndexCollection:
+        return self._open(name, metadata)
+
+    def create_collection(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> VectorIndexCollection:
+        if os.path.exists(self._collection_path(name)):
+            raise ValueError(f"Collection {name} already exists")
+        return self._open(name, metadata)
+
+    def get_collection(self, name: str, **kwargs) -> VectorIndexCollection:
+        if name not in self._collections and not os.path.exists(self._collection_path(name)):
+            raise ValueError(f"Collection {name} does not exist")
+        return self._open(name, None)
+
+    def delete_collection(self, name: str):
+        path = self._collection_path(name)
+        self._collections.pop(name, None)
+        with _locked(path, exclusive=True):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def list_collections(self) -> List[VectorIndexCollection]:
+        return [
+            self._open(name, None)
+            for name in sorted(os.listdir(self.path))
+            if _NAME_RE.match(name) and os.path.isdir(os.path.join(self.path, name))
+        ]
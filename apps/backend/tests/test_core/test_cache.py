@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for the Redis-backed cache manager"""
+
+import asyncio
+
+import pytest
+
+from app.core.cache import CacheManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """Cache manager whose Redis tier is a plain dict"""
+    manager = CacheManager()
+    manager.redis_client = object()
+    store = {}
+
+    async def get(namespace, key, deserializer="json"):
+        return store.get(key)
+
+    async def set_(namespace, key, value, ttl=None, serializer="json"):
+        store[key] = value
+        return True
+
+    async def generate_key(namespace, key):
+        return key
+
+    async def acquire_lock(full_key, timeout_ms=None):
+        return "token"
+
+    async def release_lock(full_key, token):
+        pass
+
+    monkeypatch.setattr(manager, "get", get)
+    monkeypatch.setattr(manager, "set", set_)
+    monkeypatch.setattr(manager, "_generate_key", generate_key)
+    monkeypatch.setattr(manager, "_acquire_lock", acquire_lock)
+    monkeypatch.setattr(manager, "_release_lock", release_lock)
+    manager.store = store
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_recomputes_plain_values(manager):
+    """Test a key written with plain set() is treated as a miss, not an envelope"""
+    manager.store["k"] = {"name": "written by set()"}
+
+    assert await manager.get_or_set("users", "k", lambda: "fresh") == "fresh"
+    assert manager.store["k"]["value"] == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_errors_are_reported(manager, capsys):
+    """Test an exception in a background refresh is logged rather than lost"""
+    manager.store["k"] = {"value": "stale", "fresh_until": 0, "delta": 0}
+
+    def failing():
+        raise RuntimeError("backend down")
+
+    assert await manager.get_or_set("users", "k", failing) == "stale"
+    await asyncio.gather(*manager._background, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert "backend down" in capsys.readouterr().out
+    assert not manager._background
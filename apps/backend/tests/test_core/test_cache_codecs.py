@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for cache value codecs"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from pydantic import BaseModel
+
+from app.core.cache_codecs import (
+    CODEC_JSON,
+    HEADER_SIZE,
+    CacheCodec,
+    CodecError,
+    register_type,
+)
+
+
+class ItemDTO(BaseModel):
+    name: str
+    price: Decimal
+
+
+register_type(ItemDTO, "test.item")
+
+
+@pytest.mark.parametrize("codec", ["json", "orjson", "msgpack"])
+def test_round_trip_registered_types(codec):
+    """Test registered types survive a round trip with every codec"""
+    value = {
+        "when": datetime(2024, 5, 1, 12, 30),
+        "price": Decimal("9.99"),
+        "item": ItemDTO(name="agent", price=Decimal("1.50")),
+        "tags": ["a", "b"],
+    }
+    cache_codec = CacheCodec(codec)
+
+    assert cache_codec.decode(cache_codec.encode(value)) == value
+
+
+def test_large_values_are_compressed():
+    """Test values above the threshold are compressed and still decode"""
+    cache_codec = CacheCodec("json", "zlib", compress_min_bytes=100)
+    value = {"text": "repeated " * 500}
+
+    encoded = cache_codec.encode(value)
+
+    assert len(encoded) < 500
+    assert cache_codec.decode(encoded) == value
+
+
+def test_codec_can_change_without_flush():
+    """Test values written by one codec are read by a differently configured one"""
+    written = CacheCodec("msgpack", "none").encode({"a": 1})
+
+    assert CacheCodec("json").decode(written) == {"a": 1}
+    assert CacheCodec().decode(b'{"legacy": true}') == {"legacy": True}
+
+
+def test_unregistered_types_are_rejected():
+    """Test arbitrary objects are not silently encoded"""
+    with pytest.raises(CodecError):
+        CacheCodec().encode({"obj": object()})
+    with pytest.raises(CodecError):
+        CacheCodec().decode(b"not a header", legacy=None)
+    assert CacheCodec("json").encode(1)[3] == CODEC_JSON
+    assert len(CacheCodec("json").encode(1)) == HEADER_SIZE + 1
@@ -0,0 +1,51 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for cache key derivation"""
+
+from uuid import UUID
+
+import pytest
+
+from app.core.cache_keys import key_function, make_cache_key
+
+
+def test_equal_arguments_share_a_key():
+    """Test keys depend on argument values, not their spelling"""
+    def search(query, limit=10, filters=None):
+        pass
+
+    key = key_function(search, "search")
+
+    assert key("agents") == key("agents", 10) == key(query="agents", limit=10)
+    assert key("a", filters={"x": 1, "y": 2}) == key("a", filters={"y": 2, "x": 1})
+
+
+def test_distinct_arguments_do_not_collide():
+    """Test values with the same str() get different keys"""
+    keys = {
+        make_cache_key("f", (1,)),
+        make_cache_key("f", ("1",)),
+        make_cache_key("f", (True,)),
+        make_cache_key("f", (1.0,)),
+        make_cache_key("f", ([1],)),
+        make_cache_key("f", (UUID(int=1),)),
+        make_cache_key("f", (str(UUID(int=1)),)),
+        make_cache_key("f", (1,), version=2),
+    }
+
+    assert len(keys) == 8
+
+
+def test_ignored_and_explicit_keys():
+    """Test ignore= and key= control what is keyed, and unknown objects are rejected"""
+    class Service:
+        def get(self, db, item_id):
+            pass
+
+    key = key_function(Service.get, "get", ignore=("db",))
+    assert key(Service(), object(), 5) == key(Service(), object(), item_id=5)
+
+    explicit = key_function(Service.get, "get", key=lambda self, db, item_id: item_id)
+    assert explicit(Service(), object(), 5) == make_cache_key("get", (5,))
+
+    with pytest.raises(TypeError):
+        key_function(Service.get, "get")(Service(), object(), 5)
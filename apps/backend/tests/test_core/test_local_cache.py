@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for the in-process caches"""
+
+import time
+
+from app.core.local_cache import BoundedCache, LocalCache
+
+
+def test_evicts_least_recently_used():
+    """Test the cache stays within its entry cap, evicting the LRU entry"""
+    cache = LocalCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_expired_entries_are_not_returned(monkeypatch):
+    """Test entries expire after the smaller of the given and default TTL"""
+    cache = LocalCache(ttl=30)
+    cache.set("a", 1, ttl=3600)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+    assert cache.get("a") is None
+
+
+def test_fill_is_dropped_after_invalidation():
+    """Test a value fetched before an invalidation is not cached"""
+    cache = LocalCache()
+    epoch = cache.epoch
+    cache.delete("a")
+    cache.set("a", "stale", epoch=epoch)
+
+    assert cache.get("a") is None
+
+
+def test_bounded_cache_respects_entry_and_size_limits():
+    """Test the bounded cache evicts to stay within both limits"""
+    cache = BoundedCache(max_entries=3, max_bytes=100)
+    for key in "abcd":
+        cache.set(key, key, size=10)
+    assert len(cache) == 3
+    assert cache.get("a") is None
+
+    cache.set("big", "x", size=80)
+    assert cache.size <= 100
+    assert cache.get("big") == "x"
+
+    cache.set("huge", "x", size=101)
+    assert cache.get("huge") is None
+
+
+def test_bounded_cache_lfu_keeps_frequently_read_entries():
+    """Test LFU evicts the least frequently read entry rather than the oldest read"""
+    cache = BoundedCache(max_entries=2, policy="lfu")
+    cache.set("hot", 1)
+    cache.set("cold", 2)
+    cache.get("hot")
+    cache.get("hot")
+    cache.get("cold")
+    cache.set("new", 3)
+
+    assert cache.get("hot") == 1
+    assert cache.get("cold") is None
+
+
+def test_bounded_cache_expires_from_the_heap(monkeypatch):
+    """Test expired entries are removed and overwritten TTLs are ignored"""
+    cache = BoundedCache()
+    cache.set("a", 1, ttl=10)
+    cache.set("b", 2, ttl=10)
+    cache.set("b", 3, ttl=100)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+    assert cache.get("b") == 3
+    assert len(cache) == 1
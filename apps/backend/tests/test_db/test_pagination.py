@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for keyset pagination"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import Column, DateTime, Integer, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.db.pagination import InvalidCursor, Keyset
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+    score = Column(Integer, nullable=True)
+
+
+NEWEST = Keyset("newest", (Row.created_at, True), (Row.id, True))
+TOP = Keyset("top", (Row.score, True), (Row.id, False))
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/rows.db")
+    start = datetime(2024, 1, 1)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(Row.__table__.insert(), [
+            # Ties on created_at and score, and some NULL scores
+            {"id": i, "created_at": start + timedelta(hours=i // 3), "score": None if i % 4 == 0 else i % 3}
+            for i in range(1, 21)
+        ])
+    yield engine
+    await engine.dispose()
+
+
+async def _walk(engine, keyset, limit):
+    seen, cursor = [], None
+    async with engine.connect() as conn:
+        while True:
+            result = await conn.execute(keyset.apply(select(Row), cursor, limit))
+            rows, cursor = keyset.page(result.all(), limit)
+            seen.extend(row.id for row in rows)
+            if cursor is None:
+                return seen
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("keyset", [NEWEST, TOP])
+async def test_pages_cover_every_row_in_order(engine, keyset):
+    """Test walking the cursors returns the same rows as one ordered query"""
+    async with engine.connect() as conn:
+        expected = (await conn.execute(select(Row.id).order_by(*keyset.order_by()))).scalars().all()
+
+    assert await _walk(engine, keyset, 3) == list(expected)
+
+
+def test_cursors_are_checked():
+    """Test cursors round-trip values and are rejected by other orderings"""
+    cursor = NEWEST.encode([datetime(2024, 1, 1, 5), 7])
+
+    assert NEWEST.decode(cursor) == [datetime(2024, 1, 1, 5), 7]
+    with pytest.raises(InvalidCursor):
+        TOP.decode(cursor)
+    with pytest.raises(InvalidCursor):
+        NEWEST.decode("not-a-cursor")
+
+
+def test_cursor_values_must_match_their_columns():
+    """Test cursors whose values do not fit the ordering's columns are rejected"""
+    with pytest.raises(InvalidCursor):
+        NEWEST.decode(NEWEST.encode(["2024-01-01", 7]))
+    with pytest.raises(InvalidCursor):
+        NEWEST.decode(NEWEST.encode([None, 7]))
+    with pytest.raises(InvalidCursor):
+        NEWEST.decode(NEWEST.encode([datetime(2024, 1, 1), True]))
+
+    assert TOP.decode(TOP.encode([None, 3])) == [None, 3]
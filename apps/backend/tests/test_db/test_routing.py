@@ -0,0 +1,168 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for read-replica session routing"""
+
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import Column, Integer, String, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.db.routing import USE_PRIMARY, ReplicaSet, set_read_your_writes_key
+
+Base = declarative_base()
+
+
+class Note(Base):
+    __tablename__ = "notes"
+
+    id = Column(Integer, primary_key=True)
+    body = Column(String)
+
+
+class _Redis:
+    """Just enough of a Redis client for the read-your-writes marker"""
+
+    def __init__(self):
+        self.expires = {}
+
+    async def set(self, key, value, px=None):
+        self.expires[key] = time.monotonic() + px / 1000
+
+    async def exists(self, key):
+        return int(self.expires.get(key, 0) > time.monotonic())
+
+
+async def _engines(tmp_path, names):
+    engines = []
+    for name in names:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/{name}.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(Note.__table__.insert().values(id=1, body=name))
+        engines.append(engine)
+    return engines
+
+
+@pytest_asyncio.fixture
+async def replica_set(tmp_path):
+    primary, replica = await _engines(tmp_path, ["primary", "replica"])
+
+    yield ReplicaSet(primary, [replica])
+
+    await primary.dispose()
+    await replica.dispose()
+
+
+def _factory(replica_set):
+    return sessionmaker(
+        replica_set.primary,
+        class_=AsyncSession,
+        sync_session_class=replica_set.session_class(),
+        expire_on_commit=False,
+    )
+
+
+async def _body(session) -> str:
+    return (await session.execute(select(Note.body).where(Note.id == 1))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replicas_and_writes_to_primary(replica_set):
+    """Test SELECTs use the replica until the session writes"""
+    async with _factory(replica_set)() as session:
+        assert await _body(session) == "replica"
+
+        session.add(Note(id=2, body="new"))
+        await session.commit()
+
+        assert await _body(session) == "primary"
+
+    async with _factory(replica_set)() as session:
+        count = (await session.execute(text("SELECT count(*) FROM notes"))).scalar_one()
+        assert count == 2
+        session.info[USE_PRIMARY] = True
+        assert await _body(session) == "primary"
+
+
+@pytest.mark.asyncio
+async def test_statement_writes_move_reads_to_primary(replica_set):
+    """Test an UPDATE statement, which never flushes, counts as a write"""
+    factory = _factory(replica_set)
+    async with factory() as session:
+        set_read_your_writes_key(session, "user-1")
+        assert await _body(session) == "replica"
+
+        await session.execute(update(Note).where(Note.id == 1).values(body="updated"))
+        assert await _body(session) == "updated"
+        await session.commit()
+
+    async with factory() as session:
+        set_read_your_writes_key(session, "user-1")
+        assert await _body(session) == "updated"
+
+
+@pytest.mark.asyncio
+async def test_recent_writers_read_from_primary(replica_set):
+    """Test a user's next session reads their own writes"""
+    factory = _factory(replica_set)
+    async with factory() as session:
+        set_read_your_writes_key(session, "user-1")
+        session.add(Note(id=3, body="mine"))
+        await session.commit()
+
+    async with factory() as session:
+        set_read_your_writes_key(session, "user-1")
+        assert await _body(session) == "primary"
+
+    async with factory() as session:
+        set_read_your_writes_key(session, "user-2")
+        assert await _body(session) == "replica"
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_replicas_are_skipped(replica_set):
+    """Test reads fall back to the primary when no replica is healthy"""
+    await replica_set.replicas[0].dispose()
+    replica_set.healthy = []
+
+    async with _factory(replica_set)() as session:
+        assert await _body(session) == "primary"
+
+
+@pytest.mark.asyncio
+async def test_recent_writes_are_shared_across_workers(tmp_path):
+    """Test a write recorded by one worker keeps another worker's reads on the primary"""
+    primary, replica = await _engines(tmp_path, ["primary", "replica"])
+    redis = _Redis()
+    writer = ReplicaSet(primary, [replica], redis_client=redis)
+    reader = ReplicaSet(primary, [replica], redis_client=redis)
+
+    async with _factory(writer)() as session:
+        set_read_your_writes_key(session, "user-1")
+        session.add(Note(id=4, body="mine"))
+        await session.commit()
+
+    async with _factory(reader)() as session:
+        set_read_your_writes_key(session, "user-1")
+        assert await _body(session) == "primary"
+
+    await primary.dispose()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_session_keeps_one_replica(tmp_path):
+    """Test every read of a session goes to the replica its first read picked"""
+    primary, *replicas = await _engines(tmp_path, ["primary", "replica_a", "replica_b"])
+    replica_set = ReplicaSet(primary, replicas)
+
+    for _ in range(5):
+        async with _factory(replica_set)() as session:
+            bodies = {await _body(session) for _ in range(10)}
+            assert len(bodies) == 1
+
+    await primary.dispose()
+    for replica in replicas:
+        await replica.dispose()
@@ -0,0 +1,240 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""
+Equivalence tests for the sync and async service ports.
+
+Every test runs twice: against the ``AsyncSession`` service, and against the
+``Session`` service driven through ``AsyncSession.run_sync``. Both must give
+the same results.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.agent import AgentFlow, Execution, ExecutionNode
+from app.models.tenant import CostGuardStatus, Tenant
+from app.models.user import User
+from app.schemas.execution import ExecutionStepCreate
+from app.services.agent_manifest import AgentManifestService, AsyncAgentManifestService
+from app.services.cost_guard import AsyncCostGuardService, CostGuardService
+from app.services.execution_timeline import AsyncExecutionTimelineService, ExecutionTimelineService
+
+SERVICES = {
+    "timeline": (ExecutionTimelineService, AsyncExecutionTimelineService),
+    "cost_guard": (CostGuardService, AsyncCostGuardService),
+    "manifest": (AgentManifestService, AsyncAgentManifestService),
+}
+
+
+class SyncPort:
+    """Awaitable facade over a sync service running on the async session's sync ``Session``"""
+
+    def __init__(self, db: AsyncSession, service_class):
+        self.db = db
+        self.service_class = service_class
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            return await self.db.run_sync(
+                lambda session: getattr(self.service_class(session), name)(*args, **kwargs)
+            )
+        return call
+
+
+@pytest.fixture(params=["sync", "async"])
+def service(request, db_session: AsyncSession):
+    """Build the named service in the flavour under test"""
+    def build(name):
+        sync_class, async_class = SERVICES[name]
+        if request.param == "sync":
+            return SyncPort(db_session, sync_class)
+        return async_class(db_session)
+    return build
+
+
+@pytest_asyncio.fixture
+async def flow(db_session: AsyncSession, test_tenant: Tenant, test_user: User) -> AgentFlow:
+    flow = AgentFlow(
+        tenant_id=test_tenant.id,
+        owner_id=test_user.id,
+        name="Research",
+        nodes=[{"type": "llm"}, {"type": "tool", "name": "search"}]
+    )
+    db_session.add(flow)
+    await db_session.commit()
+    return flow
+
+
+@pytest_asyncio.fixture
+async def node(db_session: AsyncSession, flow: AgentFlow, test_user: User) -> ExecutionNode:
+    """The single node of a completed execution"""
+    execution = Execution(
+        tenant_id=flow.tenant_id,
+        flow_id=flow.id,
+        user_id=test_user.id,
+        status="completed",
+        cost_cents=30,
+        input_data={"q": "x"}
+    )
+    db_session.add(execution)
+    await db_session.flush()
+    node = ExecutionNode(execution_id=execution.id, node_id="llm-1", node_type="llm", status="completed")
+    db_session.add(node)
+    await db_session.commit()
+    return node
+
+
+async def _add_steps(timeline, node: ExecutionNode, user: User):
+    steps = [
+        ("llm", "gpt-4", None, 10),
+        ("tool_call", None, "search", 5),
+        ("llm", "gpt-4", None, 15),
+    ]
+    created = []
+    for number, (step_type, model_name, tool_name, cost) in enumerate(steps, start=1):
+        created.append(await timeline.create_execution_step(
+            node.execution_id,
+            node.id,
+            ExecutionStepCreate(
+                execution_id=node.execution_id,
+                execution_node_id=node.id,
+                step_number=number,
+                step_type=step_type,
+                step_name=f"step-{number}",
+                model_name=model_name,
+                tool_name=tool_name,
+                cost_cents=cost,
+                status="completed",
+                can_replay_from=number != 2
+            ),
+            user
+        ))
+    return created
+
+
+@pytest.mark.asyncio
+async def test_timeline_steps_costs_and_replay(service, node: ExecutionNode, test_user: User):
+    """Test step creation, cost breakdown, replay candidates and replay"""
+    timeline = service("timeline")
+    steps = await _add_steps(timeline, node, test_user)
+
+    assert await timeline.get_execution_cost_breakdown(node.execution_id) == {
+        "total_cost_cents": 30,
+        "cost_by_type": {"llm": 25, "tool_call": 5},
+        "cost_by_tool": {"search": 5},
+        "cost_by_model": {"gpt-4": 25},
+        "step_count": 3
+    }
+    candidates = await timeline.get_replay_candidates(node.execution_id)
+    assert [candidate["step_number"] for candidate in candidates] == [1, 3]
+
+    updated = await timeline.update_step_status(steps[1].id, "failed", error_message="timeout", cost_cents=7)
+    assert (updated.status, updated.error_message, updated.cost_cents) == ("failed", "timeout", 7)
+
+    replay = await timeline.replay_execution_from_step(node.execution_id, 3, test_user)
+    assert replay.original_execution_id == node.execution_id
+    breakdown = await timeline.get_execution_cost_breakdown(replay.id)
+    assert breakdown["step_count"] == 1 and breakdown["total_cost_cents"] == 0
+
+    with pytest.raises(ValueError):
+        await timeline.replay_execution_from_step(node.execution_id, 2, test_user)
+
+
+@pytest.mark.asyncio
+async def test_cost_guard_spending_and_checks(service, test_tenant: Tenant):
+    """Test spending updates, status changes, downgrades and recommendations"""
+    cost_guard_service = service("cost_guard")
+    await cost_guard_service.create_cost_guard(test_tenant.id, monthly_budget_cents=1000)
+    with pytest.raises(ValueError):
+        await cost_guard_service.create_cost_guard(test_tenant.id, monthly_budget_cents=1000)
+
+    cost_guard = await cost_guard_service.update_monthly_spending(
+        test_tenant.id, 850, cost_breakdown={"llm": 800, "search": 50}
+    )
+    assert cost_guard.status == CostGuardStatus.SOFT_CAP.value
+    assert cost_guard.cost_breakdown == {"llm": 800, "search": 50}
+    assert cost_guard.actions_taken[-1]["action"] == "status_change"
+
+    check = await cost_guard_service.can_execute_agent(test_tenant.id, 100, ["gpt-4"])
+    assert check["can_execute"] is True
+    assert check["recommended_models"] == ["gpt-3.5-turbo"]
+    assert (await cost_guard_service.can_execute_agent(test_tenant.id, 200))["can_execute"] is False
+
+    recommendations = await cost_guard_service.get_budget_recommendations(test_tenant.id)
+    assert [item["type"] for item in recommendations["recommendations"]] == ["warning", "optimization"]
+    assert recommendations["spending_percentage"] == 85
+
+
+@pytest.mark.asyncio
+async def test_cost_analytics(service, node: ExecutionNode, test_user: User, test_tenant: Tenant):
+    """Test analytics are summed per day, model and tool"""
+    await _add_steps(service("timeline"), node, test_user)
+
+    analytics = await service("cost_guard").get_cost_analytics(test_tenant.id)
+
+    assert analytics["total_cost_cents"] == 30
+    assert analytics["total_executions"] == 1
+    assert analytics["success_rate"] == 100
+    assert list(analytics["daily_costs"].values()) == [30]
+    assert analytics["model_costs"] == {"gpt-4": 25}
+    assert analytics["tool_costs"] == {"search": 5}
+
+
+@pytest.mark.asyncio
+async def test_expired_overrides_are_cleared(service, db_session: AsyncSession, test_tenant: Tenant, test_user: User):
+    """Test expired overrides are cleared and recorded in one pass"""
+    cost_guard_service = service("cost_guard")
+    cost_guard = await cost_guard_service.create_cost_guard(test_tenant.id, monthly_budget_cents=1000)
+    cost_guard.allow_override = True
+    await db_session.commit()
+
+    await cost_guard_service.override_budget_limit(test_tenant.id, test_user, "launch", duration_hours=1)
+    assert await cost_guard_service.cleanup_expired_overrides() == 0
+
+    cost_guard.override_until = datetime.utcnow() - timedelta(minutes=1)
+    await db_session.commit()
+    assert await cost_guard_service.cleanup_expired_overrides() == 1
+
+    await db_session.refresh(cost_guard)
+    assert cost_guard.override_until is None
+    assert [action["action"] for action in cost_guard.actions_taken] == ["budget_override", "override_expired"]
+
+
+@pytest.mark.asyncio
+async def test_manifest_lifecycle(service, db_session: AsyncSession, flow: AgentFlow, test_user: User):
+    """Test signing, verification, versions, updates and entitlements"""
+    manifests = service("manifest")
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_key = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    # Templates need no database, so both ports share the sync implementation
+    template = AgentManifestService(db_session.sync_session).generate_manifest_template(flow)
+    assert template["allowed_tools"] == ["search"]
+
+    manifest = await manifests.create_manifest(flow.id, flow.tenant_id, template, test_user, private_key)
+    assert await manifests.verify_manifest(manifest.id, public_key, test_user) is True
+    assert (await manifests.get_manifest_by_flow(flow.id)).id == manifest.id
+
+    versions = await manifests.get_manifest_versions(flow.id)
+    assert [(version["version"], version["is_verified"]) for version in versions] == [("1.0.0", True)]
+
+    updated = await manifests.update_manifest(manifest.id, {"allowed_tools": ["search", "browse"]}, test_user)
+    assert updated.is_verified is False
+    assert updated.manifest_content["allowed_tools"] == ["search", "browse"]
+
+    compliance = await manifests.validate_manifest_compliance(manifest.id)
+    assert compliance["is_compliant"] is True
+
+    entitlements = await manifests.check_manifest_entitlements(manifest.id, ["shell"], ["gpt-4"], 5000)
+    assert entitlements["is_allowed"] is False
+    assert entitlements["tool_entitlements"] == {"shell": "DENIED"}
+    assert entitlements["cost_entitlements"]["max_cost"] == "EXCEEDED"
@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for the BM25 keyword index"""
+
+import pytest
+
+from app.services.bm25_index import BM25Index, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Create an empty index in a temporary directory"""
+    return BM25Index(str(tmp_path))
+
+
+def test_tokenize_keeps_code_symbols():
+    """Test identifiers are indexed whole and by their parts"""
+    terms = tokenize("call getUserById from app.core.cache")
+    assert "getuserbyid" in terms
+    assert "user" in terms
+    assert "app.core.cache" in terms
+    assert "cache" in terms
+
+
+def test_exact_identifier_ranks_first(index):
+    """Test an exact identifier match outranks generic text"""
+    index.add("u1", [
+        ("c1", "the service layer handles user lookups"),
+        ("c2", "def get_user_by_id(user_id): return db.get(user_id)"),
+        ("c3", "users can be looked up by email"),
+    ])
+    results = index.search("u1", "get_user_by_id", top_k=2)
+    assert results[0][0] == "c2"
+
+
+def test_partitions_are_isolated(index):
+    """Test one user's chunks never show up in another user's search"""
+    index.add("u1", [("c1", "quarterly revenue report")])
+    index.add("u2", [("c2", "quarterly planning notes")])
+    assert [chunk_id for chunk_id, _ in index.search("u2", "quarterly")] == ["c2"]
+
+
+def test_remove_and_compaction(index):
+    """Test removed chunks stop matching, including after compaction"""
+    index.add("u1", [(f"c{i}", f"document {i} about caching") for i in range(200)])
+    index.remove("u1", [f"c{i}" for i in range(150)])
+    results = index.search("u1", "caching", top_k=100)
+    assert {chunk_id for chunk_id, _ in results} == {f"c{i}" for i in range(150, 200)}
+
+
+def test_flush_and_reload(index, tmp_path):
+    """Test a flushed partition is reloaded from disk"""
+    index.add("u1", [("c1", "vector databases"), ("c2", "inverted index")])
+    index.flush("u1")
+
+    reloaded = BM25Index(str(tmp_path))
+    assert reloaded.search("u1", "inverted")[0][0] == "c2"
+
+
+def test_flush_appends_deltas_until_compaction(tmp_path):
+    """Test a flush appends to the delta log and only a large log rewrites the snapshot"""
+    index = BM25Index(str(tmp_path), compact_min_bytes=400)
+    index.add("u1", [("c1", "vector databases")])
+    index.flush("u1")
+    assert (tmp_path / "u1.log").exists() and not (tmp_path / "u1.npz").exists()
+
+    index.add("u1", [(f"c{i}", f"inverted index number {i}") for i in range(2, 20)])
+    index.flush("u1")
+    assert (tmp_path / "u1.npz").exists() and not (tmp_path / "u1.log").exists()
+    assert len(BM25Index(str(tmp_path)).search("u1", "inverted", top_k=50)) == 18
+
+
+def test_processes_see_each_others_changes(tmp_path):
+    """Test an index picks up changes another process flushed"""
+    first = BM25Index(str(tmp_path), compact_min_bytes=200)
+    second = BM25Index(str(tmp_path), compact_min_bytes=200)
+    first.add("u1", [("c1", "vector databases")])
+    first.flush("u1")
+    assert second.search("u1", "vector")[0][0] == "c1"
+
+    second.add("u1", [(f"c{i}", f"inverted index {i}") for i in range(2, 10)])
+    second.remove("u1", ["c1"])
+    second.flush("u1")
+    assert first.search("u1", "vector") == []
+    assert len(first.search("u1", "inverted", top_k=50)) == 8
+
+    second.drop("u1")
+    assert first.search("u1", "inverted") == []
+
+
+def test_least_recently_used_partitions_are_unloaded(tmp_path):
+    """Test partitions beyond the bound are flushed and unloaded"""
+    index = BM25Index(str(tmp_path), max_partitions=2)
+    for user_key in ("u1", "u2", "u3"):
+        index.add(user_key, [("c1", f"notes of {user_key}")])
+
+    assert list(index._partitions) == ["u2", "u3"]
+    assert index.search("u1", "notes")[0][0] == "c1"
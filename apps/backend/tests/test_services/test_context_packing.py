@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for context basket token counting and packing"""
+
+from app.services.context_packing import (
+    CHUNK_SEPARATOR,
+    context_window,
+    count_tokens,
+    dedupe_chunks,
+    pack_context,
+)
+
+
+def _chunk(chunk_id, content, relevance, document_id="doc", chunk_index=0):
+    return {
+        "id": chunk_id,
+        "content": content,
+        "relevance": relevance,
+        "metadata": {"document_id": document_id, "chunk_index": chunk_index}
+    }
+
+
+def test_dedupe_drops_contained_and_trims_overlap():
+    """Test contained chunks are dropped and adjacent chunk overlap is trimmed"""
+    shared = "the shared passage that both neighbouring chunks contain verbatim"
+    chunks = [
+        _chunk("a", f"opening words {shared}", 0.9, chunk_index=0),
+        _chunk("b", f"{shared} and the rest of it", 0.8, chunk_index=1),
+        _chunk("c", "opening words", 0.1, document_id="other"),
+    ]
+
+    kept = dedupe_chunks(chunks)
+
+    assert [c["id"] for c in kept] == ["a", "b"]
+    assert kept[1]["content"] == "and the rest of it"
+
+
+def test_pack_fits_budget_and_prefers_relevance_per_token():
+    """Test packing never exceeds the budget and favours dense, relevant chunks"""
+    chunks = [
+        _chunk("long", "word " * 400, 0.9, document_id="d1"),
+        _chunk("short", "a short relevant answer", 0.8, document_id="d2"),
+        _chunk("medium", "some moderately relevant context " * 10, 0.5, document_id="d3"),
+    ]
+    budget = count_tokens(chunks[1]["content"]) + count_tokens(chunks[2]["content"].strip()) + 20
+
+    packed = pack_context(chunks, budget)
+
+    assert [c["id"] for c in packed["chunks"]] == ["short", "medium"]
+    assert packed["dropped_chunks"] == ["long"]
+    assert packed["total_tokens"] == count_tokens(packed["context"]) <= budget
+    assert CHUNK_SEPARATOR in packed["context"]
+
+
+def test_context_window_matches_longest_prefix():
+    """Test model names resolve to the most specific known context window"""
+    assert context_window("gpt-4o-2024-05-13") == 128000
+    assert context_window("gpt-4-0613") == 8192
+    assert context_window("unknown-model") == 8192
@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for streaming document parsing"""
+
+import io
+
+import pytest
+
+from app.services.document_parsing import TextChunker, UploadTooLarge, chunk_text, stream_upload_chunks
+
+
+class _Upload:
+    """Minimal stand-in for UploadFile's async read"""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+
+TEXT = " ".join(f"wörd{i}" for i in range(3000))
+
+
+def test_incremental_chunker_matches_whole_text():
+    """Test feeding text in small pieces yields the same chunks"""
+    chunker = TextChunker(100)
+    chunks = []
+    for start in range(0, len(TEXT), 7):
+        chunks.extend(chunker.feed(TEXT[start:start + 7]))
+    chunks.extend(chunker.finish())
+    assert chunks == chunk_text(TEXT, 100)
+
+
+
+def test_incremental_chunker_cuts_long_words_the_same_way():
+    """Test words over four chunk sizes are cut identically whether fed whole or in pieces"""
+    text = f"intro {'x' * 1030} middle {'y' * 800} outro"
+    for piece in (1, 7, 399, 401):
+        chunker = TextChunker(100)
+        chunks = []
+        for start in range(0, len(text), piece):
+            chunks.extend(chunker.feed(text[start:start + piece]))
+        chunks.extend(chunker.finish())
+        assert chunks == chunk_text(text, 100)
+    assert not any("x" * 401 in chunk for chunk in chunk_text(text, 100))
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_decodes_across_block_boundaries():
+    """Test multi-byte characters split between reads decode correctly"""
+    upload = _Upload(TEXT.encode("utf-8"))
+    chunks = [chunk async for chunk in stream_upload_chunks(upload, "txt", chunk_size=100, block_size=5)]
+    assert chunks == chunk_text(TEXT, 100)
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_enforces_size_limit():
+    """Test an upload over its format's limit is rejected"""
+    upload = _Upload(TEXT.encode("utf-8"))
+    with pytest.raises(UploadTooLarge):
+        async for _ in stream_upload_chunks(upload, "txt", block_size=1024, max_bytes=4096):
+            pass
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for the on-disk embedding store"""
+
+import hashlib
+
+import numpy as np
+
+from app.services.embedding_cache import DiskEmbeddingStore
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def test_processes_sharing_a_store_allocate_distinct_rows(tmp_path):
+    """Test two stores on one directory never overwrite each other's rows"""
+    first = DiskEmbeddingStore(str(tmp_path), "model", initial_capacity=2)
+    second = DiskEmbeddingStore(str(tmp_path), "model", initial_capacity=2)
+
+    first.put_many({_hash("a"): np.full(4, 1.0)})
+    second.put_many({_hash("b"): np.full(4, 2.0)})
+    first.put_many({_hash(text): np.full(4, 3.0) for text in "cde"})
+
+    for store in (first, second, DiskEmbeddingStore(str(tmp_path), "model")):
+        found = store.get_many([_hash(text) for text in "abcde"])
+        assert [vector[0] for vector in found.values()] == [1.0, 2.0, 3.0, 3.0, 3.0]
+    assert len(DiskEmbeddingStore(str(tmp_path), "model")) == 5
+
+
+def test_known_hashes_are_not_rewritten(tmp_path):
+    """Test a hash cached by another process is not stored twice"""
+    first = DiskEmbeddingStore(str(tmp_path), "model")
+    second = DiskEmbeddingStore(str(tmp_path), "model")
+
+    first.put_many({_hash("a"): np.full(4, 1.0)})
+    second.put_many({_hash("a"): np.full(4, 9.0)})
+
+    assert second.get_many([_hash("a")])[_hash("a")][0] == 1.0
+    assert (tmp_path / "model" / "index.bin").stat().st_size == 36
+
+
+def test_digest_ending_in_nul_byte(tmp_path):
+    """Test a hash whose last byte is zero is found again after a reload"""
+    chunk_hash = _hash("0-198")
+    assert chunk_hash.endswith("00")
+
+    DiskEmbeddingStore(str(tmp_path), "model").put_many({chunk_hash: np.full(4, 1.0)})
+
+    assert chunk_hash in DiskEmbeddingStore(str(tmp_path), "model").get_many([chunk_hash])
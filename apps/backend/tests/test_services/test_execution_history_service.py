@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for batched execution retention cleanup"""
+
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.execution_history_service import (
+    CLEANUP_KEYSET,
+    _batch_statements,
+    _expired_batch_query,
+    _partition_upper_bound,
+)
+
+NOW = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+
+def _sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_batches_honor_ttl_and_walk_oldest_first():
+    """Test a batch selects rows past their own TTL after the previous batch"""
+    after = CLEANUP_KEYSET.decode(CLEANUP_KEYSET.encode([NOW, uuid4()]))
+    sql = _sql(_expired_batch_query(NOW, 30, NOW, after, 500))
+
+    assert "coalesce(executions.ttl_days, %(coalesce_1)s::INTEGER)" in sql
+    assert "(executions.created_at, executions.id) > " in sql
+    assert "ORDER BY executions.created_at ASC, executions.id ASC" in sql
+    assert "LIMIT" in sql
+
+
+def test_batch_deletes_children_first():
+    """Test steps and nodes go before their executions and references are cleared"""
+    statements = [_sql(statement) for statement in _batch_statements([uuid4()])]
+
+    assert statements[0].startswith("UPDATE vault_access_logs SET execution_id=")
+    assert statements[1].startswith("UPDATE executions SET original_execution_id=")
+    assert [statement.split(" WHERE")[0] for statement in statements[2:]] == [
+        "DELETE FROM execution_steps",
+        "DELETE FROM execution_nodes",
+        "DELETE FROM executions",
+    ]
+
+
+def test_partition_upper_bound():
+    """Test range partition bounds are parsed and other partitions ignored"""
+    bound = "FOR VALUES FROM ('2026-09-01 00:00:00+00') TO ('2026-10-01 00:00:00+00')"
+
+    assert _partition_upper_bound(bound) == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    assert _partition_upper_bound("DEFAULT") is None
@@ -0,0 +1,164 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for per-day execution rollups"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.agent import DURATION_BUCKETS_MS
+from app.services.execution_rollups import (
+    _BUCKETS,
+    backfill,
+    record_statement,
+    rollup_values,
+    summarize,
+    totals_query,
+)
+
+
+def _execution(status="completed", duration_ms=2000, created_at=None, **values):
+    started_at = datetime(2026, 10, 17, 23, 59, 59)
+    execution = dict(
+        tenant_id=uuid4(),
+        user_id=uuid4(),
+        flow_id=uuid4(),
+        status=status,
+        created_at=created_at or started_at,
+        started_at=started_at,
+        completed_at=started_at + timedelta(milliseconds=duration_ms),
+        tokens_used=100,
+        cost_cents=3,
+    )
+    execution.update(values)
+    return SimpleNamespace(**execution)
+
+
+def _totals(durations_ms, failed=0):
+    """A totals row as the database would sum it from the given durations"""
+    buckets = [0] * len(_BUCKETS)
+    for duration_ms in durations_ms:
+        bounds = [bound for bound in DURATION_BUCKETS_MS if duration_ms <= bound]
+        buckets[len(DURATION_BUCKETS_MS) - len(bounds)] += 1
+    return SimpleNamespace(
+        executions=len(durations_ms) + failed,
+        successful=len(durations_ms),
+        failed=failed,
+        tokens_used=1000,
+        cost_cents=250,
+        duration_count=len(durations_ms),
+        duration_ms_sum=sum(durations_ms),
+        duration_ms_sumsq=float(sum(duration ** 2 for duration in durations_ms)),
+        **dict(zip(_BUCKETS, buckets)),
+    )
+
+
+def test_completed_execution_contributes_its_duration():
+    """Test a completed execution is counted with its duration bucket and UTC day"""
+    values = rollup_values(_execution(duration_ms=6000))
+
+    assert values["day"].isoformat() == "2026-10-17"
+    assert (values["executions"], values["successful"], values["failed"]) == (1, 1, 0)
+    assert (values["duration_count"], values["duration_ms_sum"]) == (1, 6000)
+    assert values["duration_ms_sumsq"] == 36e6
+    assert values["duration_buckets"] == [0, 0, 1, 0, 0, 0, 0]
+
+
+def test_failed_execution_has_no_duration():
+    """Test a failed execution counts as failed but adds no duration"""
+    values = rollup_values(_execution(status="failed", tokens_used=None))
+
+    assert (values["executions"], values["successful"], values["failed"]) == (1, 0, 1)
+    assert values["tokens_used"] == 0
+    assert values["duration_count"] == 0
+    assert values["duration_buckets"] == [0] * len(_BUCKETS)
+
+
+def test_day_is_taken_in_utc():
+    """Test an aware creation time is bucketed by its UTC day"""
+    created_at = datetime(2026, 10, 18, 1, 0, tzinfo=timezone(timedelta(hours=3)))
+
+    assert rollup_values(_execution(created_at=created_at))["day"].isoformat() == "2026-10-17"
+
+
+def test_duration_mixes_aware_and_naive_times():
+    """Test an aware start (as loaded from the database) and a naive UTC completion mix"""
+    started_at = datetime(2026, 10, 18, 2, 0, tzinfo=timezone(timedelta(hours=2)))
+    values = rollup_values(_execution(
+        started_at=started_at,
+        completed_at=datetime(2026, 10, 18, 0, 0, 3),
+        created_at=started_at
+    ))
+
+    assert (values["duration_count"], values["duration_ms_sum"]) == (1, 3000)
+    assert values["day"].isoformat() == "2026-10-18"
+
+
+def test_summary_statistics():
+    """Test rates, mean, standard deviation and histogram come from the sums"""
+    summary = summarize(_totals([1000, 3000, 900000, 1000000], failed=1))
+
+    assert summary["total_executions"] == 5
+    assert summary["success_rate"] == 80
+    assert summary["total_cost_dollars"] == 2.5
+    assert summary["avg_execution_time_seconds"] == 476
+    assert round(summary["execution_time_stddev_seconds"], 3) == 475.317
+    assert summary["avg_execution_time_formatted"] == "476.0s"
+    assert [bucket["count"] for bucket in summary["duration_histogram"]] == [1, 1, 0, 0, 0, 1, 1]
+    assert summary["duration_histogram"][-1]["le_ms"] is None
+
+
+def test_summary_without_executions():
+    """Test an empty period has zero rates and no durations"""
+    summary = summarize(_totals([]))
+
+    assert summary["success_rate"] == 0
+    assert summary["avg_execution_time_seconds"] is None
+    assert summary["execution_time_stddev_seconds"] is None
+
+
+def test_record_increments_existing_rollup():
+    """Test recording upserts by rollup key and adds to every counter"""
+    sql = str(record_statement(_execution()).compile(dialect=postgresql.dialect()))
+
+    assert "ON CONFLICT (tenant_id, user_id, flow_id, day) DO UPDATE" in sql
+    assert "executions = (execution_daily_rollups.executions + excluded.executions)" in sql
+    assert sql.count("execution_daily_rollups.duration_buckets[") == len(_BUCKETS)
+
+
+def test_totals_combine_rollups_and_today_in_one_query():
+    """Test totals read past days from rollups and today from executions"""
+    sql = str(totals_query(7, user_id=uuid4()).compile(dialect=postgresql.dialect()))
+
+    assert sql.count("UNION ALL") == 1
+    assert "FROM execution_daily_rollups" in sql
+    assert "FROM executions" in sql
+
+
+class _Session:
+    """Answers the retention query with ``shortest_ttl`` and counts rebuilt days"""
+
+    def __init__(self, shortest_ttl):
+        self.shortest_ttl = shortest_ttl
+        self.days = 0
+
+    async def execute(self, statement):
+        if statement.is_insert:
+            self.days += 1
+        return SimpleNamespace(scalar=lambda: self.shortest_ttl, rowcount=2)
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_backfill_skips_days_cleanup_may_have_reached():
+    """Test backfill only rebuilds days newer than the shortest retention"""
+    today = datetime.now(timezone.utc).date()
+    db = _Session(shortest_ttl=3)
+
+    assert await backfill(db, today - timedelta(days=10)) == 4
+    assert db.days == 2
+    assert await backfill(_Session(shortest_ttl=None), today - timedelta(days=10)) == 0
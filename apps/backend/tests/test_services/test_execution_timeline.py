@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for execution timeline assembly"""
+
+from collections import namedtuple
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.execution_timeline import (
+    _NODE_COLUMNS,
+    _PAYLOAD_COLUMNS,
+    _STEP_COLUMNS,
+    _TimelineAssembler,
+    replay_steps_statement,
+)
+
+NodeRow = namedtuple("NodeRow", list(_NODE_COLUMNS))
+StepRow = namedtuple("StepRow", list(_NODE_COLUMNS) + list(_STEP_COLUMNS) + list(_PAYLOAD_COLUMNS))
+
+
+def _step_row(node_pk, step_number, **values):
+    row = dict.fromkeys(StepRow._fields)
+    row.update(node_pk=node_pk, node_id=f"node-{node_pk}", node_status="completed", step_number=step_number)
+    row.update(values)
+    return StepRow(**row)
+
+
+def _assemble(rows, include_payloads=False):
+    assembler = _TimelineAssembler(include_payloads)
+    nodes = [node for row in rows for node in assembler.add(row)]
+    return nodes + assembler.finish()
+
+
+def test_rows_are_grouped_into_nodes_with_steps():
+    """Test consecutive rows of a node become one node with its steps in order"""
+    nodes = _assemble([
+        _step_row(1, 1, tool_name="search"),
+        _step_row(1, 2, model_name="gpt-4", prompt_tokens=10),
+        _step_row(2, None),
+        _step_row(3, 1, query="docs"),
+    ])
+
+    assert [node["node_id"] for node in nodes] == ["node-1", "node-2", "node-3"]
+    assert [step["step_number"] for step in nodes[0]["steps"]] == [1, 2]
+    assert nodes[0]["steps"][1]["llm"]["prompt_tokens"] == 10
+    assert nodes[1]["steps"] == []
+    assert nodes[2]["steps"][0]["rag"] == {"query": "docs"}
+
+
+def test_payloads_only_when_requested():
+    """Test heavy JSON is left out unless include_payloads is set"""
+    row = _step_row(1, 1, tool_name="search", tool_parameters={"q": "x"}, tool_result=["hit"])
+
+    assert _assemble([row])[0]["steps"][0]["tool"] == {"name": "search"}
+    assert _assemble([row], include_payloads=True)[0]["steps"][0]["tool"] == {
+        "name": "search", "parameters": {"q": "x"}, "result": ["hit"]
+    }
+
+
+def test_nodes_without_steps_query():
+    """Test node-only rows produce nodes without a steps key"""
+    row = NodeRow(**dict.fromkeys(NodeRow._fields, None))
+
+    assert "steps" not in _assemble([row])[0]
+
+
+def test_replay_clones_steps_in_one_statement():
+    """Test replayed steps are renumbered and reset inside a single INSERT ... SELECT"""
+    sql = str(replay_steps_statement(uuid4(), uuid4(), 3).compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("INSERT INTO execution_steps")
+    assert "row_number() OVER (ORDER BY execution_steps.step_number)" in sql
+    assert "gen_random_uuid()" in sql
+    assert "output_data" not in sql and "tool_result" not in sql
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for RAG rerank stages"""
+
+import time
+
+import numpy as np
+import pytest
+
+from app.services.rag_rerank import MMRStage, Reranker, maximal_marginal_relevance
+
+
+def test_mmr_skips_near_duplicates():
+    """Test MMR prefers a diverse second result over a near-duplicate"""
+    embeddings = np.array([[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]], dtype=np.float32)
+    relevance = np.array([1.0, 0.98, 0.7], dtype=np.float32)
+    assert maximal_marginal_relevance(np.array([1.0, 0.0]), embeddings, relevance, 2, 0.5) == [0, 2]
+
+
+@pytest.mark.asyncio
+async def test_stage_skipped_when_over_budget():
+    """Test a stage whose expected cost exceeds its budget is skipped"""
+    stage = MMRStage(budget_ms=1)
+    stage.record(elapsed_ms=100.0, n_candidates=1)
+    candidates = [{"chunk_id": str(i), "score": 1.0 - i / 10} for i in range(3)]
+    embeddings = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+
+    results = await Reranker([stage]).rerank(
+        "q", np.array([1.0, 0.0]), candidates, embeddings, 2, time.monotonic() + 1
+    )
+    assert [r["chunk_id"] for r in results] == ["0", "1"]
@@ -0,0 +1,120 @@
+# SPDX-License-Identifier: LicenseRef-NIA-Proprietary
+"""Tests for the embedded NumPy vector index"""
+
+import numpy as np
+import pytest
+
+from app.services.vector_index import HashingEmbeddingFunction, VectorIndexClient
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Create an empty embedded index in a temporary directory"""
+    return VectorIndexClient(str(tmp_path))
+
+
+def _random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_query_matches_brute_force_cosine(client):
+    """Test top-k order and distances match a brute-force cosine ranking"""
+    vectors = _random_vectors(200)
+    collection = client.get_or_create_collection("docs")
+    collection.upsert(ids=[f"c{i}" for i in range(200)], embeddings=vectors)
+
+    query = vectors[7] + 0.1
+    results = collection.query(query_embeddings=[query.tolist()], n_results=5)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:5]
+    assert results["ids"][0] == [f"c{i}" for i in expected]
+    assert results["distances"][0] == sorted(results["distances"][0])
+
+
+def test_where_filter_and_delete(client):
+    """Test metadata filters restrict queries, gets and deletes"""
+    collection = client.get_or_create_collection("docs")
+    collection.upsert(
+        ids=["a", "b", "c"],
+        embeddings=_random_vectors(3),
+        documents=["one", "two", "three"],
+        metadatas=[{"user_id": "u1"}, {"user_id": "u2"}, {"user_id": "u1"}]
+    )
+
+    results = collection.query(query_embeddings=_random_vectors(1).tolist(), n_results=10, where={"user_id": "u1"})
+    assert sorted(results["ids"][0]) == ["a", "c"]
+
+    collection.delete(where={"$and": [{"user_id": "u1"}, {"user_id": {"$ne": "u2"}}]})
+    assert collection.get()["ids"] == ["b"]
+    assert collection.count() == 1
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Test a reopened client sees the last snapshot, including float16 storage"""
+    vectors = _random_vectors(10)
+    collection = VectorIndexClient(str(tmp_path), dtype="float16").get_or_create_collection("docs")
+    collection.upsert(ids=[f"c{i}" for i in range(10)], embeddings=vectors, documents=[str(i) for i in range(10)])
+    collection.delete(ids=["c3"])
+
+    reopened = VectorIndexClient(str(tmp_path)).get_collection("docs")
+    stored = reopened.get(ids=["c4"], include=["documents", "embeddings"])
+    assert reopened.count() == 9
+    assert stored["documents"] == ["4"]
+    np.testing.assert_allclose(
+        stored["embeddings"][0], vectors[4] / np.linalg.norm(vectors[4]), atol=1e-3
+    )
+
+
+def test_ivf_probing_finds_near_duplicates(tmp_path):
+    """Test IVF-partitioned search still finds a query's own vector"""
+    vectors = _random_vectors(2000, dim=32)
+    collection = VectorIndexClient(str(tmp_path), nlist=16).get_or_create_collection("docs")
+    collection.upsert(ids=[f"c{i}" for i in range(2000)], embeddings=vectors)
+
+    results = collection.query(query_embeddings=vectors[[5, 500, 1500]].tolist(), n_results=1)
+    assert [ids[0] for ids in results["ids"]] == ["c5", "c500", "c1500"]
+
+
+def test_clients_see_each_others_writes(tmp_path):
+    """Test two clients on one directory (as two workers would be) share writes and deletes"""
+    vectors = _random_vectors(4)
+    first = VectorIndexClient(str(tmp_path)).get_or_create_collection("docs")
+    second = VectorIndexClient(str(tmp_path)).get_or_create_collection("docs")
+
+    first.upsert(ids=["a", "b"], embeddings=vectors[:2], metadatas=[{"user_id": "u1"}] * 2)
+    second.upsert(ids=["c"], embeddings=vectors[2:3], metadatas=[{"user_id": "u2"}])
+    first.delete(where={"user_id": "u2"})
+    second.upsert(ids=["d"], embeddings=vectors[3:], metadatas=[{"user_id": "u2"}])
+
+    assert first.get()["ids"] == second.get()["ids"] == ["a", "b", "d"]
+    results = first.query(query_embeddings=[vectors[3].tolist()], n_results=1)
+    assert results["ids"][0] == ["d"]
+
+
+def test_writes_append_to_log_until_compaction(tmp_path):
+    """Test writes append to the change log and fold into a new snapshot once it outgrows it"""
+    client = VectorIndexClient(str(tmp_path))
+    collection = client.get_or_create_collection("docs")
+    collection.compact_min_bytes = 0
+    collection.upsert(ids=[f"c{i}" for i in range(100)], embeddings=_random_vectors(100))
+    snapshot = (tmp_path / "docs" / "CURRENT").read_text()
+
+    collection.upsert(ids=["x"], embeddings=_random_vectors(1, seed=1))
+    assert (tmp_path / "docs" / "CURRENT").read_text() == snapshot
+    assert (tmp_path / "docs" / snapshot / "changes.log").exists()
+
+    for i in range(100):
+        collection.update(ids=[f"c{i}"], documents=["x" * 1000])
+    assert (tmp_path / "docs" / "CURRENT").read_text() != snapshot
+    reopened = VectorIndexClient(str(tmp_path)).get_collection("docs")
+    assert reopened.count() == 101
+    assert reopened.get(ids=["c99"])["documents"] == ["x" * 1000]
+
+
+def test_hashing_embeddings_are_deterministic():
+    """Test the hashing embedder is stable and favours shared tokens"""
+    embed = HashingEmbeddingFunction(dim=64)
+    first, second, other = np.array(embed(["vector index", "vector index", "unrelated words"]))
+    assert np.allclose(first, second)
+    assert first @ second > first @ other